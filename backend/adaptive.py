@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+adaptive.py
+Adaptive quality controller for slow kiosk CPUs.
+
+Each camera has one controller. Scan pipelines report how long every frame
+takes to process (barcode decode, face tracking) and the controller moves
+along a ladder of settings to hold TARGET_FRAME_MS per frame:
+
+    level  detect_scale  track_every  max_width
+      0        0.5            1         native
+      1        0.35           1         native
+      2        0.25           2         native
+      3        0.25           3          640
+
+detect_scale is the face detection downscale factor of the delivered frame,
+track_every feeds only every Nth decoded frame to the face tracker, and
+max_width caps the capture resolution (webcams switch capture mode,
+files/images are downscaled by the capture thread). Barcodes are still
+decoded on every fresh frame.
+
+Every step down costs no more than the level above it, whatever the
+camera's native width: the detector's input width (detect_scale times the
+delivered width) never grows, and track_every never shrinks.
+
+The controller steps down after a short run of slow frames and back up only
+after a long run of fast ones, and waits for the measurements to settle
+after every change. A step up that is undone right away doubles the run of
+fast frames needed before the next attempt, so it doesn't oscillate.
+Levels are kept between scans, so a kiosk starts its next scan at the level
+it needed last time.
+
+Config (env vars):
+    ADAPTIVE         "1" (default) enable, "0" always use level 0
+    TARGET_FRAME_MS  per-frame processing budget, default 66 (~15 fps)
+"""
+
+import os
+import threading
+
+from metrics import ADAPTIVE_LEVEL, ADAPTIVE_FRAME_SECONDS, ADAPTIVE_CHANGES
+
+ADAPTIVE = os.environ.get("ADAPTIVE", "1") == "1"
+TARGET_FRAME_MS = float(os.environ.get("TARGET_FRAME_MS", 66))
+
+LEVELS = (
+    {"detect_scale": 0.5, "track_every": 1, "max_width": None},
+    {"detect_scale": 0.35, "track_every": 1, "max_width": None},
+    {"detect_scale": 0.25, "track_every": 2, "max_width": None},
+    {"detect_scale": 0.25, "track_every": 3, "max_width": 640},
+)
+
+EWMA_ALPHA = 0.2        # weight of the newest sample in the smoothed stage times
+SETTLE_FRAMES = 15      # frames to ignore after a change while measurements catch up
+SLOW_FACTOR = 1.2       # frame cost above target * this counts as slow
+FAST_FACTOR = 0.5       # frame cost below target * this counts as fast
+SLOW_STREAK = 5         # consecutive slow frames before stepping down
+FAST_STREAK = 60        # consecutive fast frames before stepping back up
+MAX_FAST_STREAK = FAST_STREAK * 32
+RETRY_WINDOW = 60       # a step down this soon after a step up means the step up failed
+
+
+class AdaptiveController:
+    """Picks a LEVELS entry from measured per-frame processing time"""
+
+    def __init__(self, camera_name, target_ms=TARGET_FRAME_MS, enabled=ADAPTIVE,
+                 levels=LEVELS, on_capture_change=None):
+        self.camera_name = camera_name
+        self.target_ms = target_ms
+        self.enabled = enabled
+        self.levels = levels
+        self.on_capture_change = on_capture_change  # max_width -> None, applied to the camera
+        self.level = 0
+        self.changes = 0
+        self.last_change = None
+        self._stage_ms = {}
+        self._since_change = 0
+        self._slow = 0
+        self._fast = 0
+        self._fast_needed = FAST_STREAK
+        self._last_direction = None
+        self._lock = threading.Lock()
+        ADAPTIVE_LEVEL.set(0, camera=camera_name)
+
+    @property
+    def settings(self) -> dict:
+        return self.levels[self.level]
+
+    def observe(self, stage, ms):
+        """Feed one stage time (ms) of one frame."""
+        with self._lock:
+            previous = self._stage_ms.get(stage)
+            self._stage_ms[stage] = ms if previous is None else previous + EWMA_ALPHA * (ms - previous)
+
+    def frame_ms(self):
+        """Smoothed processing cost of one decoded frame at the current level."""
+        with self._lock:
+            return self._frame_ms()
+
+    def _frame_ms(self):
+        track = self._stage_ms.get("track", 0.0) / self.levels[self.level]["track_every"]
+        return self._stage_ms.get("decode", 0.0) + track
+
+    def tick(self):
+        """Call once per decoded frame, after observe(); may change the level."""
+        if not self.enabled:
+            return
+        with self._lock:
+            cost = self._frame_ms()
+            ADAPTIVE_FRAME_SECONDS.set(cost / 1000.0, camera=self.camera_name)
+            self._since_change += 1
+            if self._since_change < SETTLE_FRAMES:
+                return
+            self._slow = self._slow + 1 if cost > self.target_ms * SLOW_FACTOR else 0
+            self._fast = self._fast + 1 if cost < self.target_ms * FAST_FACTOR else 0
+            if self._slow >= SLOW_STREAK and self.level < len(self.levels) - 1:
+                change = self._set_level(self.level + 1, cost)
+            elif self._fast >= self._fast_needed and self.level > 0:
+                change = self._set_level(self.level - 1, cost)
+            else:
+                return
+        if change and self.on_capture_change is not None:
+            self.on_capture_change(self.settings["max_width"])
+
+    def _set_level(self, level, cost):
+        """Switch level (lock held). Returns True if the capture width changed."""
+        old = self.levels[self.level]
+        direction = "down" if level > self.level else "up"
+        if direction == "down":
+            failed_retry = self._last_direction == "up" and self._since_change < RETRY_WINDOW
+            self._fast_needed = min(self._fast_needed * 2, MAX_FAST_STREAK) if failed_retry else FAST_STREAK
+        self._last_direction = direction
+        self.last_change = {"from": self.level, "to": level, "frame_ms": round(cost, 1),
+                            "target_ms": self.target_ms}
+        self.level = level
+        self.changes += 1
+        self._since_change = self._slow = self._fast = 0
+        new = self.levels[level]
+        ADAPTIVE_LEVEL.set(level, camera=self.camera_name)
+        ADAPTIVE_CHANGES.inc(camera=self.camera_name, direction=direction)
+        print(f"⚙️ {self.camera_name}: quality level {self.last_change['from']} -> {level} "
+              f"(frame {cost:.0f} ms, target {self.target_ms:.0f} ms): detect_scale {new['detect_scale']}, "
+              f"track every {new['track_every']}, max_width {new['max_width'] or 'native'}")
+        return new["max_width"] != old["max_width"]
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "level": self.level,
+                **self.levels[self.level],
+                "frame_ms": round(self._frame_ms(), 1),
+                "target_ms": self.target_ms,
+                "changes": self.changes,
+                "last_change": self.last_change,
+            }
@@ -1,6 +1,9 @@
 # backend/app.py
-from flask import Flask, jsonify, request
-import os, json, csv, uuid
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, jsonify, request, Response, stream_with_context, g
+import os, io, csv, json, uuid, tempfile, base64, binascii
 from datetime import datetime
 from pathlib import Path
 from flask_cors import CORS
@@ -13,56 +16,73 @@ CORS(app)
 # Import helper functions from your modules
 # note: make sure face_scan.py defines enroll_student_api(roll_no) as shown earlier
 from face_scan import enroll_student_api
-from barcode_scanner import scan_once
+from barcode_scanner import scan_once, verify_frames, MAX_VERIFY_FRAMES
+from scan_jobs import ScanJobQueue, QueueFullError, FINISHED_STATES
+from bulk_enroll import bulk_enroll
+from preview import preview_for, remote_mjpeg_stream, start_preview_relay
+from stations import StationRegistry, DEFAULT_STATION
+from config_registry import config
+from attendance_store import AttendanceStore, COLUMNS as ATTENDANCE_COLUMNS, FILTERS as ATTENDANCE_FILTERS, DEFAULT_PAGE_SIZE, PRESENT
+from marked_index import MarkedIndex, ALREADY_MARKED
+from walkthrough import WalkthroughSession, SessionDirectory
+from state_store import state_store, host_lock
+from warmup import warmup
+from face_index import face_index
+from slot_scheduler import SlotScheduler
+from metrics import registry as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_REQUEST_SECONDS, SCAN_RESULTS, QUEUE_DEPTH
 
 BASE_DIR = Path(__file__).resolve().parent
-SLOTS_FILE = BASE_DIR / "slots.json"
-GROUPS_FILE = "groups.json"
 
-if os.path.exists(GROUPS_FILE):
-    with open(GROUPS_FILE, "r") as f:
-        GROUPS_TO_ROLLS = json.load(f)
-else:
-    GROUPS_TO_ROLLS = {}
+ATT_DIR = BASE_DIR / "subject_attendance"  # legacy per-subject CSVs, imported once
 
-ATT_DIR = BASE_DIR / "subject_attendance"
-ATT_DIR.mkdir(parents=True, exist_ok=True)
+attendance_store = AttendanceStore()
+attendance_store.import_csv_dir(ATT_DIR)
+# Who is already present in today's classes: repeat scans skip the face check
+marked_index = MarkedIndex(attendance_store)
+print(f"✔️ {marked_index.preload(config.slots().get('slots', []))} students already marked today")
 
-# Simple in-memory admin sessions (prototype)
+# Admin sessions live in the shared state store (all workers, survive restarts) and expire
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "adminpass")  # set env var for real use
-admin_sessions = {}  # token -> timestamp
-
-# Active slot (store id and metadata)
-active_slot = None
+ADMIN_SESSION_TTL = int(os.environ.get("ADMIN_SESSION_TTL", 8 * 3600))  # seconds
+ENROLL_WAIT = 90  # seconds /api/enroll waits for its queued enrollment job
+SESSION_START_WAIT = 45  # seconds /api/admin/session/start waits for the camera host to start it
 
 def load_slots():
-    if SLOTS_FILE.exists():
-        return json.loads(SLOTS_FILE.read_text())
-    return {"slots": []}
+    return config.slots()
 
 def find_slot_by_id(slot_id):
-    slots = load_slots().get("slots", [])
-    for s in slots:
-        if s["id"] == slot_id:
-            return s
-    return None
+    return config.find_slot(slot_id)
+
+def append_attendance(subject, date, slot_time, roll_no, status, station=DEFAULT_STATION):
+    """Queue an attendance row; the store commits rows in small batches. Repeat scans aren't stored."""
+    if status == ALREADY_MARKED:
+        return
+    if status == PRESENT:
+        marked_index.mark(subject, slot_time, date, roll_no)
+    attendance_store.append(subject, date, slot_time, roll_no, status, station)
 
-def append_attendance(subject, date, slot_time, roll_no, status):
-    """Append row to subject CSV in subject_attendance directory."""
-    fname = ATT_DIR / f"{subject}.csv"
-    header = ["date", "slot", "roll_no", "status", "timestamp"]
-    row = [date, slot_time, roll_no, status, datetime.now().isoformat()]
-    file_exists = fname.exists()
-    with open(fname, "a", newline="") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(header)
-        writer.writerow(row)
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                     endpoint=endpoint, status=response.status_code)
+    return response
 
 @app.route("/")
 def home():
     return jsonify({"message": "Attendance backend running"})
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text format: stage latency histograms, scan status counters, queue depths."""
+    return Response(metrics_registry.render(), mimetype=METRICS_CONTENT_TYPE)
+
 @app.route("/api/slots", methods=["GET"])
 def api_slots():
     return jsonify(load_slots())
@@ -74,22 +94,52 @@ def api_admin_login():
     if password != ADMIN_PASSWORD:
         return jsonify({"ok": False, "message": "Invalid password"}), 401
     token = str(uuid.uuid4())
-    admin_sessions[token] = datetime.utcnow().isoformat()
-    return jsonify({"ok": True, "token": token})
+    state_store.set("admin_session", token, {"created": datetime.utcnow().isoformat()}, ttl=ADMIN_SESSION_TTL)
+    return jsonify({"ok": True, "token": token, "expires_in": ADMIN_SESSION_TTL})
 
-def check_token(req):
+def check_token(req, allow_query=False):
     auth = req.headers.get("Authorization", "")
+    token = None
     if auth.startswith("Bearer "):
         token = auth.split(" ", 1)[1]
-        return token if token in admin_sessions else None
+    elif allow_query:
+        # EventSource can't send headers: SSE endpoints also take ?token=
+        token = req.args.get("token")
+    if token:
+        return token if state_store.get("admin_session", token) is not None else None
     return None
 
+@app.route("/api/stations", methods=["GET"])
+def api_stations():
+    return jsonify({"stations": [s.to_dict() for s in stations.all()]})
+
+@app.route("/api/preview.mjpg", methods=["GET"])
+def api_preview():
+    """Live annotated camera preview for a station (MJPEG), encoded only while watched."""
+    station = stations.get(request.args.get("station"))
+    if not station:
+        return jsonify({"ok": False, "message": "Station not found"}), 404
+    if host_lock.acquire():
+        stream = preview_for(station.camera).mjpeg_stream()
+    else:
+        stream = remote_mjpeg_stream(state_store, station.camera.name)  # relayed by the camera host
+    return Response(stream,
+                    mimetype="multipart/x-mixed-replace; boundary=frame",
+                    headers={"Cache-Control": "no-cache"})
+
 @app.route("/api/admin/active_slot", methods=["GET"])
 def api_get_active_slot():
     token = check_token(request)
     if not token:
         return jsonify({"ok": False, "message": "Unauthorized"}), 401
-    return jsonify({"active_slot": active_slot})
+    station = stations.get(request.args.get("station"))
+    if not station:
+        return jsonify({"ok": False, "message": "Station not found"}), 404
+    return jsonify({
+        "active_slot": station.active_slot,
+        "station": station.name,
+        "stations": {s.name: s.active_slot for s in stations.all()},
+    })
 
 
 @app.route("/api/admin/set_slot", methods=["POST"])
@@ -98,13 +148,24 @@ def api_set_slot():
     if not token:
         return jsonify({"ok": False, "message": "Unauthorized"}), 401
     body = request.get_json(force=True) or {}
+    station = stations.get(body.get("station"))
+    if not station:
+        return jsonify({"ok": False, "message": "Station not found"}), 404
     slot_id = body.get("slot_id")
     slot = find_slot_by_id(slot_id)
     if not slot:
         return jsonify({"ok": False, "message": "Slot not found"}), 404
-    global active_slot
-    active_slot = slot
-    return jsonify({"ok": True, "message": "Active slot set", "active": slot})
+    station.active_slot = slot
+    warm = scheduler.ensure_warm()
+    return jsonify({"ok": True, "message": "Active slot set", "active": slot, "station": station.name,
+                    "warm": warm})
+
+@app.route("/api/admin/schedule", methods=["GET"])
+def api_admin_schedule():
+    """Today's slot schedule (activation times, current slot per station) and the pre-warm state."""
+    if not check_token(request):
+        return jsonify({"ok": False, "message": "Unauthorized"}), 401
+    return jsonify({"ok": True, **scheduler.to_dict()})
 
 @app.route("/api/admin/attendance", methods=["GET"])
 def api_admin_attendance():
@@ -112,20 +173,88 @@ def api_admin_attendance():
     if not token:
         return jsonify({"ok": False, "message": "Unauthorized"}), 401
     subject = request.args.get("subject")
-    date = request.args.get("date")  # optional filter
     if not subject:
         return jsonify({"ok": False, "message": "subject query param required"}), 400
-    fname = ATT_DIR / f"{subject}.csv"
-    if not fname.exists():
-        return jsonify({"subject": subject, "rows": []})
-    rows = []
-    with open(fname, newline="") as f:
-        reader = csv.DictReader(f)
-        for r in reader:
-            if date and r["date"] != date:
-                continue
-            rows.append(r)
-    return jsonify({"subject": subject, "rows": rows})
+    # optional filters: date, date_from, date_to, slot, roll_no, status, station
+    filters = {name: request.args.get(name) for name in ATTENDANCE_FILTERS}
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        rows, next_cursor = attendance_store.query_page(subject, filters, limit, request.args.get("after"))
+    except ValueError:
+        return jsonify({"ok": False, "message": "limit and after must be integers"}), 400
+    return jsonify({"subject": subject, "rows": rows, "next_cursor": next_cursor})
+
+def _csv_line(values):
+    buf = io.StringIO()
+    csv.writer(buf).writerow(["" if v is None else v for v in values])
+    return buf.getvalue()
+
+@app.route("/api/admin/attendance/export", methods=["GET"])
+def api_admin_attendance_export():
+    """Stream every matching row as CSV (default) or NDJSON without building the whole result."""
+    token = check_token(request)
+    if not token:
+        return jsonify({"ok": False, "message": "Unauthorized"}), 401
+    subject = request.args.get("subject")
+    if not subject:
+        return jsonify({"ok": False, "message": "subject query param required"}), 400
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"ok": False, "message": "format must be csv or ndjson"}), 400
+    filters = {name: request.args.get(name) for name in ATTENDANCE_FILTERS}
+    rows = attendance_store.iter_rows(subject, filters)
+
+    if fmt == "ndjson":
+        body = (json.dumps(r) + "\n" for r in rows)
+        mimetype = "application/x-ndjson"
+    else:
+        def body():
+            yield _csv_line(ATTENDANCE_COLUMNS)
+            for r in rows:
+                yield _csv_line(r[c] for c in ATTENDANCE_COLUMNS)
+        body = body()
+        mimetype = "text/csv"
+    return Response(body, mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{subject}.{fmt}"'})
+
+def _subject_roster(subject):
+    """{slot time: roll numbers scheduled} for every slot of a subject."""
+    return {slot["time"]: config.slot_roster(slot["id"])
+            for slot in config.slots().get("slots", []) if slot.get("subject") == subject}
+
+def _student_roster(roll_no):
+    """{subject: slot times} the student is scheduled in."""
+    roster = {}
+    for slot in config.slots().get("slots", []):
+        if roll_no in config.slot_roster(slot["id"]):
+            roster.setdefault(slot["subject"], set()).add(slot["time"])
+    return roster
+
+@app.route("/api/admin/summary", methods=["GET"])
+def api_admin_summary():
+    """Per-student attendance percentages for a subject, from the summary tables."""
+    if not check_token(request):
+        return jsonify({"ok": False, "message": "Unauthorized"}), 401
+    subject = request.args.get("subject")
+    if not subject:
+        return jsonify({"ok": False, "message": "subject query param required"}), 400
+    return jsonify(attendance_store.subject_summary(subject, _subject_roster(subject)))
+
+@app.route("/api/admin/summary/student/<roll_no>", methods=["GET"])
+def api_admin_summary_student(roll_no):
+    if not check_token(request):
+        return jsonify({"ok": False, "message": "Unauthorized"}), 401
+    return jsonify(attendance_store.student_summary(roll_no, _student_roster(roll_no)))
+
+@app.route("/api/admin/summary/daily", methods=["GET"])
+def api_admin_summary_daily():
+    if not check_token(request):
+        return jsonify({"ok": False, "message": "Unauthorized"}), 401
+    subject = request.args.get("subject")
+    if not subject:
+        return jsonify({"ok": False, "message": "subject query param required"}), 400
+    return jsonify(attendance_store.daily_summary(subject, request.args.get("date_from"),
+                                                  request.args.get("date_to")))
 
 @app.route("/api/enroll", methods=["POST"])
 def api_enroll():
@@ -133,35 +262,104 @@ def api_enroll():
     roll_no = body.get("roll_no")
     if not roll_no:
         return jsonify({"ok": False, "message": "roll_no required"}), 400
-    # This will open camera on the machine where Flask runs — intended for local demo
-    result = enroll_student_api(roll_no)
-    return jsonify(result)
+    station = stations.get(body.get("station"))
+    if not station:
+        return jsonify({"ok": False, "message": "Station not found"}), 404
+    # Opens the camera on the machine where Flask runs, so it goes through the
+    # station's queue (run by the camera host) like a scan, and we wait for it
+    try:
+        job = station.jobs.submit(kind="enroll", roll_no=roll_no)
+    except QueueFullError as e:
+        return jsonify({"ok": False, "status": "BUSY", "message": f"Scanner busy: {e}"}), 429
+    snapshot = wait_for_job(station.jobs, job.id, ENROLL_WAIT)
+    if snapshot is None:
+        return jsonify({"ok": False, "message": "Enrollment timed out", "roll_no": roll_no}), 504
+    return jsonify(snapshot["result"])
 
-@app.route("/api/scan", methods=["POST"])
-def api_scan():
-    # Optionally expected_slot_id can be provided; otherwise use active_slot
-    body = request.get_json(force=True) or {}
-    expected_slot_id = body.get("expected_slot_id")
-    slot = None
-    if expected_slot_id:
-        slot = find_slot_by_id(expected_slot_id)
+def wait_for_job(jobs, job_id, timeout):
+    """Snapshot of a queued job once it has finished, or None if it doesn't finish within timeout."""
+    deadline = time.time() + timeout
+    version, snapshot = -1, None
+    while time.time() < deadline:
+        version, snapshot = jobs.wait_for_change(job_id, version, deadline - time.time())
+        if snapshot is None or snapshot["status"] in FINISHED_STATES:
+            break
+    return snapshot if snapshot and snapshot["status"] in FINISHED_STATES else None
+
+def run_bulk_enroll(source, cleanup=False):
+    """Bulk enrollment job; removes an uploaded archive once processed."""
+    try:
+        return bulk_enroll(source)
+    finally:
+        if cleanup:
+            os.remove(source)
+
+# Bulk enrollment is CPU heavy (uses every core), so only one batch runs or waits at a time
+bulk_enroll_jobs = ScanJobQueue(run_bulk_enroll, max_pending=1, name="bulk-enroll",
+                                store=state_store, host=host_lock)
+
+@app.route("/api/admin/enroll/bulk", methods=["POST"])
+def api_admin_enroll_bulk():
+    """Enroll from an uploaded zip ("archive" form field) or a directory on the server (JSON "path")."""
+    token = check_token(request)
+    if not token:
+        return jsonify({"ok": False, "message": "Unauthorized"}), 401
+    upload = request.files.get("archive")
+    if upload:
+        fd, source = tempfile.mkstemp(suffix=".zip", prefix="bulk_enroll_")
+        with os.fdopen(fd, "wb") as f:
+            upload.save(f)
+        params = {"source": source, "cleanup": True}
     else:
-        slot = active_slot
+        body = request.get_json(silent=True) or {}
+        path = body.get("path")
+        if not path or not os.path.isdir(path):
+            return jsonify({"ok": False, "message": "archive upload or existing directory path required"}), 400
+        params = {"source": path}
+    try:
+        job = bulk_enroll_jobs.submit(**params)
+    except QueueFullError:
+        if params.get("cleanup"):
+            os.remove(params["source"])
+        return jsonify({"ok": False, "status": "BUSY", "message": "A bulk enrollment is already queued"}), 429
+    return jsonify({"ok": True, **bulk_enroll_jobs.get(job.id)}), 202
 
-    if not slot:
-        return jsonify({"ok": False, "message": "No active slot"}), 400
+@app.route("/api/admin/enroll/bulk/<job_id>", methods=["GET"])
+def api_admin_enroll_bulk_status(job_id):
+    token = check_token(request)
+    if not token:
+        return jsonify({"ok": False, "message": "Unauthorized"}), 401
+    job = bulk_enroll_jobs.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "message": "Unknown bulk enrollment job"}), 404
+    return jsonify({"ok": True, **job})
+
+def roster_status(slot, roll_no):
+    """NO_GROUP / NOT_IN_ACTIVE_GROUP if roll_no may not attend slot, else None (indexed, O(1))."""
+    if not config.groups_for(roll_no):
+        return "NO_GROUP"
+    if roll_no not in config.slot_roster(slot["id"]):
+        return "NOT_IN_ACTIVE_GROUP"
+    return None
 
+def run_scan(slot, station, timeout=60):
+    """Blocking scan for a slot on a station: camera scan, roster checks, attendance row. Runs on the station's job worker."""
     # For security: load expected students list if you keep it somewhere (optional)
     # For prototype, assume slot entry contains "students": [rolls...]
     expected_students = slot.get("students") if "students" in slot else None
+    date_str = datetime.now().strftime("%Y-%m-%d")
 
-    # Run the blocking scanner function (opens camera)
-    scan_result = scan_once(expected_students=expected_students, timeout=60)
+    # Run the blocking scanner function (uses the shared camera)
+    # Roster and already-marked checks answer before any face work, like sessions and /api/verify
+    scan_result = scan_once(expected_students=expected_students, timeout=timeout, camera=station.camera,
+                            already_marked=marked_index.checker(slot, date_str) if slot else None,
+                            screen=(lambda roll: roster_status(slot, roll)) if slot else None)
+    scan_result["station"] = station.name
 
     # If we have a roll_no and subject, append to attendance
     # Check if roll_no is allowed in this slot
     roll_no = None
-    if "roll_no" in scan_result:
+    if "roll_no" in scan_result and scan_result.get("status") != ALREADY_MARKED:
         roll_no = scan_result["roll_no"]
 
         # Step 1: check if roll_no exists in face_data.json (already handled by scan_once)
@@ -169,34 +367,299 @@ def api_scan():
             scan_result["ok"] = False
             scan_result["status"] = "NOT_ENROLLED"
         else:
-            # Step 2: find which group this student belongs to
-            student_group = None
-            for group, rolls in GROUPS_TO_ROLLS.items():
-                if roll_no in rolls:
-                    student_group = group
-                    break
-
-            if not student_group:
+            # Steps 2-3: student's groups and the slot's roster
+            rejection = roster_status(slot, roll_no)
+            if rejection:
                 scan_result["ok"] = False
-                scan_result["status"] = "NO_GROUP"
-            else:
-                # Step 3: check if student_group is in active_slot.groups
-                if student_group not in slot.get("groups", []):
-                    scan_result["ok"] = False
-                    scan_result["status"] = "NOT_IN_ACTIVE_GROUP"
+                scan_result["status"] = rejection
 
     # Save attendance only for valid or failed scans (keeps logs)
     if "roll_no" in scan_result and slot:
-        date_str = datetime.now().strftime("%Y-%m-%d")
         append_attendance(
             slot["subject"],
             date_str,
             slot["time"],
             scan_result.get("roll_no"),
-            scan_result.get("status")
+            scan_result.get("status"),
+            station.name
         )
-    return jsonify(scan_result)
+    SCAN_RESULTS.inc(station=station.name, status=scan_result.get("status"))
+    return scan_result
+
+def run_station_job(station, kind="scan", **params):
+    """Runs one queued station job: a scan (default), a camera enrollment or a session start."""
+    if kind == "enroll":
+        return enroll_student_api(params["roll_no"], camera=station.camera)
+    if kind == "session":
+        return start_session(station, params["slot"])
+    if station.session_running:
+        return {"ok": False, "status": "SESSION_ACTIVE", "station": station.name,
+                "message": "A walk-through session is running on this station"}
+    return run_scan(station=station, **params)
+
+# Each station runs its jobs one at a time on its own worker; stations scan in parallel.
+# Jobs run in the camera host process; other worker processes queue them via the state store.
+# Walk-through sessions run in the camera host too; any worker can follow or stop them via the store
+sessions = SessionDirectory(state_store)
+stations = StationRegistry.load(find_slot=find_slot_by_id, store=state_store, sessions=sessions)
+for _station in stations.all():
+    _station.attach_runner(run_station_job, host=host_lock)
+
+# Activates slots at their time (minus a lead) and pre-warms the active slots' rosters
+scheduler = SlotScheduler(stations, config, face_index, marked_index, store=state_store, host=host_lock)
+
+def _queue_depths():
+    depths = {(f"scan:{s.name}",): s.jobs.depth for s in stations.all()}
+    depths[("bulk_enroll",)] = bulk_enroll_jobs.depth
+    depths[("attendance_writes",)] = attendance_store.pending
+    return depths
+
+QUEUE_DEPTH.set_function(_queue_depths)
+SSE_KEEPALIVE = 15  # seconds between keep-alive comments on idle event streams
+
+@app.route("/api/scan", methods=["POST"])
+def api_scan():
+    # Optionally expected_slot_id can be provided; otherwise use active_slot
+    body = request.get_json(force=True) or {}
+    station = stations.get(body.get("station"))
+    if not station:
+        return jsonify({"ok": False, "message": "Station not found"}), 404
+    if station.session_running:
+        return jsonify({"ok": False, "status": "SESSION_ACTIVE",
+                        "message": "A walk-through session is running on this station",
+                        "session_id": station.session["session_id"]}), 409
+    expected_slot_id = body.get("expected_slot_id")
+    slot = None
+    if expected_slot_id:
+        slot = find_slot_by_id(expected_slot_id)
+    else:
+        slot = station.active_slot
+
+    if not slot:
+        return jsonify({"ok": False, "message": "No active slot"}), 400
+
+    try:
+        job = station.jobs.submit(slot=slot)
+    except QueueFullError as e:
+        return jsonify({"ok": False, "status": "BUSY", "message": f"Scanner busy: {e}"}), 429
+    return jsonify({"ok": True, "station": station.name, **station.jobs.get(job.id)}), 202
+
+@app.route("/api/scan/<job_id>", methods=["GET"])
+def api_scan_status(job_id):
+    station, job = stations.find_job(job_id)
+    if job is None:
+        return jsonify({"ok": False, "message": "Unknown scan job"}), 404
+    return jsonify({"ok": True, "station": station.name, **job})
+
+@app.route("/api/scan/<job_id>/events", methods=["GET"])
+def api_scan_events(job_id):
+    station, job = stations.find_job(job_id)
+    if job is None:
+        return jsonify({"ok": False, "message": "Unknown scan job"}), 404
+    scan_jobs = station.jobs
+
+    def stream():
+        version = -1
+        while True:
+            new_version, job = scan_jobs.wait_for_change(job_id, version, SSE_KEEPALIVE)
+            if job is None:
+                return
+            if new_version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+            if job["status"] in FINISHED_STATES:
+                return
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+MAX_VERIFY_FRAME_BYTES = 5 * 1024 * 1024
+
+def _decode_upload(data):
+    """BGR frame from JPEG/PNG bytes, or None."""
+    if not data or len(data) > MAX_VERIFY_FRAME_BYTES:
+        return None
+    import cv2  # only this route decodes images here; camera/face modules import it when they load
+    import numpy as np
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+@app.route("/api/verify", methods=["POST"])
+def api_verify():
+    """
+    Stateless barcode + face verification of uploaded frames, no server camera.
+    multipart: one or more "frames" files (+ roll_no, slot_id fields), or
+    JSON: {"frames": [base64 JPEG, ...], "roll_no": optional, "slot_id": optional}.
+    With slot_id the roll is also checked against that slot's roster, and a
+    roll already marked present in today's class returns ALREADY_MARKED.
+    """
+    if request.files:
+        blobs = [f.read() for f in request.files.getlist("frames")]
+        fields = request.form
+    else:
+        fields = request.get_json(silent=True) or {}
+        try:
+            # accept data URLs ("data:image/jpeg;base64,...") as well as bare base64
+            blobs = [base64.b64decode(s.split(",", 1)[-1], validate=True) for s in fields.get("frames", [])]
+        except (binascii.Error, AttributeError, ValueError):
+            return jsonify({"ok": False, "message": "frames must be base64-encoded images"}), 400
+    if not blobs:
+        return jsonify({"ok": False, "message": "at least one frame required"}), 400
+    if len(blobs) > MAX_VERIFY_FRAMES:
+        return jsonify({"ok": False, "message": f"at most {MAX_VERIFY_FRAMES} frames per request"}), 413
+    frames = [_decode_upload(b) for b in blobs]
+    if any(f is None for f in frames):
+        return jsonify({"ok": False, "message": "frames must be JPEG/PNG images under 5 MB"}), 400
+
+    slot = None
+    if fields.get("slot_id"):
+        slot = find_slot_by_id(fields["slot_id"])
+        if not slot:
+            return jsonify({"ok": False, "message": "Slot not found"}), 404
+    result = verify_frames(frames, roll_no=fields.get("roll_no") or None,
+                           expected_students=slot.get("students") if slot else None,
+                           screen=(lambda roll: roster_status(slot, roll)) if slot else None,
+                           already_marked=marked_index.checker(slot) if slot else None)
+    SCAN_RESULTS.inc(station="verify-api", status=result.get("status"))
+    return jsonify(result)
+
+# ---- walk-through sessions: one continuous scan per station for a whole class ----
+
+def record_session_verdict(session, verdict):
+    slot = session.slot
+    append_attendance(slot["subject"], session.date, slot["time"], verdict["roll_no"],
+                      verdict.get("status"), session.station.name)
+    SCAN_RESULTS.inc(station=session.station.name, status=verdict.get("status"))
+
+def start_session(station, slot):
+    """Start a walk-through session on a station. Runs on the station's job worker (camera host)."""
+    running = station.session
+    if running is not None:
+        return {"ok": False, "status": "SESSION_ACTIVE", "message": "Session already running",
+                "session": running}
+    session = WalkthroughSession(station, slot, record_session_verdict,
+                                 screen=lambda roll: roster_status(slot, roll),
+                                 already_marked=marked_index.checker(slot), store=state_store)
+    if not session.start():
+        return {"ok": False, "status": "CAMERA_ERROR", "message": "Cannot open camera"}
+    sessions.add(session)
+    return {"ok": True, "session": session.to_dict()}
+
+@app.route("/api/admin/session/start", methods=["POST"])
+def api_session_start():
+    if not check_token(request):
+        return jsonify({"ok": False, "message": "unauthorized"}), 401
+    body = request.get_json(force=True) or {}
+    station = stations.get(body.get("station"))
+    if not station:
+        return jsonify({"ok": False, "message": "Station not found"}), 404
+    slot = find_slot_by_id(body["slot_id"]) if body.get("slot_id") else station.active_slot
+    if not slot:
+        return jsonify({"ok": False, "message": "No active slot"}), 400
+    running = station.session
+    if running is not None:
+        return jsonify({"ok": False, "status": "SESSION_ACTIVE", "message": "Session already running",
+                        "session": running}), 409
+    # Needs the camera, so the camera host starts it from the station's queue
+    try:
+        job = station.jobs.submit(kind="session", slot=slot)
+    except QueueFullError as e:
+        return jsonify({"ok": False, "status": "BUSY", "message": f"Scanner busy: {e}"}), 429
+    snapshot = wait_for_job(station.jobs, job.id, SESSION_START_WAIT)
+    if snapshot is None:
+        return jsonify({"ok": False, "message": "Session start timed out"}), 504
+    result = snapshot["result"]
+    if not result.get("ok"):
+        return jsonify(result), {"SESSION_ACTIVE": 409, "CAMERA_ERROR": 503}.get(result.get("status"), 500)
+    return jsonify(result), 201
+
+@app.route("/api/admin/session/stop", methods=["POST"])
+def api_session_stop():
+    if not check_token(request):
+        return jsonify({"ok": False, "message": "unauthorized"}), 401
+    body = request.get_json(force=True) or {}
+    if body.get("session_id"):
+        session_id = body["session_id"]
+    else:
+        station = stations.get(body.get("station"))
+        session_id = (sessions.latest(station.name) or {}).get("session_id") if station else None
+    session = sessions.stop(session_id) if session_id else None
+    if session is None:
+        return jsonify({"ok": False, "message": "Session not found"}), 404
+    return jsonify({"ok": True, "session": session})
+
+@app.route("/api/admin/session/<session_id>", methods=["GET"])
+def api_session_status(session_id):
+    if not check_token(request):
+        return jsonify({"ok": False, "message": "unauthorized"}), 401
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({"ok": False, "message": "Session not found"}), 404
+    return jsonify({"ok": True, "session": session})
+
+@app.route("/api/session/<session_id>/events", methods=["GET"])
+def api_session_events(session_id):
+    """Live feed of a session's verdicts (SSE). ?after=<seq> resumes after a reconnect."""
+    if not check_token(request, allow_query=True):
+        return jsonify({"ok": False, "message": "unauthorized"}), 401
+    if sessions.get(session_id) is None:
+        return jsonify({"ok": False, "message": "Session not found"}), 404
+    after = request.args.get("after", type=int) or int(request.headers.get("Last-Event-ID", 0) or 0)
+
+    def stream():
+        seq = after
+        while True:
+            feed = sessions.events_after(session_id, seq, SSE_KEEPALIVE)
+            if feed is None:
+                return
+            events, running = feed
+            for event in events:
+                seq = event["seq"]
+                yield f"id: {seq}\nevent: verdict\ndata: {json.dumps(event)}\n\n"
+            if not running and not events:
+                yield f"event: stopped\ndata: {json.dumps(sessions.get(session_id))}\n\n"
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/health", methods=["GET"])
+def api_health():
+    """Liveness: the process is up and serving."""
+    return jsonify({"ok": True})
+
+@app.route("/api/health/ready", methods=["GET"])
+def api_health_ready():
+    """Readiness: 200 once the face/barcode models are warm, 503 (with progress) until then."""
+    state = warmup.to_dict()
+    return jsonify(state), 200 if state["ready"] else 503
+
+_startup_ms = (time.perf_counter() - _import_started) * 1000.0
+warmup.record("app_import", _startup_ms)
+print(f"🚀 App loaded in {_startup_ms:.0f} ms")
+
+def start_background():
+    """
+    Start warm-up, the slot scheduler and the job workers. Only in a process
+    that serves requests: the job workers take the camera host lock. Each is a
+    no-op in a spawned face pool worker re-importing this module.
+    """
+    warmup.start()
+    scheduler.start()
+    bulk_enroll_jobs.start()
+    for station in stations.all():
+        station.jobs.start()
+    start_preview_relay(state_store, host_lock, [s.camera for s in stations.all()])
+
+if __name__ != "__main__":
+    start_background()  # imported by a WSGI server
 
 if __name__ == "__main__":
     # development server — run with python app.py
-    app.run(host="0.0.0.0", port=5000, debug=True, threaded=False)
+    # threaded so slots/admin requests are served while a scan job runs
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background()  # the reloader's child serves requests; its watcher parent never does
+    app.run(host="0.0.0.0", port=5000, debug=True, threaded=True)
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+attendance_store.py
+SQLite attendance storage.
+
+Rows live in one WAL-mode SQLite database indexed on
+(subject, date, slot, roll_no), so admin queries stay fast as a term of data
+accumulates. Scans don't write synchronously: append() puts the row on a
+write-behind queue and a writer thread commits queued rows in small batches.
+A student is marked present (VALID) at most once per class: a repeat VALID
+row for the same subject, date, slot and roll number is not inserted.
+
+Summary tables (per student, per class date) are kept up to date by SQLite
+triggers in the same transaction as each insert, so attendance percentages
+are read from a handful of counters instead of scanning the term's rows.
+They can be rebuilt from the raw rows at any time.
+
+One-shot import of the old per-subject CSV files:
+    python attendance_store.py import [subject_attendance/]
+Rebuild the summary tables from the attendance rows:
+    python attendance_store.py rebuild-summaries
+"""
+
+import csv
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from metrics import ATTENDANCE_WRITE_SECONDS, ATTENDANCE_ROWS_WRITTEN
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_FILE = Path(os.environ.get("ATTENDANCE_DB", BASE_DIR / "attendance.db"))
+CSV_DIR = BASE_DIR / "subject_attendance"
+
+BATCH_SIZE = 50          # rows per transaction at most
+FLUSH_INTERVAL = 0.25    # seconds a row may wait for more rows to batch with
+
+COLUMNS = ("date", "slot", "roll_no", "status", "timestamp", "station")
+# query filter name -> SQL condition
+FILTER_SQL = {
+    "date": "date = ?",
+    "date_from": "date >= ?",
+    "date_to": "date <= ?",
+    "slot": "slot = ?",
+    "roll_no": "roll_no = ?",
+    "status": "status = ?",
+    "station": "station = ?",
+}
+FILTERS = tuple(FILTER_SQL)
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK = 500       # rows fetched per round trip while streaming an export
+PRESENT = "VALID"        # the only status that counts as attending
+SUMMARY_VERSION = 1      # bump when the summary tables change; older DBs get rebuilt
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id        INTEGER PRIMARY KEY,
+    subject   TEXT NOT NULL,
+    date      TEXT NOT NULL,
+    slot      TEXT NOT NULL,
+    roll_no   TEXT NOT NULL,
+    status    TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    station   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_lookup ON attendance (subject, date, slot, roll_no);
+-- rowid is implicitly the last index column, so this serves "subject = ? ORDER BY id" pages
+CREATE INDEX IF NOT EXISTS idx_attendance_subject ON attendance (subject);
+-- Summaries. For PRESENT, count = distinct classes (dates) / students attended, repeat
+-- scans don't count twice; for every other status, count = rejected scans.
+CREATE TABLE IF NOT EXISTS summary_class (      -- classes held: dates with any row
+    subject  TEXT NOT NULL,
+    slot     TEXT NOT NULL,
+    sessions INTEGER NOT NULL,
+    PRIMARY KEY (subject, slot)
+);
+CREATE TABLE IF NOT EXISTS summary_student (
+    subject  TEXT NOT NULL,
+    slot     TEXT NOT NULL,
+    roll_no  TEXT NOT NULL,
+    status   TEXT NOT NULL,
+    count    INTEGER NOT NULL,
+    PRIMARY KEY (subject, slot, roll_no, status)
+);
+CREATE INDEX IF NOT EXISTS idx_summary_student_roll ON summary_student (roll_no);
+CREATE TABLE IF NOT EXISTS summary_daily (
+    subject  TEXT NOT NULL,
+    date     TEXT NOT NULL,
+    slot     TEXT NOT NULL,
+    status   TEXT NOT NULL,
+    count    INTEGER NOT NULL,
+    PRIMARY KEY (subject, date, slot, status)
+);
+CREATE TRIGGER IF NOT EXISTS attendance_summaries AFTER INSERT ON attendance BEGIN
+    INSERT INTO summary_class (subject, slot, sessions)
+        SELECT NEW.subject, NEW.slot, NOT EXISTS (
+            SELECT 1 FROM attendance WHERE subject = NEW.subject AND date = NEW.date
+                AND slot = NEW.slot AND id <> NEW.id) WHERE 1
+        ON CONFLICT (subject, slot) DO UPDATE SET sessions = sessions + excluded.sessions;
+    INSERT INTO summary_student (subject, slot, roll_no, status, count)
+        SELECT NEW.subject, NEW.slot, NEW.roll_no, NEW.status, NEW.status <> 'VALID' OR NOT EXISTS (
+            SELECT 1 FROM attendance WHERE subject = NEW.subject AND date = NEW.date AND slot = NEW.slot
+                AND roll_no = NEW.roll_no AND status = NEW.status AND id <> NEW.id) WHERE 1
+        ON CONFLICT (subject, slot, roll_no, status) DO UPDATE SET count = count + excluded.count;
+    INSERT INTO summary_daily (subject, date, slot, status, count)
+        SELECT NEW.subject, NEW.date, NEW.slot, NEW.status, NEW.status <> 'VALID' OR NOT EXISTS (
+            SELECT 1 FROM attendance WHERE subject = NEW.subject AND date = NEW.date AND slot = NEW.slot
+                AND roll_no = NEW.roll_no AND status = NEW.status AND id <> NEW.id) WHERE 1
+        ON CONFLICT (subject, date, slot, status) DO UPDATE SET count = count + excluded.count;
+END;
+CREATE TABLE IF NOT EXISTS csv_imports (
+    file      TEXT PRIMARY KEY,
+    rows      INTEGER NOT NULL,
+    imported  TEXT NOT NULL
+);
+"""
+
+
+class AttendanceStore:
+    """Attendance rows in SQLite with batched, write-behind inserts"""
+
+    def __init__(self, path=DB_FILE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        # "with conn" only commits; closing() also releases the setup connection
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SUMMARY_VERSION:
+                # Database from before the summary tables (or an older layout of them)
+                self.rebuild_summaries(conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        """Per-thread connection (sqlite3 connections must not be shared across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ---- writes ----
+
+    def append(self, subject, date, slot, roll_no, status, station=None, timestamp=None):
+        """Queue one attendance row; it is committed by the writer thread shortly after."""
+        row = (subject, date, slot, roll_no, status,
+               timestamp or datetime.now().isoformat(), station)
+        self._ensure_writer()
+        self._queue.put(row)
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="attendance-writer",
+                                                daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                with ATTENDANCE_WRITE_SECONDS.time():
+                    written = self._insert(conn, batch)
+                ATTENDANCE_ROWS_WRITTEN.inc(written)
+            except sqlite3.Error as e:
+                print(f"❌ Failed to write {len(batch)} attendance rows: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _insert(self, conn, rows):
+        """Insert rows, skipping repeat PRESENT rows of a class. Returns rows inserted."""
+        with conn:
+            return conn.executemany(
+                "INSERT INTO attendance (subject, date, slot, roll_no, status, timestamp, station) "
+                "SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7 WHERE ?5 <> ?8 OR NOT EXISTS ("
+                "SELECT 1 FROM attendance WHERE subject = ?1 AND date = ?2 AND slot = ?3 "
+                "AND roll_no = ?4 AND status = ?8)", [tuple(row) + (PRESENT,) for row in rows]).rowcount
+
+    def flush(self):
+        """Block until every queued row has been committed."""
+        self._queue.join()
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    # ---- reads ----
+
+    @staticmethod
+    def _where(subject, filters, after):
+        """WHERE clause + params for a subject, optional filters and an id cursor."""
+        clauses, params = ["subject = ?"], [subject]
+        filters = filters or {}
+        for name, condition in FILTER_SQL.items():
+            value = filters.get(name)
+            if value:
+                clauses.append(condition)
+                params.append(value)
+        if after:
+            clauses.append("id > ?")
+            params.append(int(after))
+        return " AND ".join(clauses), params
+
+    def query(self, subject, date=None):
+        """All rows for a subject (optionally one date) in insertion order."""
+        return list(self.iter_rows(subject, {"date": date}))
+
+    def query_page(self, subject, filters=None, limit=DEFAULT_PAGE_SIZE, after=None):
+        """
+        One page of rows in insertion order, keyset-paginated on row id.
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        self.flush()
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        where, params = self._where(subject, filters, after)
+        sql = f"SELECT id, {', '.join(COLUMNS)} FROM attendance WHERE {where} ORDER BY id LIMIT ?"
+        rows = [dict(r) for r in self._conn().execute(sql, params + [limit + 1])]
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        rows = rows[:limit]
+        for r in rows:
+            del r["id"]
+        return rows, next_cursor
+
+    def iter_rows(self, subject, filters=None, chunk=EXPORT_CHUNK):
+        """Yield matching rows as dicts, fetching chunk rows at a time (never the whole result)."""
+        self.flush()
+        conn = self._connect()  # own connection: generators may be consumed on another thread
+        try:
+            after = None
+            while True:
+                where, params = self._where(subject, filters, after)
+                sql = f"SELECT id, {', '.join(COLUMNS)} FROM attendance WHERE {where} ORDER BY id LIMIT ?"
+                rows = conn.execute(sql, params + [chunk]).fetchall()
+                for r in rows:
+                    d = dict(r)
+                    after = d.pop("id")
+                    yield d
+                if len(rows) < chunk:
+                    return
+        finally:
+            conn.close()
+
+    def marked_rolls(self, subject, date, slot):
+        """Roll numbers marked present in one class (committed rows only)."""
+        return {r["roll_no"] for r in self._conn().execute(
+            "SELECT DISTINCT roll_no FROM attendance WHERE subject = ? AND date = ? AND slot = ? "
+            "AND status = ?", (subject, date, slot, PRESENT))}
+
+    # ---- summaries ----
+
+    def rebuild_summaries(self, conn=None):
+        """Recompute every summary table from the attendance rows (one transaction)."""
+        conn = conn or self._conn()
+        started = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM summary_class")
+            conn.execute("DELETE FROM summary_student")
+            conn.execute("DELETE FROM summary_daily")
+            conn.execute("INSERT INTO summary_class SELECT subject, slot, COUNT(DISTINCT date) "
+                         "FROM attendance GROUP BY subject, slot")
+            conn.execute("INSERT INTO summary_student SELECT subject, slot, roll_no, status, "
+                         "CASE WHEN status = ? THEN COUNT(DISTINCT date) ELSE COUNT(*) END "
+                         "FROM attendance GROUP BY subject, slot, roll_no, status", (PRESENT,))
+            conn.execute("INSERT INTO summary_daily SELECT subject, date, slot, status, "
+                         "CASE WHEN status = ? THEN COUNT(DISTINCT roll_no) ELSE COUNT(*) END "
+                         "FROM attendance GROUP BY subject, date, slot, status", (PRESENT,))
+            conn.execute(f"PRAGMA user_version = {SUMMARY_VERSION}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"📊 Attendance summaries rebuilt in {time.time() - started:.2f}s")
+
+    @staticmethod
+    def _student_entry(roll_no, slots, sessions_by_slot, counts):
+        """Percentage entry for one student from their slots and per-status counts."""
+        sessions = sum(sessions_by_slot.get(slot, 0) for slot in slots)
+        present = counts.pop(PRESENT, 0)
+        return {
+            "roll_no": roll_no,
+            "sessions": sessions,
+            "present": present,
+            "absent": max(sessions - present, 0),
+            "percentage": round(100.0 * present / sessions, 1) if sessions else None,
+            "rejected": counts,
+        }
+
+    def subject_summary(self, subject, roster=None):
+        """
+        Per-student attendance for a subject. Each student is measured against
+        the classes held in the slots they attend: those in roster
+        ({slot: roll numbers}, from the schedule) plus any slot they scanned in.
+        """
+        self.flush()
+        conn = self._conn()
+        sessions_by_slot = {r["slot"]: r["sessions"] for r in conn.execute(
+            "SELECT slot, sessions FROM summary_class WHERE subject = ?", (subject,))}
+        slots, counts = {}, {}
+        for slot, rolls in (roster or {}).items():
+            for roll in rolls:
+                slots.setdefault(roll, set()).add(slot)
+                counts.setdefault(roll, {})
+        for r in conn.execute("SELECT slot, roll_no, status, count FROM summary_student WHERE subject = ?",
+                              (subject,)):
+            slots.setdefault(r["roll_no"], set()).add(r["slot"])
+            student = counts.setdefault(r["roll_no"], {})
+            student[r["status"]] = student.get(r["status"], 0) + r["count"]
+        return {
+            "subject": subject,
+            "sessions": sessions_by_slot,
+            "students": [self._student_entry(roll, slots[roll], sessions_by_slot, counts[roll])
+                         for roll in sorted(counts)],
+        }
+
+    def student_summary(self, roll_no, roster=None):
+        """Attendance of one student in every subject (roster: {subject: slots they attend})."""
+        self.flush()
+        conn = self._conn()
+        slots, counts = {}, {}
+        for subject, subject_slots in (roster or {}).items():
+            slots.setdefault(subject, set()).update(subject_slots)
+            counts.setdefault(subject, {})
+        for r in conn.execute("SELECT subject, slot, status, count FROM summary_student WHERE roll_no = ?",
+                              (roll_no,)):
+            slots.setdefault(r["subject"], set()).add(r["slot"])
+            subject = counts.setdefault(r["subject"], {})
+            subject[r["status"]] = subject.get(r["status"], 0) + r["count"]
+        subjects = []
+        for subject in sorted(counts):
+            sessions_by_slot = {r["slot"]: r["sessions"] for r in conn.execute(
+                "SELECT slot, sessions FROM summary_class WHERE subject = ?", (subject,))}
+            entry = self._student_entry(roll_no, slots[subject], sessions_by_slot, counts[subject])
+            del entry["roll_no"]
+            subjects.append({"subject": subject, **entry})
+        return {"roll_no": roll_no, "subjects": subjects}
+
+    def daily_summary(self, subject, date_from=None, date_to=None):
+        """Per class (date + slot) counts: students present and rejected scans by status."""
+        self.flush()
+        clauses, params = ["subject = ?"], [subject]
+        if date_from:
+            clauses.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("date <= ?")
+            params.append(date_to)
+        days = {}
+        for r in self._conn().execute(
+                f"SELECT date, slot, status, count FROM summary_daily WHERE {' AND '.join(clauses)} "
+                "ORDER BY date, slot", params):
+            day = days.setdefault((r["date"], r["slot"]),
+                                  {"date": r["date"], "slot": r["slot"], "present": 0, "rejected": {}})
+            if r["status"] == PRESENT:
+                day["present"] = r["count"]
+            else:
+                day["rejected"][r["status"]] = r["count"]
+        return {"subject": subject, "days": list(days.values())}
+
+    # ---- CSV import ----
+
+    def import_csv_dir(self, directory=CSV_DIR):
+        """
+        Import subject_attendance/<subject>.csv files not imported before.
+        Returns {subject: rows imported}.
+        """
+        directory = Path(directory)
+        if not directory.is_dir():
+            return {}
+        conn = self._conn()
+        done = {r["file"] for r in conn.execute("SELECT file FROM csv_imports")}
+        imported = {}
+        for fname in sorted(directory.glob("*.csv")):
+            key = str(fname.resolve())
+            if key in done:
+                continue
+            subject = fname.stem
+            with open(fname, newline="") as f:
+                rows = [(subject, r["date"], r["slot"], r["roll_no"], r["status"],
+                         r.get("timestamp") or "", r.get("station"))
+                        for r in csv.DictReader(f)]
+            with conn:
+                written = self._insert(conn, rows)
+                conn.execute("INSERT INTO csv_imports (file, rows, imported) VALUES (?, ?, ?)",
+                             (key, written, datetime.now().isoformat()))
+            imported[subject] = written
+            print(f"📥 Imported {written} rows from {fname.name}"
+                  + (f" ({len(rows) - written} repeat VALID rows skipped)" if written < len(rows) else ""))
+        return imported
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "import":
+        source = sys.argv[2] if len(sys.argv) > 2 else CSV_DIR
+        result = AttendanceStore().import_csv_dir(source)
+        print(f"✅ Imported {sum(result.values())} rows for {len(result)} subjects into {DB_FILE}")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "rebuild-summaries":
+        AttendanceStore().rebuild_summaries()
+    else:
+        print("Usage: python attendance_store.py import [csv_dir] | rebuild-summaries")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+barcode_engine.py
+Pluggable barcode decoding with region-of-interest tracking.
+
+Backends (BARCODE_BACKEND env var), each a function
+frame -> [(payload, (x, y, w, h))] with boxes in frame pixels:
+
+    pyzbar       zbar on a full-resolution grayscale copy (default; 1-D codes and QR)
+    pyzbar-fast  zbar on a grayscale copy downscaled to BARCODE_FAST_WIDTH
+                 (default 640 px) wide; much cheaper on HD webcams, misses
+                 codes that end up too small
+    opencv       OpenCV's cv2.barcode detector, no libzbar needed (1-D
+                 EAN/UPC family only, no QR)
+
+zbar only reads one 8-bit channel: given a BGR frame pyzbar silently uses
+the blue channel, so every backend is handed a proper grayscale image.
+
+BarcodeEngine (one per scan pipeline) remembers where the last barcode was
+and decodes only a crop around it (padded by ROI_MARGIN box widths and
+heights) on the following frames. The whole frame is searched again as soon
+as the crop comes up empty, and every FULL_SCAN_EVERY frames anyway so a
+second card in view is still noticed. BARCODE_ROI=0 always decodes the full frame.
+
+Pick the backend for a deployment by replaying recorded frames:
+    python benchmark.py barcodes recordings/frames/ [--backends pyzbar opencv]
+"""
+
+import os
+import threading
+
+import cv2
+
+BARCODE_BACKEND = os.environ.get("BARCODE_BACKEND", "pyzbar")
+BARCODE_ROI = os.environ.get("BARCODE_ROI", "1") == "1"
+FAST_WIDTH = int(os.environ.get("BARCODE_FAST_WIDTH", 640))
+ROI_MARGIN = 0.75       # padding around the last barcode box, in box widths/heights per side
+ROI_MAX_AREA = 0.5      # a crop bigger than this fraction of the frame isn't worth it
+FULL_SCAN_EVERY = 10    # frames between forced full-frame searches while tracking
+
+
+def _gray(frame):
+    return frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def decode_pyzbar(frame):
+    from pyzbar.pyzbar import decode  # loads libzbar on first use (see warmup.py)
+    return [(barcode.data.decode("utf-8").strip(), tuple(barcode.rect))
+            for barcode in decode(_gray(frame))]
+
+
+def decode_pyzbar_fast(frame):
+    gray = _gray(frame)
+    height, width = gray.shape[:2]
+    if width <= FAST_WIDTH:
+        return decode_pyzbar(gray)
+    scale = FAST_WIDTH / width
+    small = cv2.resize(gray, (FAST_WIDTH, round(height * scale)), interpolation=cv2.INTER_AREA)
+    return [(data, tuple(round(v / scale) for v in box)) for data, box in decode_pyzbar(small)]
+
+
+_local = threading.local()  # cv2 detectors are not shared between threads
+
+
+def decode_opencv(frame):
+    detector = getattr(_local, "barcode_detector", None)
+    if detector is None:
+        detector = _local.barcode_detector = cv2.barcode.BarcodeDetector()
+    ok, payloads, _, points = detector.detectAndDecodeWithType(_gray(frame))
+    if not ok:
+        return []
+    # Detected but undecodable codes come back as empty strings
+    return [(data.strip(), cv2.boundingRect(corners.astype("int32")))
+            for data, corners in zip(payloads, points) if data]
+
+
+BACKENDS = {"pyzbar": decode_pyzbar, "pyzbar-fast": decode_pyzbar_fast}
+if hasattr(cv2, "barcode"):  # OpenCV >= 4.8 or an opencv-contrib build
+    BACKENDS["opencv"] = decode_opencv
+
+
+def get_backend(name=BARCODE_BACKEND):
+    """Decode function for a backend name; ValueError if unknown or not available here."""
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown barcode backend {name!r} (available: {', '.join(BACKENDS)})") from None
+
+
+def decode_frame(frame, backend=BARCODE_BACKEND):
+    """Stateless full-frame decode, returns the stripped payloads."""
+    return [data for data, _ in get_backend(backend)(frame)]
+
+
+class BarcodeEngine:
+    """Decodes one frame stream with a backend, searching near the last barcode first"""
+
+    def __init__(self, backend=BARCODE_BACKEND, roi=BARCODE_ROI, margin=ROI_MARGIN,
+                 full_every=FULL_SCAN_EVERY):
+        self.backend_name = backend
+        self.backend = get_backend(backend)
+        self.roi_enabled = roi
+        self.margin = margin
+        self.full_every = full_every
+        self.roi = None             # (x0, y0, x1, y1) to search first, or None
+        self._shape = None
+        self._since_full = 0
+        self.stats = {"roi_scans": 0, "roi_hits": 0, "full_scans": 0}
+
+    def decode(self, frame):
+        """Payloads of the barcodes in frame (drop-in for decode_frame)."""
+        return [data for data, _ in self.detect(frame)]
+
+    def detect(self, frame):
+        """[(payload, (x, y, w, h))] of the barcodes in frame."""
+        if frame.shape != self._shape:
+            self._shape = frame.shape   # capture size changed (adaptive.py): old box is meaningless
+            self.roi = None
+        if self.roi is not None and self._since_full < self.full_every:
+            self._since_full += 1
+            found = self._detect_roi(frame)
+            if found:
+                return found
+        self._since_full = 0
+        self.stats["full_scans"] += 1
+        found = self.backend(frame)
+        self._track(found)
+        return found
+
+    def _detect_roi(self, frame):
+        x0, y0, x1, y1 = self.roi
+        self.stats["roi_scans"] += 1
+        found = [(data, (x + x0, y + y0, w, h)) for data, (x, y, w, h) in self.backend(frame[y0:y1, x0:x1])]
+        if found:
+            self.stats["roi_hits"] += 1
+            self._track(found)
+        return found
+
+    def _track(self, found):
+        """Search around these barcodes next (or everywhere if there are none)."""
+        if not self.roi_enabled or not found:
+            self.roi = None
+            return
+        height, width = self._shape[:2]
+        xs0, ys0, xs1, ys1 = [], [], [], []
+        for _, (x, y, w, h) in found:
+            pad_x, pad_y = self.margin * w, self.margin * h
+            xs0.append(x - pad_x)
+            ys0.append(y - pad_y)
+            xs1.append(x + w + pad_x)
+            ys1.append(y + h + pad_y)
+        x0, y0 = max(0, int(min(xs0))), max(0, int(min(ys0)))
+        x1, y1 = min(width, int(max(xs1))), min(height, int(max(ys1)))
+        area = (x1 - x0) * (y1 - y0)
+        self.roi = (x0, y0, x1, y1) if 0 < area <= ROI_MAX_AREA * width * height else None
+
+    def to_dict(self):
+        return {"backend": self.backend_name, "roi": self.roi_enabled, **self.stats}
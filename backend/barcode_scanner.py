@@ -3,150 +3,287 @@
 barcode_scanner.py
 
 Provides a scan_once(...) function that will:
-- open webcam
+- subscribe to the shared camera capture thread
 - wait for first barcode detection (or timeout)
 - run face verification against stored face_data.json
 - return a dict with status and roll_no
+
+and verify_frames(...), the same checks on uploaded frames with no camera.
 """
 
 import cv2
-from pyzbar.pyzbar import decode
 import re
 import time
-import json
-import os
-os.environ['QT_QPA_PLATFORM'] = 'xcb'  # Force X11
-os.environ.pop('WAYLAND_DISPLAY', None)  # Disable Wayland
-import numpy as np
-import face_recognition
 from datetime import datetime
+from preview import HEADLESS, preview_for
 from camera_manager import camera_manager
+from face_index import face_index
+from scan_pipeline import ScanPipeline, StageTimer, CACHED_FACE
+from face_worker import encode_largest_face, get_face_pool, DETECT_SCALE
+from barcode_engine import BarcodeEngine, decode_frame
+from marked_index import ALREADY_MARKED
 
 # === Config ===
 CAM_INDEX = 0
 ROLL_REGEX = re.compile(r'^\d{9}$')
-DB_FILE = "face_data.json"
 SIMILARITY_THRESHOLD = 0.4
 DUPLICATE_COOLDOWN = 1.0  # in seconds for internal debounce
+MAX_VERIFY_FRAMES = 10    # frames accepted by verify_frames() per call
 # ============
 
-# Load face DB (will re-load each scan)
-def load_face_db():
-    if os.path.exists(DB_FILE):
-        try:
-            with open(DB_FILE, "r") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-    return {}
 
+def decode_rolls(frame):
+    """Decode every barcode in the whole frame (BARCODE_BACKEND), return the stripped payloads."""
+    return decode_frame(frame)
 
 
-def scan_once(expected_students: list = None, timeout: int = 30):
+class ScanPolicy:
+    """
+    What to do with a decoded barcode and, later, the face seen with it.
+    Shared by scan_once() and walk-through sessions (walkthrough.py); plugs
+    into ScanPipeline as its check_barcode/complete hooks.
     """
-    Open camera and wait for a barcode. When barcode is detected, attempt face match.
+
+    def __init__(self, expected_students=None, cooldown=DUPLICATE_COOLDOWN, screen=None,
+                 already_marked=None):
+        self.expected_students = expected_students
+        self.cooldown = cooldown
+        self.screen = screen  # optional roll -> rejection status (or None), checked before face work
+        self.already_marked = already_marked  # optional roll -> True if already present in this class
+        self.last_seen = {}
+
+    def recently_seen(self, raw):
+        """True if raw was handled less than cooldown seconds ago (otherwise remember it now)."""
+        last = self.last_seen.get(raw)
+        now = time.time()
+        if last and (now - last) < self.cooldown:
+            return True
+        self.last_seen[raw] = now
+        return False
+
+    def check_barcode(self, raw):
+        if not ROLL_REGEX.match(raw):
+            print(f"❌ Invalid format: {raw}")
+            # Damaged/misread barcode: answer now; look up who the face belongs to (1:N)
+            # only if the tracker already has its encoding, never wait for the face pool
+            return {"ok": False, "status": "INVALID_FORMAT", "roll_no": raw}, CACHED_FACE
+
+        if self.recently_seen(raw):
+            return None, False
+        print(f"🔍 Barcode detected: {raw}")
+
+        if self.already_marked is not None and self.already_marked(raw):
+            print(f"✔️ {raw} already marked, skipping face check")
+            return {"ok": True, "status": ALREADY_MARKED, "roll_no": raw,
+                    "message": "Attendance already marked"}, False
+
+        if self.expected_students is not None and raw not in self.expected_students:
+            print(f"⚠️ Student {raw} not in expected list")
+            return {"ok": False, "status": "NOT_PART_OF_CLASS", "roll_no": raw}, False
+
+        if self.screen is not None:
+            status = self.screen(raw)
+            if status:
+                print(f"⚠️ Student {raw} rejected: {status}")
+                return {"ok": False, "status": status, "roll_no": raw}, False
+
+        if raw not in face_index:
+            print(f"❌ No enrollment record for {raw}")
+            return {"ok": False, "status": "NO_RECORD", "roll_no": raw}, False
+
+        return None, True
+
+    def complete(self, raw, result, live_embedding, timer):
+        if result is not None:
+            # INVALID_FORMAT: attach the 1:N identification if the face is cached and known
+            if live_embedding is not None:
+                with timer.stage("match"):
+                    matches = face_index.identify(live_embedding, threshold=SIMILARITY_THRESHOLD)
+                if matches:
+                    result["identified_roll"], result["distance"] = matches[0]
+            return result
+
+        if live_embedding is None:
+            print(f"❌ No face detected for {raw}")
+            return {"ok": False, "status": "NO_FACE", "roll_no": raw}
+
+        with timer.stage("match"):
+            dist = face_index.verify(raw, live_embedding)
+        if dist is None:
+            # Enrollment removed or replaced since check_barcode looked it up
+            print(f"❌ No enrollment record for {raw}")
+            return {"ok": False, "status": "NO_RECORD", "roll_no": raw}
+
+        print(f"📊 Face distance: {dist:.3f} (threshold: {SIMILARITY_THRESHOLD})")
+
+        if dist < SIMILARITY_THRESHOLD:
+            print(f"✅ Valid attendance for {raw}")
+            return {"ok": True, "status": "VALID", "roll_no": raw, "distance": float(dist)}
+        else:
+            print(f"❌ Face mismatch for {raw}")
+            return {"ok": False, "status": "FACE_MISMATCH", "roll_no": raw, "distance": float(dist)}
+
+
+def scan_once(expected_students: list = None, timeout: int = 30, camera=None, already_marked=None,
+              screen=None):
+    """
+    Wait for a barcode on the shared camera feed. When barcode is detected, attempt face match.
+
+    Work is split across threads (see scan_pipeline.py): the capture thread
+    keeps publishing frames, a decoder thread runs the barcode decode and the
+    roll number format / roster / enrollment checks on every fresh frame, and
+    only a roll number that passes them sends that frame to the shared face
+    pool for detection (downscaled) and encoding (largest face, full res).
+    Barcodes are decoded near the last one seen first (barcode_engine.py).
+    Per-stage timings are returned under "timings", the camera's adaptive
+    quality level (adaptive.py) under "adaptive" and the barcode engine's
+    backend and ROI counters under "barcode".
+
+    camera selects the station's CameraManager (default: CAMERA_SOURCE).
+    already_marked (roll -> bool) answers repeat scans with ALREADY_MARKED
+    and screen (roll -> rejection status or None, e.g. the slot's roster)
+    rejects a roll before any face work.
+    In HEADLESS mode no OpenCV window is used; status goes to the camera's
+    browser preview instead.
     """
+    camera = camera or camera_manager
+    preview = preview_for(camera)
     start = time.time()
     cap = None
+    pipeline = None
     window_name = "Attendance Scanner - Show Barcode + Face"
-    
+    policy = ScanPolicy(expected_students, screen=screen, already_marked=already_marked)
+    engine = BarcodeEngine()
+
+    def finish(result):
+        if pipeline is not None:
+            timings = pipeline.timer.as_dict()
+            timings["verdict_ms"] = round((time.time() - start) * 1000.0, 2)
+            result["timings"] = timings
+            result["adaptive"] = camera.adaptive.to_dict()
+            result["barcode"] = engine.to_dict()
+        return result
+
     try:
-        cap = camera_manager.acquire_camera()
+        cap = camera.subscribe()
         
         if cap is None:
             return {"ok": False, "status": "CAMERA_ERROR", "message": "Cannot open camera"}
 
-        # Create window explicitly
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)
-        cv2.waitKey(1)
+        if not HEADLESS:
+            # Create window explicitly
+            cv2.namedWindow(window_name, cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)
+            cv2.waitKey(1)
         
-        last_seen = {}
+        pipeline = ScanPipeline(cap, engine.decode, policy.check_barcode, policy.complete,
+                                adaptive=camera.adaptive).start()
         print(f"📸 Camera opened. Waiting for barcode... (timeout: {timeout}s)")
         
         while True:
             elapsed = time.time() - start
             if elapsed > timeout:
                 print(f"⏱ Timeout after {elapsed:.1f}s")
-                return {"ok": False, "status": "TIMEOUT", "message": "No barcode detected within timeout"}
+                return finish({"ok": False, "status": "TIMEOUT", "message": "No barcode detected within timeout"})
 
-            ret, frame = cap.read()
-            if not ret:
-                time.sleep(0.05)
-                continue
+            # Headless: nothing to pump on this thread, just wait for the workers
+            verdict = pipeline.next_verdict(timeout=0.25 if HEADLESS else 0.03)
+            if verdict is not None:
+                return finish(verdict)
 
-            barcodes = decode(frame)
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb)
-            face_encodings = face_recognition.face_encodings(rgb, face_locations)
+            status_text = f"Time: {int(elapsed)}s | Barcodes: {len(pipeline.last_rolls)}"
+            if HEADLESS:
+                if preview.watched:
+                    preview.annotate([status_text, "Show barcode + face"])
+                continue
 
-            status_text = f"Time: {int(elapsed)}s | Faces: {len(face_encodings)} | Barcodes: {len(barcodes)}"
+            frame = pipeline.last_frame
+            if frame is None:
+                continue
+            # Frames are shared with other consumers; never draw on the original
+            frame = frame.copy()
             cv2.putText(frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
             cv2.putText(frame, "Press Q or ESC to cancel", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
 
-            for barcode in barcodes:
-                raw = barcode.data.decode('utf-8').strip()
-                print(f"🔍 Barcode detected: {raw}")
-                
-                if not ROLL_REGEX.match(raw):
-                    print(f"❌ Invalid format: {raw}")
-                    return {"ok": False, "status": "INVALID_FORMAT", "roll_no": raw}
-
-                last = last_seen.get(raw)
-                now = time.time()
-                if last and (now - last) < DUPLICATE_COOLDOWN:
-                    continue
-                last_seen[raw] = now
-
-                if expected_students is not None and raw not in expected_students:
-                    print(f"⚠️ Student {raw} not in expected list")
-                    return {"ok": False, "status": "NOT_PART_OF_CLASS", "roll_no": raw}
-
-                face_db = load_face_db()
-                if raw not in face_db:
-                    print(f"❌ No enrollment record for {raw}")
-                    return {"ok": False, "status": "NO_RECORD", "roll_no": raw}
-
-                if not face_encodings:
-                    print(f"❌ No face detected for {raw}")
-                    return {"ok": False, "status": "NO_FACE", "roll_no": raw}
-
-                stored_embedding = np.array(face_db[raw])
-                live_embedding = face_encodings[0]
-                dist = face_recognition.face_distance([stored_embedding], live_embedding)[0]
-
-                print(f"📊 Face distance: {dist:.3f} (threshold: {SIMILARITY_THRESHOLD})")
-
-                if dist < SIMILARITY_THRESHOLD:
-                    print(f"✅ Valid attendance for {raw}")
-                    return {"ok": True, "status": "VALID", "roll_no": raw, "distance": float(dist)}
-                else:
-                    print(f"❌ Face mismatch for {raw}")
-                    return {"ok": False, "status": "FACE_MISMATCH", "roll_no": raw, "distance": float(dist)}
-
             # Show frame with explicit window name
             cv2.imshow(window_name, frame)
             key = cv2.waitKey(1) & 0xFF
             if key == ord('q') or key == 27:
                 print("⚠️ Scan cancelled by user")
-                return {"ok": False, "status": "ABORTED_BY_USER"}
+                return finish({"ok": False, "status": "ABORTED_BY_USER"})
                 
     except KeyboardInterrupt:
         print("\n⚠️ Interrupted by user")
-        return {"ok": False, "status": "INTERRUPTED"}
+        return finish({"ok": False, "status": "INTERRUPTED"})
         
     except Exception as e:
         print(f"❌ Error during scan: {str(e)}")
-        return {"ok": False, "status": "ERROR", "message": str(e)}
+        return finish({"ok": False, "status": "ERROR", "message": str(e)})
         
     finally:
+        if pipeline is not None:
+            pipeline.stop()
         # Destroy the specific window
-        try:
-            cv2.destroyWindow(window_name)
-        except:
-            pass
-        camera_manager.release_camera(cap)
+        if not HEADLESS:
+            try:
+                cv2.destroyWindow(window_name)
+            except:
+                pass
+        if cap is not None:
+            cap.close()
+
+
+def verify_frames(frames, roll_no=None, expected_students=None, screen=None, already_marked=None):
+    """
+    Stateless verification of already-captured BGR frames (e.g. a short burst
+    uploaded by a phone): no camera, no state kept between calls, so any
+    number of worker processes can serve it.
+
+    Without roll_no the frames are decoded in order and the first barcode
+    found is used. The face is taken from the barcode frame, falling back to
+    the other frames until one has a face. Same checks and statuses as
+    scan_once, plus NO_FRAMES and NO_BARCODE.
+    """
+    start = time.time()
+    timer = StageTimer()
+    timer.frames = len(frames)
+    policy = ScanPolicy(expected_students, screen=screen, already_marked=already_marked)
+
+    def finish(result):
+        timings = timer.as_dict()
+        timings["verdict_ms"] = round((time.time() - start) * 1000.0, 2)
+        result["timings"] = timings
+        return result
+
+    if not frames:
+        return finish({"ok": False, "status": "NO_FRAMES", "message": "No frames to verify"})
+
+    ordered = list(frames)
+    if not roll_no:
+        for i, frame in enumerate(frames):
+            with timer.stage("decode"):
+                rolls = decode_rolls(frame)
+            if rolls:
+                roll_no = rolls[0]
+                ordered = [frame] + ordered[:i] + ordered[i + 1:]
+                break
+        else:
+            return finish({"ok": False, "status": "NO_BARCODE", "message": "No barcode in the frames"})
+
+    result, need_face = policy.check_barcode(roll_no)
+    if not need_face or need_face == CACHED_FACE:  # nothing cached here
+        return finish(result)
+
+    pool = get_face_pool()
+    embedding = None
+    for frame in ordered:
+        embedding, timings = pool.submit(encode_largest_face, frame, DETECT_SCALE).result()
+        for stage, ms in timings.items():
+            timer.add(stage, ms)
+        if embedding is not None:
+            break
+    return finish(policy.complete(roll_no, result, embedding, timer))
+
 
-        
 if __name__ == "__main__":
     print("Running standalone scanner: will wait for one barcode then exit.")
     result = scan_once(timeout=60)
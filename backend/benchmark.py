@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+-------------------------------------
+Replay benchmark for the scan and enrollment pipelines, no webcam needed.
+
+Recorded videos or image sequences are fed through the real scan_once() and
+capture_face_embedding() via a file-backed frame source. Results (frames/s,
+time-to-first-barcode, time-to-verdict, per-stage latency percentiles, peak
+RSS) are written as JSON tagged with the git commit, so runs can be compared.
+
+Usage:
+    # synthetic frames: QR codes for the given rolls (+ an optional face photo)
+    python benchmark.py synth bench_frames/ --rolls 102303593 102303594 --face me.jpg
+
+    python benchmark.py run bench_frames/ --runs 20 --output before.json
+    python benchmark.py run recording.mp4 --face-db face_data.json --enroll-runs 3
+    python benchmark.py compare before.json after.json
+
+    # barcode decode backends (barcode_engine.py), with and without ROI tracking
+    python benchmark.py barcodes bench_frames/ --backends pyzbar pyzbar-fast opencv
+
+    # face detector backends (face_detector.py) on a folder of photos or a video
+    python benchmark.py faces photos/ --detectors hog yunet
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+MANIFEST = "manifest.json"
+SYNTH_FACE_DB = "face_db.json"
+PERCENTILES = (50, 90, 99)
+
+
+# ---- synthetic frames ----
+
+def qr_image(data, size):
+    """Black-on-white QR code for data, size x size pixels with a quiet zone."""
+    qr = cv2.QRCodeEncoder.create().encode(data)
+    qr = cv2.copyMakeBorder(qr, 4, 4, 4, 4, cv2.BORDER_CONSTANT, value=255)
+    return cv2.cvtColor(cv2.resize(qr, (size, size), interpolation=cv2.INTER_NEAREST), cv2.COLOR_GRAY2BGR)
+
+
+def synth_frames(out_dir, rolls, width=640, height=480, lead_in=5, barcode_frames=15,
+                 face_path=None, seed=0):
+    """
+    Write a frame sequence to out_dir: for each roll, lead_in frames without a
+    barcode followed by barcode_frames with its QR code (slightly moving).
+    With face_path the face photo is pasted into every frame and a matching
+    face database is written next to the frames. Returns the manifest dict.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    base = np.tile(np.linspace(60, 160, width, dtype=np.uint8), (height, 1))
+    base = cv2.cvtColor(base, cv2.COLOR_GRAY2BGR)
+
+    face = None
+    if face_path:
+        face = cv2.imread(str(face_path))
+        if face is None:
+            raise ValueError(f"Cannot read face image {face_path}")
+        scale = (height * 0.6) / face.shape[0]
+        face = cv2.resize(face, (0, 0), fx=scale, fy=scale)
+        face = face[:, :width // 2]
+
+    qr_size = height // 3
+    index = 0
+    for roll in rolls:
+        qr = qr_image(roll, qr_size)
+        for i in range(lead_in + barcode_frames):
+            frame = base.copy()
+            noise = rng.integers(-8, 9, frame.shape, dtype=np.int16)
+            frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+            if face is not None:
+                fy = (height - face.shape[0]) // 2
+                frame[fy:fy + face.shape[0], 20:20 + face.shape[1]] = face
+            if i >= lead_in:
+                x = width - qr_size - 40 + int(rng.integers(-10, 11))
+                y = (height - qr_size) // 2 + int(rng.integers(-10, 11))
+                frame[y:y + qr_size, x:x + qr_size] = qr
+            cv2.imwrite(str(out_dir / f"{index:06d}.png"), frame)
+            index += 1
+
+    manifest = {
+        "rolls": list(rolls),
+        "frames": index,
+        "size": [width, height],
+        "lead_in": lead_in,
+        "barcode_frames": barcode_frames,
+        "face": bool(face is not None),
+        "expected_status": "VALID" if face is not None else "NO_RECORD",
+    }
+    if face is not None:
+        import face_recognition
+        rgb = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
+        encodings = face_recognition.face_encodings(rgb)
+        if encodings:
+            face_db = {roll: encodings[0].tolist() for roll in rolls}
+            (out_dir / SYNTH_FACE_DB).write_text(json.dumps(face_db))
+        else:
+            print(f"⚠️ No face found in {face_path}, scans will end in NO_FACE/NO_RECORD")
+            manifest["expected_status"] = "NO_RECORD"
+    (out_dir / MANIFEST).write_text(json.dumps(manifest, indent=2))
+    print(f"🖼 Wrote {index} frames for {len(rolls)} rolls to {out_dir}")
+    return manifest
+
+
+# ---- measurement ----
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BASE_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(values):
+    """count/mean/max and percentiles of a list of milliseconds."""
+    if not values:
+        return {"count": 0}
+    arr = np.asarray(values, dtype=np.float64)
+    result = {"count": len(values), "mean": round(float(arr.mean()), 2), "max": round(float(arr.max()), 2)}
+    for p in PERCENTILES:
+        result[f"p{p}"] = round(float(np.percentile(arr, p)), 2)
+    return result
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process and of reaped children (KiB on Linux)."""
+    factor = 1 / 1024 if sys.platform == "darwin" else 1  # macOS reports bytes
+    return {"self": int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * factor),
+            "children": int(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * factor)}
+
+
+def make_camera(source, fps, realtime):
+    from camera_manager import CameraManager, ImageDirSource, VideoFileSource
+    path = Path(source)
+    if path.is_dir():
+        frame_source = ImageDirSource(path, fps=fps, loop=True)
+    else:
+        frame_source = VideoFileSource(path, loop=True, realtime=realtime)
+    return CameraManager(frame_source, name="benchmark")
+
+
+def bench_scans(camera, runs, timeout, expected_rolls=None, expected_status=None):
+    from barcode_scanner import scan_once
+    stages, verdicts, first_barcode, statuses = {}, [], [], {}
+    frames, wall_ms, correct = 0, 0.0, 0
+    for i in range(runs):
+        result = scan_once(timeout=timeout, camera=camera)
+        timings = result.get("timings", {})
+        status = result.get("status")
+        statuses[status] = statuses.get(status, 0) + 1
+        for stage, values in timings.get("samples", {}).items():
+            stages.setdefault(stage, []).extend(values)
+        if "verdict_ms" in timings:
+            wall_ms += timings["verdict_ms"]
+            if status != "TIMEOUT":
+                verdicts.append(timings["verdict_ms"])
+        if "first_barcode_at_ms" in timings:
+            first_barcode.append(timings["first_barcode_at_ms"])
+        frames += timings.get("frames", 0)
+        if expected_status and status == expected_status and (
+                not expected_rolls or result.get("roll_no") in expected_rolls):
+            correct += 1
+        print(f"  scan {i + 1}/{runs}: {status} {result.get('roll_no', '')} "
+              f"({timings.get('verdict_ms', 0):.0f} ms)")
+    report = {
+        "runs": runs,
+        "statuses": statuses,
+        "fps": round(frames / (wall_ms / 1000.0), 2) if wall_ms else 0.0,
+        "time_to_first_barcode_ms": summarize(first_barcode),
+        "time_to_verdict_ms": summarize(verdicts),
+        "stages_ms": {stage: summarize(values) for stage, values in sorted(stages.items())},
+    }
+    if expected_status:
+        report["expected_status"] = expected_status
+        report["correct_rate"] = round(correct / runs, 3) if runs else 0.0
+    return report
+
+
+def bench_enrollments(camera, runs, timeout):
+    from face_scan import capture_face_embedding
+    times, captured = [], 0
+    for i in range(runs):
+        t0 = time.perf_counter()
+        embedding = capture_face_embedding(timeout=timeout, camera=camera)
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        if embedding is not None:
+            captured += 1
+            times.append(elapsed)
+        print(f"  enroll {i + 1}/{runs}: {'captured' if embedding else 'no face'} ({elapsed:.0f} ms)")
+    return {"runs": runs, "captured": captured, "time_to_embedding_ms": summarize(times)}
+
+
+def run_benchmark(source, runs=10, timeout=10.0, enroll_runs=0, fps=15.0, realtime=True,
+                  face_db=None):
+    """Benchmark scan_once (and optionally enrollment) on a recorded source. Returns the results dict."""
+    source = Path(source)
+    manifest = {}
+    if source.is_dir() and (source / MANIFEST).exists():
+        manifest = json.loads((source / MANIFEST).read_text())
+        if face_db is None and (source / SYNTH_FACE_DB).exists():
+            face_db = source / SYNTH_FACE_DB
+
+    # Must be set before the scanner modules (and their globals) are imported
+    os.environ.setdefault("HEADLESS", "1")
+    if face_db:
+        # Throwaway face store migrated from the JSON, never the real one
+        os.environ["FACE_DB"] = str(face_db)
+        os.environ["FACE_STORE"] = tempfile.mkdtemp(prefix="bench_face_store_")
+    from scan_pipeline import StageTimer
+    from face_worker import FACE_POOL, FACE_WORKERS, shutdown_face_pool
+    StageTimer.record_samples = True
+
+    camera = make_camera(source, fps, realtime)
+    started = time.time()
+    try:
+        print(f"⏱ Benchmarking {runs} scans on {source}")
+        scans = bench_scans(camera, runs, timeout, manifest.get("rolls"), manifest.get("expected_status"))
+        enroll = None
+        if enroll_runs:
+            print(f"⏱ Benchmarking {enroll_runs} enrollments")
+            enroll = bench_enrollments(camera, enroll_runs, timeout)
+    finally:
+        camera.shutdown()
+        shutdown_face_pool()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "elapsed_s": round(time.time() - started, 2),
+        "source": str(source),
+        "config": {"runs": runs, "timeout": timeout, "fps": fps, "realtime": realtime,
+                   "face_pool": FACE_POOL, "face_workers": FACE_WORKERS,
+                   "face_tracking": os.environ.get("FACE_TRACKING", "1"),
+                   "python": platform.python_version(), "opencv": cv2.__version__,
+                   "cpu_count": os.cpu_count()},
+        "scan": scans,
+        "enroll": enroll,
+        "adaptive": camera.adaptive.to_dict(),
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def load_frames(source, limit=None):
+    """Every frame of a video file or image directory, in order (at most limit)."""
+    from camera_manager import ImageDirSource, VideoFileSource
+    path = Path(source)
+    frame_source = ImageDirSource(path, fps=0) if path.is_dir() else VideoFileSource(path, realtime=False)
+    frames = []
+    if not frame_source.open():
+        raise ValueError(f"Cannot open {source}")
+    try:
+        while limit is None or len(frames) < limit:
+            ret, frame = frame_source.read()
+            if not ret:
+                break
+            frames.append(frame)
+    finally:
+        frame_source.close()
+    return frames
+
+
+def bench_barcodes(source, backends=None, max_frames=None):
+    """
+    Decode every frame of a recording with each barcode backend, full frame
+    and with ROI tracking. With a synth manifest the decode rate is relative
+    to the frames that show a code, and payloads not in it count as wrong.
+    """
+    from barcode_engine import BACKENDS, BarcodeEngine
+    path = Path(source)
+    manifest = json.loads((path / MANIFEST).read_text()) if (path / MANIFEST).exists() else {}
+    expected = set(manifest.get("rolls", []))
+    frames = load_frames(path, max_frames)
+    code_frames = min(len(frames), len(expected) * manifest.get("barcode_frames", 0)) or None
+    print(f"⏱ Decoding {len(frames)} frames from {source}")
+
+    results = {}
+    for name in backends or list(BACKENDS):
+        for roi in (False, True):
+            label = f"{name}+roi" if roi else name
+            engine = BarcodeEngine(name, roi=roi)
+            times, decoded, wrong, payloads = [], 0, 0, set()
+            for frame in frames:
+                t0 = time.perf_counter()
+                found = engine.decode(frame)
+                times.append((time.perf_counter() - t0) * 1000.0)
+                if found:
+                    decoded += 1
+                payloads.update(found)
+                if expected:
+                    wrong += sum(1 for data in found if data not in expected)
+            report = {"decode_ms": summarize(times), "frames_decoded": decoded,
+                      "payloads": sorted(payloads), **engine.to_dict()}
+            if code_frames:
+                report["decode_rate"] = round(decoded / code_frames, 3)
+                report["wrong"] = wrong
+            results[label] = report
+            print(f"  {label:<18} p50 {report['decode_ms'].get('p50', 0):7.2f} ms  "
+                  f"decoded {decoded}/{code_frames or len(frames)} frames")
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "source": str(source),
+        "frames": len(frames),
+        "code_frames": code_frames,
+        "config": {"python": platform.python_version(), "opencv": cv2.__version__,
+                   "cpu_count": os.cpu_count()},
+        "backends": results,
+    }
+
+
+def bench_faces(source, detectors=None, scale=None, max_frames=None, encode=True):
+    """
+    Run each face detector over every frame of a photo folder or video.
+    Reports latency and detection rate, and how well each agrees with the
+    first detector: IoU of the largest boxes and, with encode, the distance
+    between the 128-D encodings computed from the two boxes (same face, so
+    well under the 0.4 match threshold means the boxes encode alike).
+    """
+    from face_detector import DETECTORS, get_detector
+    from face_worker import detect_faces, largest_face, encode_face, DETECT_SCALE
+    from face_tracker import iou
+    scale = DETECT_SCALE if scale is None else scale
+    detectors = detectors or list(DETECTORS)
+    frames = [cv2.cvtColor(f, cv2.COLOR_BGR2RGB) for f in load_frames(source, max_frames)]
+    print(f"⏱ Detecting faces in {len(frames)} frames from {source} (scale {scale})")
+
+    largest = {}    # detector -> [largest box or None] per frame
+    results = {}
+    for name in detectors:
+        detect_faces(frames[0], scale, name)  # load models outside the timing
+        times, boxes, faces = [], [], 0
+        for rgb in frames:
+            t0 = time.perf_counter()
+            found = detect_faces(rgb, scale, name)
+            times.append((time.perf_counter() - t0) * 1000.0)
+            faces += len(found)
+            boxes.append(largest_face(found) if found else None)
+        largest[name] = boxes
+        detected = sum(1 for b in boxes if b is not None)
+        results[name] = {"detect_ms": summarize(times), "frames_with_face": detected,
+                         "detection_rate": round(detected / len(frames), 3) if frames else 0.0,
+                         "faces": faces, "fallback_to_hog": get_detector(name) is not DETECTORS[name]}
+        print(f"  {name:<8} p50 {results[name]['detect_ms'].get('p50', 0):8.2f} ms  "
+              f"faces in {detected}/{len(frames)} frames")
+
+    reference = detectors[0]
+    for name in detectors[1:]:
+        pairs = [(i, a, b) for i, (a, b) in enumerate(zip(largest[reference], largest[name]))
+                 if a is not None and b is not None]
+        agreement = {"frames": len(pairs), "iou_mean": round(float(np.mean([iou(a, b) for _, a, b in pairs])), 3)
+                     if pairs else None}
+        if encode and pairs:
+            distances = []
+            for i, a, b in pairs:
+                ea, eb = encode_face(frames[i], a), encode_face(frames[i], b)
+                if ea is not None and eb is not None:
+                    distances.append(float(np.linalg.norm(np.asarray(ea) - np.asarray(eb))))
+            agreement["encoding_distance"] = summarize(distances)
+        results[name][f"vs_{reference}"] = agreement
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "source": str(source),
+        "frames": len(frames),
+        "config": {"scale": scale, "python": platform.python_version(), "opencv": cv2.__version__,
+                   "cpu_count": os.cpu_count()},
+        "detectors": results,
+    }
+
+
+# ---- comparison ----
+
+COMPARE_KEYS = [
+    ("scan", "fps"),
+    ("scan", "time_to_first_barcode_ms", "p50"),
+    ("scan", "time_to_verdict_ms", "p50"),
+    ("scan", "time_to_verdict_ms", "p90"),
+    ("enroll", "time_to_embedding_ms", "p50"),
+    ("peak_rss_kb", "self"),
+]
+
+
+def _lookup(doc, keys):
+    for key in keys:
+        if not isinstance(doc, dict) or key not in doc:
+            return None
+        doc = doc[key]
+    return doc
+
+
+def compare(old, new):
+    """Print headline metrics of two result files side by side."""
+    print(f"{'metric':<40}{old.get('commit') or '?':>14}{new.get('commit') or '?':>14}{'change':>10}")
+    stage_keys = sorted(set(_lookup(old, ("scan", "stages_ms")) or {}) |
+                        set(_lookup(new, ("scan", "stages_ms")) or {}))
+    for keys in COMPARE_KEYS + [("scan", "stages_ms", s, "p50") for s in stage_keys]:
+        a, b = _lookup(old, keys), _lookup(new, keys)
+        change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else ""
+        fmt = lambda v: "-" if v is None else f"{v:g}"
+        print(f"{'.'.join(keys):<40}{fmt(a):>14}{fmt(b):>14}{change:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmark for the scan/enrollment pipelines")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("synth", help="generate synthetic barcode (+ face) frames")
+    p.add_argument("out_dir")
+    p.add_argument("--rolls", nargs="+", default=["102303593"])
+    p.add_argument("--face", help="face photo pasted into every frame")
+    p.add_argument("--size", default="640x480", help="WIDTHxHEIGHT")
+    p.add_argument("--lead-in", type=int, default=5, help="frames without a barcode per roll")
+    p.add_argument("--barcode-frames", type=int, default=15, help="frames with the barcode per roll")
+
+    p = sub.add_parser("run", help="benchmark on a video file or image directory")
+    p.add_argument("source")
+    p.add_argument("--runs", type=int, default=10)
+    p.add_argument("--enroll-runs", type=int, default=0)
+    p.add_argument("--timeout", type=float, default=10.0, help="per scan/enrollment, seconds")
+    p.add_argument("--fps", type=float, default=15.0, help="image playback rate (0 = as fast as possible)")
+    p.add_argument("--no-realtime", action="store_true", help="don't pace video files at their fps")
+    p.add_argument("--face-db", help="face database JSON to verify against")
+    p.add_argument("--output", help="write results JSON here")
+
+    p = sub.add_parser("barcodes", help="compare barcode decode backends on recorded frames")
+    p.add_argument("source")
+    p.add_argument("--backends", nargs="+", help="default: every backend available here")
+    p.add_argument("--max-frames", type=int, help="decode at most this many frames")
+    p.add_argument("--output", help="write results JSON here")
+
+    p = sub.add_parser("faces", help="compare face detector backends on photos or a video")
+    p.add_argument("source")
+    p.add_argument("--detectors", nargs="+", help="default: every detector; the first is the reference")
+    p.add_argument("--scale", type=float, help="detection downscale factor (default: DETECT_SCALE)")
+    p.add_argument("--max-frames", type=int, help="use at most this many frames")
+    p.add_argument("--no-encode", action="store_true", help="skip the encoding agreement check")
+    p.add_argument("--output", help="write results JSON here")
+
+    p = sub.add_parser("compare", help="compare two result files")
+    p.add_argument("old")
+    p.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "synth":
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        synth_frames(args.out_dir, args.rolls, width, height, args.lead_in, args.barcode_frames, args.face)
+    elif args.command in ("run", "barcodes", "faces"):
+        if args.command == "run":
+            results = run_benchmark(args.source, args.runs, args.timeout, args.enroll_runs,
+                                    args.fps, not args.no_realtime, args.face_db)
+        elif args.command == "barcodes":
+            results = bench_barcodes(args.source, args.backends, args.max_frames)
+        else:
+            results = bench_faces(args.source, args.detectors, args.scale, args.max_frames,
+                                  not args.no_encode)
+        text = json.dumps(results, indent=2)
+        if args.output:
+            Path(args.output).write_text(text)
+            print(f"💾 Results written to {args.output}")
+        else:
+            print(text)
+    else:
+        compare(json.loads(Path(args.old).read_text()), json.loads(Path(args.new).read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+bulk_enroll.py
+-------------------------------------
+Offline batch enrollment from photos and short videos.
+
+Media files are matched to students by roll number, either in the file name
+(102303593.jpg, 102303593_2.jpg, 102303593-side.mp4) or by a folder named
+after the roll number (102303593/front.jpg). Detection and encoding run in a
+process pool across all cores; every usable sample is weighted by face size
+and sharpness and folded into one quality-weighted centroid per student.
+All results are committed to the face database in a single write.
+
+Usage:
+    python bulk_enroll.py photos/            # directory
+    python bulk_enroll.py batch.zip          # zip archive
+    python bulk_enroll.py photos/ --workers 4 --dry-run
+"""
+
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from face_worker import detect_faces
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
+ROLL_PATTERN = re.compile(r'^(\d{9})(?:\D.*)?$')
+VIDEO_SAMPLES = 6          # frames sampled evenly from each video
+MAX_IMAGE_SIDE = 1280      # larger photos are downscaled before detection
+OUTLIER_DISTANCE = 0.6     # samples this far from the centroid are dropped (likely another person)
+SHARPNESS_REF = 100.0      # Laplacian variance treated as "fully sharp"
+
+
+def roll_for(path: Path, root: Path):
+    """Roll number from the file name, else from the nearest parent folder name."""
+    match = ROLL_PATTERN.match(path.stem)
+    if match:
+        return match.group(1)
+    for parent in path.relative_to(root).parents:
+        match = ROLL_PATTERN.match(parent.name)
+        if match:
+            return match.group(1)
+    return None
+
+
+def collect_media(root: Path):
+    """({roll: [files]}, [unmatched files]) for every image/video under root."""
+    by_roll, unmatched = {}, []
+    for path in sorted(root.rglob("*")):
+        if not path.is_file():
+            continue
+        if path.suffix.lower() not in IMAGE_EXTENSIONS | VIDEO_EXTENSIONS:
+            continue
+        roll = roll_for(path, root)
+        if roll:
+            by_roll.setdefault(roll, []).append(path)
+        else:
+            unmatched.append(str(path.relative_to(root)))
+    return by_roll, unmatched
+
+
+def extract_archive(archive: Path, dest: Path) -> Path:
+    """Extract a zip archive, refusing entries that would escape dest."""
+    dest = dest.resolve()
+    with zipfile.ZipFile(archive) as zf:
+        for member in zf.namelist():
+            target = (dest / member).resolve()
+            if dest not in target.parents and target != dest:
+                raise ValueError(f"Unsafe path in archive: {member}")
+        zf.extractall(dest)
+    return dest
+
+
+def _sample_quality(rgb, box):
+    """Weight for one face sample: face size times sharpness, both capped to 1."""
+    top, right, bottom, left = box
+    size = min(1.0, max(0, bottom - top) / 150.0)
+    crop = cv2.cvtColor(rgb[top:bottom, left:right], cv2.COLOR_RGB2GRAY)
+    if crop.size == 0:
+        return 0.0
+    sharpness = min(1.0, cv2.Laplacian(crop, cv2.CV_64F).var() / SHARPNESS_REF)
+    return float(size * max(sharpness, 0.05))
+
+
+def _encode_frame(frame):
+    """(embedding list, quality) for the largest face in a BGR frame, or None."""
+    import face_recognition  # loads dlib's models: only in the pool workers, not at app import
+    h, w = frame.shape[:2]
+    scale = min(1.0, MAX_IMAGE_SIDE / max(h, w))
+    if scale < 1.0:
+        frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    locations = detect_faces(rgb, scale=None)
+    if not locations:
+        return None
+    box = max(locations, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]))
+    encodings = face_recognition.face_encodings(rgb, [box])
+    if not encodings:
+        return None
+    return encodings[0].tolist(), _sample_quality(rgb, box)
+
+
+def encode_media(path_str):
+    """
+    Pool job: all usable face samples in one image or video.
+    Returns (path, [(embedding, quality), ...], error or None).
+    """
+    path = Path(path_str)
+    try:
+        frames = []
+        if path.suffix.lower() in VIDEO_EXTENSIONS:
+            cap = cv2.VideoCapture(str(path))
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            positions = np.linspace(0, max(total - 1, 0), VIDEO_SAMPLES).astype(int) if total else []
+            for pos in sorted(set(positions)):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, int(pos))
+                ret, frame = cap.read()
+                if ret:
+                    frames.append(frame)
+            cap.release()
+        else:
+            frame = cv2.imread(str(path))
+            if frame is not None:
+                frames.append(frame)
+        if not frames:
+            return path_str, [], "unreadable file"
+        samples = [s for s in (_encode_frame(f) for f in frames) if s is not None]
+        return path_str, samples, None if samples else "no face detected"
+    except Exception as e:
+        return path_str, [], str(e)
+
+
+def weighted_centroid(samples):
+    """
+    Quality-weighted mean embedding. Samples far from the first centroid are
+    dropped and the mean recomputed. Returns (embedding list, samples used).
+    """
+    vectors = np.array([s[0] for s in samples], dtype=np.float64)
+    weights = np.array([max(s[1], 1e-3) for s in samples])
+    centroid = np.average(vectors, axis=0, weights=weights)
+    if len(samples) > 2:
+        keep = np.linalg.norm(vectors - centroid, axis=1) < OUTLIER_DISTANCE
+        if keep.any() and not keep.all():
+            vectors, weights = vectors[keep], weights[keep]
+            centroid = np.average(vectors, axis=0, weights=weights)
+    return centroid.tolist(), len(vectors)
+
+
+def bulk_enroll(source, workers=None, dry_run=False, progress=None) -> dict:
+    """
+    Enroll every student found in a directory or zip archive.
+    Returns a JSON-serializable report with per-student failures.
+    """
+    # Imported here so pool workers (which import this module) skip the camera stack
+    from face_scan import save_face_embeddings
+
+    start = time.time()
+    source = Path(source)
+    workers = workers or os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory(prefix="bulk_enroll_") as tmp:
+        if source.is_file() and zipfile.is_zipfile(source):
+            root = extract_archive(source, Path(tmp))
+        elif source.is_dir():
+            root = source
+        else:
+            return {"ok": False, "message": f"{source} is not a directory or zip archive"}
+
+        by_roll, unmatched = collect_media(root)
+        files = [p for paths in by_roll.values() for p in paths]
+        file_roll = {str(p): roll for roll, paths in by_roll.items() for p in paths}
+        print(f"📂 {len(files)} files for {len(by_roll)} students ({len(unmatched)} unmatched)")
+
+        samples = {roll: [] for roll in by_roll}
+        file_errors = {roll: [] for roll in by_roll}
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = [pool.submit(encode_media, str(p)) for p in files]
+            for done, future in enumerate(as_completed(futures), 1):
+                path_str, found, error = future.result()
+                roll = file_roll[path_str]
+                samples[roll].extend(found)
+                if error:
+                    file_errors[roll].append(f"{Path(path_str).name}: {error}")
+                if progress:
+                    progress(done, len(files))
+
+    enrolled, failed = {}, {}
+    for roll in sorted(by_roll):
+        if not samples[roll]:
+            failed[roll] = "; ".join(file_errors[roll]) or "no face detected"
+            continue
+        embedding, used = weighted_centroid(samples[roll])
+        enrolled[roll] = {"embedding": embedding, "samples": used, "files": len(by_roll[roll])}
+
+    if enrolled and not dry_run:
+        save_face_embeddings({roll: info["embedding"] for roll, info in enrolled.items()})
+
+    report = {
+        "ok": bool(enrolled),
+        "enrolled": {roll: {"samples": i["samples"], "files": i["files"]} for roll, i in enrolled.items()},
+        "failed": failed,
+        "unmatched_files": unmatched,
+        "files": len(files),
+        "dry_run": dry_run,
+        "elapsed_s": round(time.time() - start, 2),
+    }
+    print(f"✅ Enrolled {len(enrolled)} students, ❌ {len(failed)} failed in {report['elapsed_s']}s")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-enroll students from photos/videos named by roll number")
+    parser.add_argument("source", help="directory or .zip archive")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--dry-run", action="store_true", help="encode and report without saving")
+    args = parser.parse_args()
+    report = bulk_enroll(args.source, workers=args.workers, dry_run=args.dry_run)
+    print(json.dumps({k: v for k, v in report.items() if k != "enrolled"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
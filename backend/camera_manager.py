@@ -1,7 +1,20 @@
 #!/usr/bin/env python3
 """
 camera_manager.py
-Centralized camera management with proper cleanup and mutex locking
+Centralized camera management: one long-lived capture thread per device that
+keeps the source open and publishes the latest frame to any number of consumers.
+
+Frame sources are pluggable so the pipeline can run headless:
+    - V4L2Source:      a local webcam (cv2.VideoCapture index)
+    - VideoFileSource: a recorded video file
+    - ImageDirSource:  a directory of still images, played back as frames
+
+Select the source with the CAMERA_SOURCE env var ("0", "/dev/video2",
+"recording.mp4", "frames/"), default is webcam index 0. Webcam capture mode:
+CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS (default: whatever the device picks).
+
+Each camera also has an adaptive quality controller (adaptive.py) that may
+cap the delivered frame width on slow machines.
 """
 
 import cv2
@@ -9,116 +22,534 @@ import time
 import threading
 import subprocess
 import os
+from collections import deque
+from pathlib import Path
+from metrics import (CAMERA_ACQUIRE_SECONDS, CAMERA_RELEASE_SECONDS,
+                     CAMERA_OPEN_RETRIES, CAMERA_OPEN_FAILURES)
+from adaptive import AdaptiveController
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+RING_SIZE = 8              # recent frames kept for consumers that want a burst
+IDLE_READ_SLEEP = 0.05     # back-off when the source returns no frame
+
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+CAPTURE_CONFIG = {"width": _env_int("CAMERA_WIDTH"), "height": _env_int("CAMERA_HEIGHT"),
+                  "fps": _env_int("CAMERA_FPS")}
+
+
+class FrameSource:
+    """Interface for anything that can produce BGR frames."""
+    name = "source"
+
+    def open(self) -> bool:
+        raise NotImplementedError
+
+    def read(self):
+        """Return (ok, frame) like cv2.VideoCapture.read()."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def request_size(self, width, height) -> bool:
+        """
+        Ask the device for a different frame size (None, None: back to its
+        configured size). False if unsupported or the device picked another
+        size: the capture thread then downscales frames itself.
+        """
+        return False
+
+    @property
+    def exhausted(self) -> bool:
+        """True once a finite source (file, image dir) has nothing left."""
+        return False
+
+
+class V4L2Source(FrameSource):
+    """Local webcam opened through cv2.VideoCapture with retry logic"""
+
+    def __init__(self, cam_index=0, max_retries=5, width=None, height=None, fps=None):
+        self.cam_index = cam_index
+        self.max_retries = max_retries
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.name = f"v4l2:{cam_index}"
+        self._cap = None
+        self._native_size = None     # (width, height) delivered right after opening
+
+    def _device_path(self):
+        if isinstance(self.cam_index, str):
+            return self.cam_index
+        return f"/dev/video{self.cam_index}"
 
-class CameraManager:
-    """Singleton camera manager to ensure only one camera access at a time"""
-    _instance = None
-    _lock = threading.Lock()
-    _camera_lock = threading.Lock()
-    
-    def __new__(cls):
-        if cls._instance is None:
-            with cls._lock:
-                if cls._instance is None:
-                    cls._instance = super().__new__(cls)
-        return cls._instance
-    
     def force_release_camera_device(self):
         """Force release camera device at OS level"""
         try:
             # Kill any hanging processes using the camera
-            subprocess.run(['fuser', '-k', '/dev/video0'], 
-                         stderr=subprocess.DEVNULL, 
-                         stdout=subprocess.DEVNULL)
+            subprocess.run(['fuser', '-k', self._device_path()],
+                           stderr=subprocess.DEVNULL,
+                           stdout=subprocess.DEVNULL)
             time.sleep(0.5)
-        except:
+        except Exception:
             pass
-    
-    def acquire_camera(self, cam_index=0, max_retries=5):
-        """
-        Acquire camera with retry logic and proper locking
-        Returns: VideoCapture object or None
-        """
-        with self._camera_lock:
-            # Destroy any lingering windows first
-            cv2.destroyAllWindows()
-            cv2.waitKey(1)
-            
-            cap = None
-            for attempt in range(max_retries):
-                try:
-                    if attempt > 0:
-                        print(f"⚠️ Camera retry {attempt}/{max_retries}...")
-                        time.sleep(2)
-                        # Force release on retry
-                        self.force_release_camera_device()
-                    
-                    # Try multiple backends
-                    backends = [cv2.CAP_V4L2, cv2.CAP_ANY]
-                    
-                    for backend in backends:
-                        cap = cv2.VideoCapture(cam_index, backend)
-                        
-                        if cap.isOpened():
-                            # Set buffer size to 1 for lower latency
-                            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                            
-                            # Test read
-                            ret, frame = cap.read()
-                            if ret:
-                                print(f"✅ Camera acquired successfully (backend: {backend})")
-                                
-                                # Pre-create window to ensure it's ready
-                                cv2.namedWindow("Camera", cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)
-                                cv2.waitKey(1)
-                                
-                                return cap
-                            else:
-                                cap.release()
-                                cap = None
-                        else:
-                            if cap:
-                                cap.release()
-                            cap = None
-                        
-                except Exception as e:
-                    print(f"❌ Camera error on attempt {attempt}: {e}")
-                    if cap:
-                        try:
-                            cap.release()
-                        except:
-                            pass
+
+    def open(self) -> bool:
+        cap = None
+        for attempt in range(self.max_retries):
+            try:
+                if attempt > 0:
+                    print(f"⚠️ Camera retry {attempt}/{self.max_retries}...")
+                    CAMERA_OPEN_RETRIES.inc(camera=self.name)
+                    time.sleep(2)
+                    # Force release on retry
+                    self.force_release_camera_device()
+
+                # Try multiple backends
+                for backend in (cv2.CAP_V4L2, cv2.CAP_ANY):
+                    cap = cv2.VideoCapture(self.cam_index, backend)
+                    if cap.isOpened():
+                        # Set buffer size to 1 for lower latency
+                        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                        self._apply_mode(cap)
+                        ret, frame = cap.read()
+                        if ret:
+                            self._native_size = (frame.shape[1], frame.shape[0])
+                            print(f"✅ Camera acquired successfully (backend: {backend}, "
+                                  f"{frame.shape[1]}x{frame.shape[0]})")
+                            self._cap = cap
+                            return True
+                    cap.release()
                     cap = None
-            
-            print(f"❌ Failed to acquire camera after {max_retries} attempts")
-            return None
-    
-    def release_camera(self, cap):
-        """
-        Properly release camera with extra cleanup
-        """
-        if cap is not None:
+
+            except Exception as e:
+                print(f"❌ Camera error on attempt {attempt}: {e}")
+                if cap is not None:
+                    try:
+                        cap.release()
+                    except Exception:
+                        pass
+                cap = None
+
+        print(f"❌ Failed to acquire camera after {self.max_retries} attempts")
+        CAMERA_OPEN_FAILURES.inc(camera=self.name)
+        return False
+
+    def _apply_mode(self, cap, width=None, height=None):
+        """Configured (or requested) capture size and frame rate."""
+        width, height = width or self.width, height or self.height
+        if width and height:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if self.fps:
+            cap.set(cv2.CAP_PROP_FPS, self.fps)
+
+    def request_size(self, width, height) -> bool:
+        # Called on the capture thread, never concurrently with read()
+        if self._cap is None:
+            return False
+        if width is None:
+            if self.width and self.height:
+                width, height = self.width, self.height
+            else:
+                width, height = self._native_size or (None, None)
+        self._apply_mode(self._cap, width, height)
+        # Drivers silently snap to the nearest mode they support: report what was actually set
+        actual = (int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if actual != (width, height):
+            print(f"⚠️ {self.name} delivers {actual[0]}x{actual[1]} instead of {width}x{height}, "
+                  f"resizing frames in software")
+            return False
+        return True
+
+    def read(self):
+        if self._cap is None:
+            return False, None
+        return self._cap.read()
+
+    def close(self) -> None:
+        if self._cap is not None:
             try:
-                # Release capture
-                cap.release()
-                
-                # Destroy all windows multiple times
-                for _ in range(3):
-                    cv2.destroyAllWindows()
-                    cv2.waitKey(1)
-                
-                # Extra delay
-                time.sleep(0.8)
-                
-                print("📷 Camera released")
+                self._cap.release()
             except Exception as e:
                 print(f"⚠️ Error releasing camera: {e}")
-            finally:
-                # Final cleanup
-                try:
-                    cv2.destroyAllWindows()
-                except:
-                    pass
-
-# Global instance
-camera_manager = CameraManager()
\ No newline at end of file
+            self._cap = None
+
+
+class VideoFileSource(FrameSource):
+    """Recorded video, optionally paced at its native frame rate and looped"""
+
+    def __init__(self, path, loop=False, realtime=True):
+        self.path = str(path)
+        self.loop = loop
+        self.realtime = realtime
+        self.name = f"file:{self.path}"
+        self._cap = None
+        self._interval = 0.0
+        self._next_due = 0.0
+        self._done = False
+
+    def open(self) -> bool:
+        self._cap = cv2.VideoCapture(self.path)
+        if not self._cap.isOpened():
+            print(f"❌ Cannot open video file {self.path}")
+            self._cap = None
+            return False
+        fps = self._cap.get(cv2.CAP_PROP_FPS) or 0
+        self._interval = 1.0 / fps if (self.realtime and fps > 0) else 0.0
+        self._next_due = time.time()
+        self._done = False
+        return True
+
+    def read(self):
+        if self._cap is None or self._done:
+            return False, None
+        if self._interval:
+            delay = self._next_due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_due = max(self._next_due + self._interval, time.time())
+        ret, frame = self._cap.read()
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._cap.read()
+        if not ret:
+            self._done = True
+        return ret, frame
+
+    def close(self) -> None:
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    @property
+    def exhausted(self) -> bool:
+        return self._done
+
+
+class ImageDirSource(FrameSource):
+    """Directory of still images played back in name order at a fixed rate"""
+
+    def __init__(self, directory, fps=15.0, loop=False):
+        self.directory = Path(directory)
+        self.fps = fps
+        self.loop = loop
+        self.name = f"images:{self.directory}"
+        self._files = []
+        self._pos = 0
+        self._next_due = 0.0
+
+    def open(self) -> bool:
+        self._files = sorted(p for p in self.directory.iterdir()
+                             if p.suffix.lower() in IMAGE_EXTENSIONS)
+        self._pos = 0
+        self._next_due = time.time()
+        if not self._files:
+            print(f"❌ No images found in {self.directory}")
+            return False
+        return True
+
+    def read(self):
+        if self._pos >= len(self._files):
+            if not self.loop or not self._files:
+                return False, None
+            self._pos = 0
+        if self.fps:
+            delay = self._next_due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_due = max(self._next_due + 1.0 / self.fps, time.time())
+        frame = cv2.imread(str(self._files[self._pos]))
+        self._pos += 1
+        return frame is not None, frame
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.loop and self._pos >= len(self._files)
+
+
+def make_source(spec=None, width=None, height=None, fps=None) -> FrameSource:
+    """
+    Build a FrameSource from a spec string: a webcam index ("0"), a device path
+    ("/dev/video2"), a directory of images, or a video file. width/height/fps
+    set a webcam's capture mode.
+    """
+    if spec is None:
+        spec = os.environ.get("CAMERA_SOURCE", "0")
+    if isinstance(spec, FrameSource):
+        return spec
+    spec = str(spec).strip()
+    if spec.isdigit():
+        return V4L2Source(int(spec), width=width, height=height, fps=fps)
+    if spec.startswith("/dev/video"):
+        return V4L2Source(spec, width=width, height=height, fps=fps)
+    path = Path(spec)
+    if path.is_dir():
+        return ImageDirSource(path)
+    return VideoFileSource(path)
+
+
+class FrameSubscription:
+    """
+    A consumer's view of the capture service. read() mirrors
+    cv2.VideoCapture.read() but only ever returns frames the consumer has not
+    seen yet, so slow consumers skip stale frames instead of queueing them.
+    """
+
+    def __init__(self, service, timeout=1.0):
+        self._service = service
+        self._timeout = timeout
+        self._last_seq = 0
+        self.closed = False
+
+    def read(self, timeout=None):
+        if self.closed:
+            return False, None
+        seq, frame = self._service.wait_frame(self._last_seq,
+                                              self._timeout if timeout is None else timeout)
+        if frame is None:
+            return False, None
+        self._last_seq = seq
+        return True, frame
+
+    def recent(self, n=RING_SIZE):
+        """Most recent frames (oldest first) from the ring buffer."""
+        return self._service.recent(n)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            with CAMERA_RELEASE_SECONDS.time(camera=self._service.source.name):
+                self._service.unsubscribe(self)
+
+
+class CaptureService:
+    """Background thread that owns a FrameSource and publishes its frames"""
+
+    def __init__(self, source: FrameSource, ring_size=RING_SIZE):
+        self.source = source
+        self._cond = threading.Condition()
+        self._ring = deque(maxlen=ring_size)   # (seq, timestamp, frame)
+        self._seq = 0
+        self._subscribers = set()
+        self._thread = None
+        self._stop = threading.Event()
+        self._opened = threading.Event()
+        self._open_ok = False
+        self._max_width = None          # cap on delivered frame width (adaptive controller)
+        self._resize_pending = False
+        self._device_resized = False    # the source switched modes itself
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def open_failed(self):
+        """The last open attempt has finished and failed (not merely still in progress)."""
+        return self._opened.is_set() and not self._open_ok
+
+    def start(self, open_timeout=30.0) -> bool:
+        """Start the capture thread (idempotent). Returns False if the source won't open."""
+        with self._cond:
+            if not self.running:
+                self._stop.clear()
+                self._opened.clear()
+                self._open_ok = False
+                self._thread = threading.Thread(target=self._run, name=f"capture-{self.source.name}",
+                                                daemon=True)
+                self._thread.start()
+        # Also when another caller started it: the device may still be opening
+        self._opened.wait(open_timeout)
+        return self._open_ok
+
+    def limit_width(self, max_width):
+        """Cap the width of delivered frames (None: native size), from the next frame on."""
+        with self._cond:
+            self._max_width = max_width
+            self._resize_pending = True
+
+    def _fit(self, frame):
+        """Apply the width cap to a freshly read frame (capture thread)."""
+        with self._cond:
+            max_width, pending = self._max_width, self._resize_pending
+            self._resize_pending = False
+        if pending:
+            if max_width and frame.shape[1] > max_width:
+                size = (max_width, round(frame.shape[0] * max_width / frame.shape[1]))
+            else:
+                size = (None, None)
+            self._device_resized = self.source.request_size(*size)
+        if max_width and not self._device_resized and frame.shape[1] > max_width:
+            scale = max_width / frame.shape[1]
+            frame = cv2.resize(frame, (max_width, round(frame.shape[0] * scale)),
+                               interpolation=cv2.INTER_AREA)
+        return frame
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run(self):
+        try:
+            self._open_ok = self.source.open()
+        except Exception as e:
+            print(f"❌ Cannot open frame source {self.source.name}: {e}")
+            self._open_ok = False
+        self._opened.set()
+        if not self._open_ok:
+            return
+
+        try:
+            while not self._stop.is_set():
+                ret, frame = self.source.read()
+                if not ret:
+                    if self.source.exhausted:
+                        print(f"📼 Frame source {self.source.name} exhausted")
+                        break
+                    time.sleep(IDLE_READ_SLEEP)
+                    continue
+                frame = self._fit(frame)
+                with self._cond:
+                    self._seq += 1
+                    self._ring.append((self._seq, time.time(), frame))
+                    self._cond.notify_all()
+        finally:
+            self.source.close()
+            with self._cond:
+                self._cond.notify_all()
+            print(f"📷 Capture stopped ({self.source.name})")
+
+    def wait_frame(self, after_seq, timeout):
+        """Block until a frame newer than after_seq exists; returns (seq, frame)."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while not self._ring or self._ring[-1][0] <= after_seq:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.running:
+                    return after_seq, None
+                self._cond.wait(remaining)
+            seq, _, frame = self._ring[-1]
+            return seq, frame
+
+    def latest(self):
+        """(seq, timestamp, frame) of the newest frame, or None."""
+        with self._cond:
+            return self._ring[-1] if self._ring else None
+
+    def recent(self, n=RING_SIZE):
+        with self._cond:
+            return [frame for _, _, frame in list(self._ring)[-n:]]
+
+    def subscribe(self) -> FrameSubscription:
+        sub = FrameSubscription(self)
+        with self._cond:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._cond:
+            self._subscribers.discard(sub)
+
+    @property
+    def subscriber_count(self):
+        with self._cond:
+            return len(self._subscribers)
+
+
+class CameraManager:
+    """
+    Owns the capture service for one camera. Each scanning station gets its
+    own manager (see stations.py); managers are shared per source so two
+    stations pointed at the same device never open it twice.
+    """
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, source=None, name="default", width=None, height=None, fps=None):
+        self.name = name
+        self._lock = threading.Lock()
+        self._service = None
+        self._source_spec = source
+        self.capture = {"width": width, "height": height, "fps": fps}
+        self.adaptive = AdaptiveController(name, on_capture_change=self.limit_width)
+
+    @classmethod
+    def for_source(cls, source, name=None, **capture):
+        """
+        Shared manager for a source spec (webcam index, device path, file or
+        directory); capture (width/height/fps) applies when it is created.
+        """
+        key = str(source)
+        with cls._registry_lock:
+            if key not in cls._registry:
+                cls._registry[key] = cls(source, name=name or key, **capture)
+            return cls._registry[key]
+
+    @property
+    def source_name(self):
+        return self.get_service().source.name
+
+    def configure(self, source=None):
+        """Switch to a different frame source (stops the current capture thread)."""
+        with self._lock:
+            if self._service is not None:
+                self._service.stop()
+            self._service = None
+            self._source_spec = source
+
+    def get_service(self) -> CaptureService:
+        with self._lock:
+            if self._service is None:
+                self._service = CaptureService(make_source(self._source_spec, **self.capture))
+                self._service.limit_width(self.adaptive.settings["max_width"])
+            return self._service
+
+    def limit_width(self, max_width):
+        """Cap the delivered frame width (adaptive controller hook)."""
+        self.get_service().limit_width(max_width)
+
+    def subscribe(self):
+        """
+        Subscribe to the shared capture thread, starting it on first use.
+        The device stays open between scans. Returns a FrameSubscription or None.
+        """
+        service = self.get_service()
+        with CAMERA_ACQUIRE_SECONDS.time(camera=service.source.name):
+            if not service.start():
+                if service.open_failed:
+                    # Let a later call retry opening the device from scratch. A device
+                    # still opening (timed out) is left alone: others may be waiting on it.
+                    with self._lock:
+                        if self._service is service:
+                            self._service = None
+                return None
+            return service.subscribe()
+
+    def shutdown(self):
+        self.configure(self._source_spec)
+
+    # Backwards-compatible names used by older callers
+    def acquire_camera(self, width=None, height=None, fps=None):
+        """subscribe(), first switching the capture mode if one is given and differs."""
+        capture = {"width": width, "height": height, "fps": fps}
+        if any(capture.values()) and capture != self.capture:
+            self.capture = capture
+            self.configure(self._source_spec)
+        return self.subscribe()
+
+    def release_camera(self, sub):
+        if sub is not None:
+            sub.close()
+
+
+# Default camera (CAMERA_SOURCE), used when no station is specified
+camera_manager = CameraManager.for_source(os.environ.get("CAMERA_SOURCE", "0"), name="default",
+                                          **CAPTURE_CONFIG)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+config_registry.py
+Cached, indexed view of slots.json and groups.json.
+
+Both files are parsed once into an immutable snapshot with hash indexes:
+    - slot id -> slot
+    - roll number -> groups it belongs to
+    - slot id -> set of roll numbers allowed in that slot (its roster)
+The files' mtimes are checked at most once per CHECK_INTERVAL and a changed
+file is re-parsed into a fresh snapshot that replaces the old one in a single
+assignment, so edits apply without a restart and readers never see a
+half-built index. A file that fails to parse keeps the previous snapshot.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+SLOTS_FILE = Path(os.environ.get("SLOTS_FILE", BASE_DIR / "slots.json"))
+GROUPS_FILE = Path(os.environ.get("GROUPS_FILE", BASE_DIR / "groups.json"))
+CHECK_INTERVAL = 1.0  # seconds between mtime checks
+
+
+class ConfigSnapshot:
+    """Parsed slots/groups plus lookup indexes (treat as read-only)"""
+
+    def __init__(self, slots_doc, groups):
+        self.slots_doc = slots_doc
+        self.groups = groups
+        self.slots_by_id = {s["id"]: s for s in slots_doc.get("slots", [])}
+
+        roll_to_groups = {}
+        for group, rolls in groups.items():
+            for roll in rolls:
+                roll_to_groups.setdefault(roll, []).append(group)
+        self.roll_to_groups = {roll: tuple(gs) for roll, gs in roll_to_groups.items()}
+
+        self.slot_rosters = {}
+        for slot_id, slot in self.slots_by_id.items():
+            roster = set()
+            for group in slot.get("groups", []):
+                roster.update(groups.get(group, ()))
+            self.slot_rosters[slot_id] = frozenset(roster)
+
+
+class ConfigRegistry:
+    """Hot-reloading access to slots.json and groups.json"""
+
+    def __init__(self, slots_file=SLOTS_FILE, groups_file=GROUPS_FILE, check_interval=CHECK_INTERVAL):
+        self.slots_file = Path(slots_file)
+        self.groups_file = Path(groups_file)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamps = None
+        self._next_check = 0.0
+        self._snapshot = ConfigSnapshot({"slots": []}, {})
+        self.reload()
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _read_json(path, default):
+        if not path.exists():
+            return default
+        return json.loads(path.read_text())
+
+    def reload(self, force=True):
+        """Re-parse the files (when forced or their mtimes changed) and swap in a new snapshot."""
+        with self._lock:
+            stamps = (self._mtime(self.slots_file), self._mtime(self.groups_file))
+            self._next_check = time.time() + self.check_interval
+            if not force and stamps == self._stamps:
+                return self._snapshot
+            try:
+                snapshot = ConfigSnapshot(self._read_json(self.slots_file, {"slots": []}),
+                                          self._read_json(self.groups_file, {}))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ Config reload failed, keeping previous slots/groups: {e}")
+                self._stamps = stamps
+                return self._snapshot
+            self._snapshot = snapshot
+            self._stamps = stamps
+            print(f"🗓 Config loaded: {len(snapshot.slots_by_id)} slots, "
+                  f"{len(snapshot.roll_to_groups)} students in {len(snapshot.groups)} groups")
+            return snapshot
+
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        if time.time() >= self._next_check:
+            return self.reload(force=False)
+        return self._snapshot
+
+    # ---- lookups ----
+
+    def slots(self):
+        """The slots.json document ({"slots": [...]})."""
+        return self.snapshot.slots_doc
+
+    def find_slot(self, slot_id):
+        return self.snapshot.slots_by_id.get(slot_id)
+
+    def groups_for(self, roll_no):
+        """Groups a roll number belongs to (empty tuple if none)."""
+        return self.snapshot.roll_to_groups.get(roll_no, ())
+
+    def slot_roster(self, slot_id):
+        """Frozen set of roll numbers whose group is part of slot_id."""
+        return self.snapshot.slot_rosters.get(slot_id, frozenset())
+
+
+# Global instance
+config = ConfigRegistry()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+embedding_store.py
+Binary, append-only face embedding store.
+
+Replaces rewriting the whole face_data.json (indented JSON text, not atomic)
+on every enrollment. A store is a directory (FACE_STORE, default
+backend/face_store/) holding:
+
+    faces.bin   snapshot: small header + roll number index (JSON) followed by
+                a float32 matrix, one 128-D row per student, at an aligned
+                offset so it can be memory-mapped without copying
+    faces.log   append log of enrollments since the snapshot; each record is
+                (roll length, crc32, roll bytes, float32 embedding), written
+                with one write() + fsync. Later records override earlier ones
+                and the snapshot, and a torn last record (crash mid-write) is
+                skipped because its length or crc doesn't check out
+    faces.lock  flock serializing writers across processes
+
+Compaction merges snapshot + log into faces.bin.tmp, fsyncs it and renames
+it over faces.bin (atomic), then truncates the log; a crash in between only
+replays log records the new snapshot already holds. It runs automatically
+once the log grows past COMPACT_LOG_BYTES.
+
+An existing face_data.json (FACE_DB) is migrated on first use and left in
+place as a backup. Maintenance:
+    python embedding_store.py migrate [face_data.json]
+    python embedding_store.py compact
+    python embedding_store.py export face_data.json
+    python embedding_store.py stats
+"""
+
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers in one process are still serialized by the thread lock
+    fcntl = None
+
+BASE_DIR = Path(__file__).resolve().parent
+FACE_STORE = Path(os.environ.get("FACE_STORE", BASE_DIR / "face_store"))
+LEGACY_JSON = os.environ.get("FACE_DB", "face_data.json")
+EMBEDDING_DIM = 128
+COMPACT_LOG_BYTES = 1 << 20     # ~1900 enrollments between compactions
+
+MAGIC = b"FACESTO1"
+HEADER = struct.Struct("<8sIII")        # magic, dim, rows, index JSON length
+RECORD = struct.Struct("<HI")           # roll length, crc32 of roll + embedding
+ALIGN = 64                              # matrix offset alignment (bytes)
+
+
+class EmbeddingStore:
+    """Roll number -> float32 embedding, stored as snapshot + append log"""
+
+    def __init__(self, directory=FACE_STORE, dim=EMBEDDING_DIM, legacy_json=LEGACY_JSON):
+        self.dir = Path(directory)
+        self.dim = dim
+        self.legacy_json = legacy_json
+        self.snapshot_path = self.dir / "faces.bin"
+        self.log_path = self.dir / "faces.log"
+        self.lock_path = self.dir / "faces.lock"
+        self._lock = threading.Lock()
+        self._migrated = False
+
+    # ---- locking ----
+
+    @contextmanager
+    def _writer(self):
+        """Exclusive writer lock (threads in this process + other processes)."""
+        with self._lock:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)  # also releases the flock
+
+    # ---- reading ----
+
+    def stamp(self):
+        """Changes whenever the snapshot is replaced or the log grows (cheap: two stats)."""
+        self._migrate_once()
+        stamps = []
+        for path in (self.log_path, self.snapshot_path):
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def _read_snapshot(self):
+        """(rolls, matrix memmap) of faces.bin, or ([], empty matrix) if there is none."""
+        empty = ([], np.zeros((0, self.dim), dtype=np.float32))
+        try:
+            f = open(self.snapshot_path, "rb")
+        except FileNotFoundError:
+            return empty
+        # Header, index and matrix all from this one open file: a compaction renaming a new
+        # faces.bin into place meanwhile can't pair this header with another file's rows
+        with f:
+            magic, dim, rows, index_len = HEADER.unpack(f.read(HEADER.size))
+            rolls = json.loads(f.read(index_len))
+            if magic != MAGIC or dim != self.dim or len(rolls) != rows:
+                raise ValueError(f"{self.snapshot_path} is not a {self.dim}-D face store snapshot")
+            if not rows:
+                return empty
+            # The mapping keeps its own reference to the file, so it outlives the with block
+            matrix = np.memmap(f, dtype=np.float32, mode="r", offset=_matrix_offset(index_len),
+                               shape=(rows, dim))
+        return rolls, matrix
+
+    def _read_log(self):
+        """[(roll, embedding)] of every intact log record, and the byte length they span."""
+        try:
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        records, pos, vec_bytes = [], 0, self.dim * 4
+        while pos + RECORD.size <= len(data):
+            roll_len, crc = RECORD.unpack_from(data, pos)
+            end = pos + RECORD.size + roll_len + vec_bytes
+            body = data[pos + RECORD.size:end]
+            if end > len(data) or zlib.crc32(body) != crc:
+                print(f"⚠️ Ignoring torn record at byte {pos} of {self.log_path}")
+                break
+            roll = body[:roll_len].decode("utf-8")
+            records.append((roll, np.frombuffer(body, dtype=np.float32, offset=roll_len)))
+            pos = end
+        return records, pos
+
+    def load(self):
+        """
+        (rolls, matrix) with the log applied. Without pending log records the
+        matrix is the snapshot's read-only memmap (no copy).
+        """
+        self._migrate_once()
+        # Log first: a compaction between the two reads then only means log
+        # records that the newer snapshot already contains
+        records, _ = self._read_log()
+        rolls, matrix = self._read_snapshot()
+        if not records:
+            return rolls, matrix
+        latest = dict(records)
+        row_of = {roll: i for i, roll in enumerate(rolls)}
+        new = [roll for roll in latest if roll not in row_of]
+        for roll in new:
+            row_of[roll] = len(row_of)
+        merged = np.empty((len(rolls) + len(new), self.dim), dtype=np.float32)
+        merged[:len(rolls)] = matrix
+        rolls = list(rolls) + new
+        for roll, embedding in latest.items():
+            merged[row_of[roll]] = embedding
+        return rolls, merged
+
+    def to_dict(self) -> dict:
+        """{roll: embedding list} of every student (for tooling and JSON export)."""
+        rolls, matrix = self.load()
+        return {roll: matrix[i].tolist() for i, roll in enumerate(rolls)}
+
+    def __len__(self):
+        return len(self.load()[0])
+
+    # ---- writing ----
+
+    def _record(self, roll_no, embedding):
+        vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if vec.shape[0] != self.dim:
+            raise ValueError(f"Embedding for {roll_no} has {vec.shape[0]} values, expected {self.dim}")
+        body = roll_no.encode("utf-8") + vec.tobytes()
+        return RECORD.pack(len(body) - vec.nbytes, zlib.crc32(body)) + body
+
+    def put(self, roll_no, embedding):
+        """Store (or replace) one student's embedding."""
+        self.put_many({roll_no: embedding})
+
+    def put_many(self, embeddings: dict):
+        """Append several embeddings in one durable write."""
+        if not embeddings:
+            return
+        self._migrate_once()
+        payload = b"".join(self._record(roll, emb) for roll, emb in embeddings.items())
+        with self._writer():
+            _, valid = self._read_log()
+            with open(self.log_path, "ab") as f:
+                if f.tell() != valid:
+                    f.truncate(valid)   # drop a torn tail before appending after it
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            compact = valid + len(payload) > COMPACT_LOG_BYTES
+        if compact:
+            self.compact()
+
+    def _write_snapshot(self, rolls, matrix):
+        """Atomically replace faces.bin with rolls/matrix (caller holds the writer lock)."""
+        index = json.dumps(rolls).encode("utf-8")
+        offset = _matrix_offset(len(index))
+        tmp = self.snapshot_path.with_suffix(".bin.tmp")
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.dim, len(rolls), len(index)))
+            f.write(index)
+            f.write(b"\0" * (offset - HEADER.size - len(index)))
+            f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        _fsync_dir(self.dir)
+
+    def compact(self):
+        """Fold the append log into a new snapshot (atomic rename), then empty the log."""
+        self._migrate_once()
+        with self._writer():
+            records, _ = self._read_log()
+            if not records and self.snapshot_path.exists():
+                return
+            rolls, matrix = self.load()
+            self._write_snapshot(rolls, matrix)
+            with open(self.log_path, "wb") as f:
+                os.fsync(f.fileno())
+        print(f"🗜 Face store compacted: {len(rolls)} students")
+
+    def replace_all(self, embeddings: dict):
+        """Atomically replace the whole store with {roll: embedding}."""
+        with self._writer():
+            self._replace_all(embeddings)
+
+    def _replace_all(self, embeddings):
+        """replace_all for a caller holding the writer lock."""
+        rolls = sorted(embeddings)
+        matrix = np.array([embeddings[r] for r in rolls], dtype=np.float32).reshape(len(rolls), self.dim)
+        self._write_snapshot(rolls, matrix)
+        with open(self.log_path, "wb") as f:
+            os.fsync(f.fileno())
+
+    # ---- migration ----
+
+    def migrate_json(self, path) -> int:
+        """Import a legacy face_data.json ({roll: [128 floats]}) into the store. Returns rows imported."""
+        with open(path, "r") as f:
+            face_db = json.load(f)
+        self.put_many(face_db)
+        self.compact()
+        print(f"📦 Migrated {len(face_db)} embeddings from {path} to {self.dir}")
+        return len(face_db)
+
+    def _migrate_once(self):
+        """First use: import the legacy JSON if the store is still empty."""
+        if self._migrated:
+            return
+        if not self.legacy_json or not os.path.exists(self.legacy_json):
+            self._migrated = True
+            return
+        # Check, import and flag under the writer lock: other threads and processes wait
+        # for the snapshot instead of reading a half-migrated (or still empty) store
+        with self._writer():
+            if self._migrated:
+                return
+            if not (self.snapshot_path.exists() or self.log_path.exists()):
+                try:
+                    with open(self.legacy_json, "r") as f:
+                        face_db = json.load(f)
+                    self._replace_all(face_db)
+                    print(f"📦 Migrated {len(face_db)} embeddings from {self.legacy_json} to {self.dir}")
+                except (ValueError, json.JSONDecodeError) as e:
+                    print(f"⚠️ Could not migrate {self.legacy_json}: {e}")
+            # Only once the snapshot is renamed into place; an OSError leaves it for the next use
+            self._migrated = True
+
+    def stats(self):
+        records, log_bytes = self._read_log()
+        rolls, _ = self._read_snapshot()
+        size = self.snapshot_path.stat().st_size if self.snapshot_path.exists() else 0
+        return {"students": len(self), "snapshot_rows": len(rolls), "snapshot_bytes": size,
+                "log_records": len(records), "log_bytes": log_bytes}
+
+
+def _matrix_offset(index_len):
+    end = HEADER.size + index_len
+    return (end + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _fsync_dir(directory):
+    """Persist a rename (no-op where directories can't be opened, e.g. Windows)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# Global instance shared by enrollment and the face index
+embedding_store = EmbeddingStore()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "migrate":
+        embedding_store.migrate_json(sys.argv[2] if len(sys.argv) > 2 else LEGACY_JSON)
+    elif command == "compact":
+        embedding_store.compact()
+    elif command == "export" and len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as f:
+            json.dump(embedding_store.to_dict(), f)
+        print(f"✅ Exported {len(embedding_store)} embeddings to {sys.argv[2]}")
+    elif command == "stats":
+        print(json.dumps(embedding_store.stats(), indent=2))
+    else:
+        print("Usage: python embedding_store.py migrate [face_data.json] | compact | export <file.json> | stats")
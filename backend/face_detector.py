@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+face_detector.py
+Selectable face detector backends.
+
+Face detection is the slowest step of a scan on CPU-only machines.
+FACE_DETECTOR picks the backend; whichever one finds the box, the 128-D
+encoding is still computed from it by face_recognition (dlib):
+
+    hog    dlib's HOG + linear SVM via face_recognition (default)
+    yunet  OpenCV's YuNet detector (cv2.FaceDetectorYN): a small network
+           run by OpenCV's DNN module, not dlib's slow CNN model; usually
+           several times faster than HOG on a CPU and better with turned
+           or small faces. Needs the ONNX model (FACE_DETECTOR_MODEL,
+           default backend/models/face_detection_yunet_2023mar.onnx) from
+           https://github.com/opencv/opencv_zoo/tree/main/models/face_detection_yunet
+
+A backend that can't be loaded here falls back to HOG with a warning.
+Boxes are (top, right, bottom, left) tuples, like face_recognition's.
+
+Compare the backends on your own photos before switching:
+    python benchmark.py faces photos/ [--detectors hog yunet]
+"""
+
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+import cv2
+
+BASE_DIR = Path(__file__).resolve().parent
+FACE_DETECTOR = os.environ.get("FACE_DETECTOR", "hog")
+YUNET_MODEL = Path(os.environ.get("FACE_DETECTOR_MODEL",
+                                  BASE_DIR / "models" / "face_detection_yunet_2023mar.onnx"))
+YUNET_SCORE = 0.8       # minimum face confidence
+YUNET_NMS = 0.3         # overlap above which duplicate boxes are suppressed
+
+
+def detect_hog(rgb):
+    import face_recognition  # loads dlib's models on first use (see warmup.py)
+    return face_recognition.face_locations(rgb)
+
+
+_local = threading.local()  # a YuNet detector holds its input size: one per thread
+
+
+def detect_yunet(rgb):
+    height, width = rgb.shape[:2]
+    detector = getattr(_local, "yunet", None)
+    if detector is None:
+        detector = _local.yunet = cv2.FaceDetectorYN.create(str(YUNET_MODEL), "", (width, height),
+                                                            YUNET_SCORE, YUNET_NMS)
+    detector.setInputSize((width, height))
+    _, faces = detector.detect(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+    boxes = []
+    for x, y, w, h in ([] if faces is None else faces[:, :4]):
+        # dlib's landmark model was trained on HOG's square boxes: square this one up around its centre
+        side, cx, cy = max(w, h), x + w / 2, y + h / 2
+        boxes.append((max(0, int(cy - side / 2)), min(width, int(cx + side / 2)),
+                      min(height, int(cy + side / 2)), max(0, int(cx - side / 2))))
+    return boxes
+
+
+DETECTORS = {"hog": detect_hog, "yunet": detect_yunet}
+
+
+@lru_cache(maxsize=None)
+def get_detector(name=FACE_DETECTOR):
+    """Detection function rgb -> boxes for a backend name (HOG if it can't be used here)."""
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector {name!r} (choose from: {', '.join(DETECTORS)})")
+    if name == "yunet":
+        if not hasattr(cv2, "FaceDetectorYN"):
+            print("⚠️ This OpenCV build has no FaceDetectorYN (needs 4.5.4+), using HOG face detection")
+            return detect_hog
+        if not YUNET_MODEL.exists():
+            print(f"⚠️ YuNet model not found at {YUNET_MODEL}, using HOG face detection")
+            return detect_hog
+    return DETECTORS[name]
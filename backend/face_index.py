@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+face_index.py
+In-memory face embedding index.
+
+Loads the embedding store (embedding_store.py) once as a float32 matrix
+(one row per enrolled roll number, memory-mapped when the store has no
+pending log records) and only reloads when the store changes on disk or the
+index is explicitly invalidated after an enrollment. Distances are computed
+in one vectorized pass for both:
+    - verify(roll_no, embedding)  -> 1:1 check against the stored embedding
+    - identify(embedding)         -> 1:N "who is this" lookup
+
+warm(rolls) copies a class roster's embeddings out of the memory-mapped
+matrix into a small in-RAM cache ahead of the class (slot_scheduler.py), so
+the first 1:1 checks of a rush don't pay for the reload and page faults.
+The cache belongs to one loaded snapshot and is ignored once it's replaced.
+"""
+
+import threading
+import numpy as np
+
+from embedding_store import embedding_store, EMBEDDING_DIM
+
+
+class FaceIndex:
+    """Roll number -> embedding index backed by an EmbeddingStore"""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        # (rolls, roll -> row, matrix, squared row norms), swapped as one unit
+        self._snapshot = self._build([], np.zeros((0, EMBEDDING_DIM), dtype=np.float32))
+        self._loaded_stamp = None
+        self._version = 0           # bumped by invalidate()
+        self._loaded_version = -1
+        self._hot = (None, {})      # (snapshot it was copied from, roll -> embedding)
+
+    def _file_stamp(self):
+        return self.store.stamp()
+
+    @staticmethod
+    def _build(rolls, matrix):
+        sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        return rolls, {roll: i for i, roll in enumerate(rolls)}, matrix, sq_norms
+
+    def refresh(self, force=False):
+        """Reload from disk if the store's files or the index version changed."""
+        stamp = self._file_stamp()
+        if not force and stamp == self._loaded_stamp and self._version == self._loaded_version:
+            return
+        with self._lock:
+            version = self._version
+            stamp = self._file_stamp()
+            if not force and stamp == self._loaded_stamp and version == self._loaded_version:
+                return
+            try:
+                self._snapshot = self._build(*self.store.load())
+            except ValueError as e:
+                # Unreadable snapshot: keep serving the last good index
+                print(f"⚠️ Face store unreadable, keeping previous index: {e}")
+            else:
+                print(f"🗂 Face index loaded: {len(self._snapshot[0])} students")
+            self._loaded_stamp = stamp
+            self._loaded_version = version
+
+    def invalidate(self):
+        """Force a reload on next access (call after writing to the store)."""
+        with self._lock:
+            self._version += 1
+
+    def snapshot(self):
+        """Current (rolls, roll -> row, matrix, sq_norms), reloading first if stale."""
+        self.refresh()
+        return self._snapshot
+
+    def __len__(self):
+        return len(self.snapshot()[0])
+
+    def __contains__(self, roll_no):
+        return roll_no in self.snapshot()[1]
+
+    def rolls(self):
+        return list(self.snapshot()[0])
+
+    def warm(self, rolls):
+        """Load the index and cache these rolls' embeddings in RAM. Returns (cached, not enrolled)."""
+        snap = self.snapshot()
+        _, row_of, matrix, _ = snap
+        hot = {roll: np.array(matrix[row_of[roll]]) for roll in rolls if roll in row_of}
+        self._hot = (snap, hot)
+        return len(hot), len(rolls) - len(hot)
+
+    @property
+    def is_warm(self):
+        """True while the cache from the last warm() still matches the loaded index."""
+        return self._hot[0] is not None and self._hot[0] is self._snapshot
+
+    def get(self, roll_no):
+        """Stored embedding for roll_no as a float32 vector, or None."""
+        snap = self.snapshot()
+        hot_snapshot, hot = self._hot
+        if hot_snapshot is snap and roll_no in hot:
+            return hot[roll_no]
+        _, row_of, matrix, _ = snap
+        row = row_of.get(roll_no)
+        return None if row is None else matrix[row]
+
+    def distances(self, embedding, snapshot=None) -> np.ndarray:
+        """Euclidean distance from embedding to every enrolled student (row order)."""
+        _, _, matrix, sq_norms = snapshot or self.snapshot()
+        if not len(matrix):
+            return np.zeros(0, dtype=np.float32)
+        q = np.asarray(embedding, dtype=np.float32)
+        # |a-b|^2 = |a|^2 + |b|^2 - 2 a.b, one matrix-vector product for all rows
+        sq = sq_norms + np.dot(q, q) - 2.0 * (matrix @ q)
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    def verify(self, roll_no, embedding):
+        """1:1 distance between embedding and roll_no's stored embedding, or None if not enrolled."""
+        stored = self.get(roll_no)
+        if stored is None:
+            return None
+        diff = stored - np.asarray(embedding, dtype=np.float32)
+        return float(np.sqrt(np.dot(diff, diff)))
+
+    def identify(self, embedding, threshold=None, top_k=1):
+        """
+        1:N lookup. Returns a list of (roll_no, distance) for the top_k closest
+        students, filtered by threshold when given.
+        """
+        snap = self.snapshot()
+        rolls = snap[0]
+        dists = self.distances(embedding, snap)
+        if not len(dists):
+            return []
+        k = min(top_k, len(dists))
+        idx = np.argpartition(dists, k - 1)[:k]
+        idx = idx[np.argsort(dists[idx])]
+        matches = [(rolls[i], float(dists[i])) for i in idx]
+        if threshold is not None:
+            matches = [m for m in matches if m[1] < threshold]
+        return matches
+
+
+# Global instance shared by the scanner and enrollment code
+face_index = FaceIndex(embedding_store)
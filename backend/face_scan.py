@@ -10,42 +10,55 @@ Usage:
 Steps:
     1. Enter 9-digit roll number.
     2. Face is captured via webcam.
-    3. Embedding is stored in face_data.json.
+    3. Embedding is appended to the face store (embedding_store.py).
 
 Date: 2025-10-09
 """
 
 import cv2
-import face_recognition
-import json
-import os
-os.environ['QT_QPA_PLATFORM'] = 'xcb'  # Force X11
-os.environ.pop('WAYLAND_DISPLAY', None)  # Disable Wayland
 import time
 from datetime import datetime
 from colorama import Fore, Style
 from camera_manager import camera_manager
+from embedding_store import embedding_store
+from face_index import face_index
+from face_tracker import FaceTracker
+from preview import HEADLESS, preview_for
 
-DATA_FILE = "face_data.json"
+ENROLL_STABLE_FRAMES = 3  # headless: consecutive frames with a face before capturing
 
 
 
-def capture_face_embedding(timeout=30) -> list | None:
+def capture_face_embedding(timeout=30, camera=None) -> list | None:
     """
-    Capture a single face embedding from the webcam.
+    Capture a single face embedding from the shared camera feed.
+
+    With a display the user presses 'q' to keep the current face. In HEADLESS
+    mode there is no keyboard, so the face is taken once it has been seen in
+    ENROLL_STABLE_FRAMES consecutive frames, with progress on the browser preview.
+
+    Faces are followed with a FaceTracker, so detection only runs every few
+    frames and the face is encoded once per track instead of once per frame.
     """
+    camera = camera or camera_manager
+    preview = preview_for(camera)
     cap = None
     try:
-        cap = camera_manager.acquire_camera()
+        cap = camera.subscribe()
 
         if cap is None:
             print(Fore.RED + "❌ ERROR: Camera not accessible." + Style.RESET_ALL)
             return None
 
-        print(Fore.CYAN + "Press 'q' when your face is visible and centered..." + Style.RESET_ALL)
+        if HEADLESS:
+            print(Fore.CYAN + "Look at the camera, the face is captured automatically..." + Style.RESET_ALL)
+        else:
+            print(Fore.CYAN + "Press 'q' when your face is visible and centered..." + Style.RESET_ALL)
         print(Fore.YELLOW + f"⏱ Timeout in {timeout} seconds if no face captured" + Style.RESET_ALL)
 
         embedding = None
+        stable_frames = 0
+        tracker = FaceTracker()
         start_time = time.time()
         
         while True:
@@ -56,19 +69,33 @@ def capture_face_embedding(timeout=30) -> list | None:
             ret, frame = cap.read()
             if not ret:
                 continue
-
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb_frame)
-
-            if face_locations:
-                top, right, bottom, left = face_locations[0]
-                embeddings = face_recognition.face_encodings(rgb_frame, [face_locations[0]])
-
-                if embeddings:
-                    embedding = embeddings[0]
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                    cv2.putText(frame, "Face Detected - Press Q", (left, top - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            if not HEADLESS:
+                frame = frame.copy()
+
+            tracker.update(frame)
+            track = tracker.primary()
+
+            if track is not None:
+                top, right, bottom, left = track.box
+                track_embedding = tracker.encoding_for(track, frame)
+
+                if track_embedding is not None:
+                    embedding = track_embedding
+                    stable_frames += 1
+                    if HEADLESS:
+                        preview.annotate([f"Face detected {stable_frames}/{ENROLL_STABLE_FRAMES}"],
+                                         [((top, right, bottom, left), (0, 255, 0), "Hold still")])
+                    else:
+                        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+                        cv2.putText(frame, "Face Detected - Press Q", (left, top - 10),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            else:
+                stable_frames = 0
+
+            if HEADLESS:
+                if stable_frames >= ENROLL_STABLE_FRAMES:
+                    break
+                continue
 
             cv2.imshow("Face Enrollment", frame)
             key = cv2.waitKey(1) & 0xFF
@@ -82,61 +109,63 @@ def capture_face_embedding(timeout=30) -> list | None:
         print(Fore.RED + f"❌ Error during capture: {str(e)}" + Style.RESET_ALL)
 
     finally:
-        camera_manager.release_camera(cap)
+        if cap is not None:
+            cap.close()
+        if not HEADLESS:
+            try:
+                cv2.destroyWindow("Face Enrollment")
+            except:
+                pass
 
     return embedding.tolist() if embedding is not None else None
 
 
 def load_face_database() -> dict:
-    """Load the existing face database safely from JSON."""
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, "r") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            print(Fore.YELLOW + "⚠ Warning: face_data.json is empty or corrupt. Reinitializing." + Style.RESET_ALL)
-            return {}
-    return {}
+    """Every stored embedding as {roll: [128 floats]}."""
+    return embedding_store.to_dict()
+
+
+def save_face_embeddings(embeddings: dict) -> None:
+    """Add or replace the given students' embeddings (one durable append, no rewrite)."""
+    embedding_store.put_many(embeddings)
+    face_index.invalidate()
 
 
 def save_face_database(face_db: dict) -> None:
-    """Save updated face database with indentation and sorted keys."""
-    with open(DATA_FILE, "w") as f:
-        json.dump(face_db, f, indent=2, sort_keys=True)
+    """Atomically replace the whole face database with face_db."""
+    embedding_store.replace_all(face_db)
+    face_index.invalidate()
 
 
-def enroll_student(roll_no: str, timeout=30) -> bool:
+def enroll_student(roll_no: str, timeout=30, camera=None) -> bool:
     """
     Capture and store a student's face embedding linked to roll number.
     Returns True if successful, False otherwise.
     """
     print(Fore.CYAN + f"Enrolling student {roll_no}..." + Style.RESET_ALL)
 
-    embedding = capture_face_embedding(timeout=timeout)
+    embedding = capture_face_embedding(timeout=timeout, camera=camera)
     if not embedding:
         print(Fore.RED + "❌ No face embedding captured. Try again." + Style.RESET_ALL)
         return False
 
-    face_db = load_face_database()
-    face_db[roll_no] = embedding
-    save_face_database(face_db)
-    
+    save_face_embeddings({roll_no: embedding})
+
     print(Fore.GREEN + f"✅ Enrollment complete for roll {roll_no}." + Style.RESET_ALL)
     return True
 
 
-def enroll_student_api(roll_no: str) -> dict:
+def enroll_student_api(roll_no: str, camera=None) -> dict:
     """
     API-friendly wrapper: enroll and return JSON-serializable result.
     Includes proper timeout and error handling.
     """
     try:
-        success = enroll_student(roll_no, timeout=30)
+        success = enroll_student(roll_no, timeout=30, camera=camera)
         
         if success:
             # Verify enrollment
-            face_db = load_face_database()
-            if roll_no in face_db:
+            if roll_no in face_index:
                 return {
                     "ok": True, 
                     "message": f"✅ Enrollment complete for {roll_no}", 
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+face_tracker.py
+Cross-frame face tracking so a face is detected and encoded once, not every frame.
+
+Full detection (downscaled, with the FACE_DETECTOR backend, see
+face_worker.detect_faces) only runs every DETECT_EVERY frames or when a
+track is lost. In between, each track follows
+its face with OpenCV's KCF tracker (opencv-contrib), or simply holds the last
+detected box when KCF is not available. MIL, the only tracker in the plain
+opencv wheels, is deliberately not used: it costs about as much as the
+downscaled detection it is meant to save. Detections are matched
+to existing tracks by box IoU, so a track keeps its identity - and its cached
+128-D encoding - while the same person stands in front of the camera.
+
+IoU cannot tell two people apart who stand in the same spot one after the
+other (a walk-through queue), so a cached encoding is only trusted while
+the track has been followed without a gap:
+
+    - a track that missed a detection (or lost its face) and is matched
+      again is re-acquired: its encoding is dropped, and an encoding still
+      being computed from a frame before that is discarded when it arrives
+    - fresh_encoding(seq) also requires the track to have been seen in
+      frame seq (the barcode's frame), not just somewhere nearby in time
+    - encodings older than REENCODE_SECONDS are refreshed anyway
+
+Self-check (scripted detections, no camera or face models):
+    python face_tracker.py selftest
+"""
+
+import itertools
+import sys
+import time
+
+import cv2
+
+from face_worker import detect_faces, encode_face, DETECT_SCALE
+
+DETECT_EVERY = 5         # frames between full detections
+IOU_MATCH = 0.3          # min IoU to treat a detection as an existing track
+MAX_MISSED = 2           # detections a track may miss before it is dropped
+REENCODE_SECONDS = 2.0   # max age of a cached encoding
+
+
+def iou(a, b):
+    """IoU of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _make_cv_tracker():
+    """OpenCV KCF tracker (contrib build), or None."""
+    for factory in ("TrackerKCF_create", "legacy.TrackerKCF_create"):
+        obj = cv2
+        try:
+            for part in factory.split("."):
+                obj = getattr(obj, part)
+            return obj()
+        except (AttributeError, cv2.error):
+            continue
+    return None
+
+
+class Track:
+    """One face followed across frames"""
+    _ids = itertools.count(1)
+
+    def __init__(self, box, seq=0):
+        self.id = next(self._ids)
+        self.box = box
+        self.hits = 1            # detections matched to this track
+        self.missed = 0
+        self.lost = False        # OpenCV tracker lost the face since the last detection
+        self.acquired_seq = seq  # frame the current person was (re-)acquired in
+        self.seen_seq = seq      # last frame the face was detected or followed in
+        self.encoding = None
+        self.encoded_at = 0.0
+        self.encoded_seq = None  # frame the cached encoding was computed from
+        self.encoding_pending = False
+        self.last_seen = time.time()
+        self.cv_tracker = None
+
+    @property
+    def area(self):
+        top, right, bottom, left = self.box
+        return (bottom - top) * (right - left)
+
+    def fresh_encoding(self, seq=None, max_age=REENCODE_SECONDS):
+        """
+        Cached encoding if it can be trusted, else None: recent enough and
+        (with seq) the track was seen in frame seq.
+        """
+        if self.encoding is None or time.time() - self.encoded_at > max_age:
+            return None
+        if seq is not None and self.seen_seq != seq:
+            return None
+        return self.encoding
+
+    def set_encoding(self, encoding, seq):
+        """Cache the encoding computed from frame seq, unless the track was re-acquired since."""
+        self.encoding_pending = False
+        if seq < self.acquired_seq:
+            return False
+        self.encoding = encoding
+        self.encoded_at = time.time()
+        self.encoded_seq = seq
+        return True
+
+    def reacquire(self, seq):
+        """The face was out of sight: whoever is there now may be someone else."""
+        self.acquired_seq = seq
+        self.encoding = None
+        self.encoded_seq = None
+
+    def to_dict(self):
+        return {"id": self.id, "box": list(self.box), "hits": self.hits,
+                "encoded": self.encoding is not None}
+
+
+class FaceTracker:
+    """Keeps face tracks up to date with periodic detection + per-frame tracking"""
+
+    def __init__(self, detect_every=DETECT_EVERY, detect_scale=DETECT_SCALE, use_cv_tracker=True):
+        self.detect_every = detect_every
+        self.detect_scale = detect_scale
+        self.use_cv_tracker = use_cv_tracker
+        self.tracks = []
+        self.frame_index = 0
+        self.detections = 0      # how many frames needed a full detection
+
+    def _start_cv_tracker(self, track, frame):
+        if not self.use_cv_tracker:
+            return
+        tracker = _make_cv_tracker()
+        if tracker is None:
+            self.use_cv_tracker = False
+            return
+        top, right, bottom, left = track.box
+        try:
+            tracker.init(frame, (left, top, right - left, bottom - top))
+            track.cv_tracker = tracker
+        except cv2.error:
+            track.cv_tracker = None
+
+    def _find_faces(self, frame):
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return detect_faces(rgb, self.detect_scale)
+
+    def _detect(self, frame, seq):
+        self.detections += 1
+        boxes = self._find_faces(frame)
+
+        # Greedy IoU matching, best pairs first
+        pairs = sorted(((iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks)
+                        for bi, b in enumerate(boxes)), reverse=True)
+        matched_tracks, matched_boxes = set(), set()
+        for score, ti, bi in pairs:
+            if score < IOU_MATCH or ti in matched_tracks or bi in matched_boxes:
+                continue
+            track = self.tracks[ti]
+            if track.missed or track.lost:
+                track.reacquire(seq)
+            track.box, track.hits, track.missed, track.lost = boxes[bi], track.hits + 1, 0, False
+            track.seen_seq = seq
+            track.last_seen = time.time()
+            self._start_cv_tracker(track, frame)
+            matched_tracks.add(ti)
+            matched_boxes.add(bi)
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.missed += 1
+                if track.missed > MAX_MISSED:
+                    continue
+            survivors.append(track)
+        for bi, box in enumerate(boxes):
+            if bi not in matched_boxes:
+                track = Track(box, seq)
+                self._start_cv_tracker(track, frame)
+                survivors.append(track)
+        self.tracks = survivors
+
+    def _follow(self, frame, seq):
+        h, w = frame.shape[:2]
+        for track in self.tracks:
+            if track.cv_tracker is None:
+                continue  # hold the last detected box until the next detection
+            ok, (x, y, bw, bh) = track.cv_tracker.update(frame)
+            if not ok:
+                track.lost = True
+                continue
+            x, y, bw, bh = int(x), int(y), int(bw), int(bh)
+            track.box = (max(0, y), min(w, x + bw), min(h, y + bh), max(0, x))
+            track.seen_seq = seq
+            track.last_seen = time.time()
+
+    def update(self, frame, seq=None):
+        """Advance one BGR frame (seq: the caller's frame number); returns the live tracks."""
+        self.frame_index += 1
+        seq = self.frame_index if seq is None else seq
+        needs_detection = (not self.tracks
+                           or self.frame_index % self.detect_every == 0
+                           or any(t.lost for t in self.tracks))
+        if needs_detection:
+            self._detect(frame, seq)
+        else:
+            self._follow(frame, seq)
+        return self.tracks
+
+    def primary(self):
+        """The largest (closest) live track, or None."""
+        live = [t for t in self.tracks if t.missed == 0 and not t.lost]
+        return max(live, key=lambda t: t.area) if live else None
+
+    def encoding_for(self, track, frame):
+        """Cached encoding for a track, computing it from frame (full res, the last update()) if stale."""
+        cached = track.fresh_encoding()
+        if cached is not None:
+            return cached
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        encoding = encode_face(rgb, track.box)
+        if encoding is not None:
+            track.set_encoding(encoding, track.seen_seq)
+        return encoding
+
+
+# ---- self-check ----
+
+class _ScriptedTracker(FaceTracker):
+    """FaceTracker whose detector returns scripted boxes, one list per detection"""
+
+    def __init__(self, script):
+        super().__init__(detect_every=1, use_cv_tracker=False)
+        self.script = list(script)
+
+    def _find_faces(self, frame):
+        return self.script.pop(0)
+
+
+def selftest():
+    """Two people appearing one after the other in the same box must not share an encoding."""
+    box = (100, 300, 300, 100)
+    frame = None  # the scripted detector never looks at it
+    person_a, person_b = "encoding-of-A", "encoding-of-B"
+    checks = []
+
+    # A in view (frames 1-2), nobody (3), B steps into the same spot (4-5)
+    tracker = _ScriptedTracker([[box], [box], [], [box], [box]])
+    tracker.update(frame, seq=1)
+    track = tracker.primary()
+    checks.append(("A encoded from frame 1", track.set_encoding(person_a, 1)))
+    tracker.update(frame, seq=2)
+    checks.append(("A's barcode in frame 2 reuses A", track.fresh_encoding(seq=2) == person_a))
+    checks.append(("not for a frame the track wasn't seen in", track.fresh_encoding(seq=3) is None))
+    pending_seq = 2   # an encoding of A submitted from frame 2, still running
+    tracker.update(frame, seq=3)
+    checks.append(("nobody in frame 3", tracker.primary() is None))
+    tracker.update(frame, seq=4)
+    track_b = tracker.primary()
+    checks.append(("B matched to the same track by IoU", track_b is track))
+    checks.append(("B's barcode in frame 4 gets no cached encoding", track.fresh_encoding(seq=4) is None))
+    checks.append(("A's late encoding is discarded", not track.set_encoding(person_a, pending_seq)
+                   and track.fresh_encoding(seq=4) is None))
+    tracker.update(frame, seq=5)
+    checks.append(("B encoded from frame 5", track.set_encoding(person_b, 5)
+                   and track.fresh_encoding(seq=5) == person_b))
+
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return all(ok for _, ok in checks)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "selftest":
+        sys.exit(0 if selftest() else 1)
+    print("Usage: python face_tracker.py selftest")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+face_worker.py
+Face detection + encoding jobs and the shared worker pool that runs them.
+
+The functions here are plain module-level functions so they can be shipped to
+a process pool. The pool is shared by every scanner in the process, so face
+work uses all cores without each camera spinning up its own workers.
+
+face_recognition is imported on first use, not at import time: it loads
+dlib's models, which takes seconds and would delay every process start.
+warm_up() loads them ahead of the first scan (see warmup.py).
+
+Faces are located by the FACE_DETECTOR backend (face_detector.py: dlib HOG
+or OpenCV YuNet) and always encoded by face_recognition.
+
+Config (env vars):
+    FACE_POOL     "process" (default) or "thread"
+    FACE_WORKERS  number of workers, default: CPU count - 1 (min 1)
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import cv2
+import numpy as np
+
+from face_detector import get_detector, FACE_DETECTOR
+
+# Face detection runs on a downscaled copy; encoding uses the full-res frame
+DETECT_SCALE = 0.5
+
+FACE_POOL = os.environ.get("FACE_POOL", "process")
+FACE_WORKERS = int(os.environ.get("FACE_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def detect_faces(rgb, scale=DETECT_SCALE, detector=FACE_DETECTOR):
+    """Face detection on a downscaled copy, boxes mapped back to full res."""
+    detect = get_detector(detector)
+    if scale and scale != 1.0:
+        small = cv2.resize(rgb, (0, 0), fx=scale, fy=scale)
+        locations = detect(small)
+        h, w = rgb.shape[:2]
+        return [(min(int(t / scale), h), min(int(r / scale), w),
+                 min(int(b / scale), h), min(int(l / scale), w))
+                for t, r, b, l in locations]
+    return detect(rgb)
+
+
+def largest_face(locations):
+    """Pick the face closest to the camera (biggest box)."""
+    return max(locations, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]))
+
+
+def encode_face(rgb, box):
+    """128-D encoding of a single face box at full resolution, or None."""
+    import face_recognition
+    encodings = face_recognition.face_encodings(rgb, [box])
+    return encodings[0] if encodings else None
+
+
+def encode_largest_face(frame, scale=DETECT_SCALE):
+    """
+    Pool job: detect faces in a BGR frame (downscaled) and encode only the
+    largest one. Returns (embedding or None, {"detect": ms, "encode": ms}).
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    locations = detect_faces(rgb, scale)
+    timings["detect"] = (time.perf_counter() - t0) * 1000.0
+    if not locations:
+        return None, timings
+    t0 = time.perf_counter()
+    embedding = encode_face(rgb, largest_face(locations))
+    timings["encode"] = (time.perf_counter() - t0) * 1000.0
+    return embedding, timings
+
+
+def encode_face_box(frame, box):
+    """
+    Pool job: encode an already-located face (e.g. a tracked box) in a BGR
+    frame, skipping detection. Returns (embedding or None, {"encode": ms}).
+    """
+    t0 = time.perf_counter()
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    embedding = encode_face(rgb, box)
+    return embedding, {"encode": (time.perf_counter() - t0) * 1000.0}
+
+
+def warm_up():
+    """
+    Pool job: load the face models in this worker and run one dummy detection
+    and encoding through dlib's cold paths. Returns (pid, {step: ms}).
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    import face_recognition  # noqa: F401
+    timings["import"] = (time.perf_counter() - t0) * 1000.0
+    rgb = np.zeros((240, 320, 3), dtype=np.uint8)
+    t0 = time.perf_counter()
+    detect_faces(rgb)
+    timings["detect"] = (time.perf_counter() - t0) * 1000.0
+    t0 = time.perf_counter()
+    encode_face(rgb, (60, 220, 180, 100))
+    timings["encode"] = (time.perf_counter() - t0) * 1000.0
+    return os.getpid(), timings
+
+
+def get_face_pool():
+    """Process-wide face worker pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if FACE_POOL == "thread":
+                _pool = ThreadPoolExecutor(max_workers=FACE_WORKERS, thread_name_prefix="face")
+            else:
+                # spawn, not fork: the parent already runs capture/decoder threads
+                _pool = ProcessPoolExecutor(max_workers=FACE_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+            print(f"🧵 Face worker pool started ({FACE_POOL}, {FACE_WORKERS} workers)")
+        return _pool
+
+
+def shutdown_face_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+marked_index.py
+In-memory index of students already marked present, per class.
+
+Students routinely scan twice. With this index a repeat barcode for a class
+(subject, slot time, date) the student is already marked VALID in is
+answered with ALREADY_MARKED straight from the barcode, before any face
+detection, encoding or matching, and no attendance row is written for it.
+
+A class is loaded from the attendance store the first time it is looked up
+(preload() does that for today's classes at startup) and then kept up to
+date by mark() as VALID rows are appended. Only the most recent MAX_CLASSES
+classes are kept. Other worker processes' marks are not seen once a class
+is loaded; the store itself still refuses a second VALID row for a class,
+so at worst such a repeat costs face work, never a duplicate row.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+ALREADY_MARKED = "ALREADY_MARKED"
+MAX_CLASSES = 256
+
+
+class MarkedIndex:
+    """(subject, slot, date) -> roll numbers marked present"""
+
+    def __init__(self, store, max_classes=MAX_CLASSES):
+        self.store = store
+        self.max_classes = max_classes
+        self._classes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rolls(self, subject, slot, date):
+        """Rolls set of one class, loaded from the store on first use (lock held)."""
+        key = (subject, slot, date)
+        rolls = self._classes.get(key)
+        if rolls is None:
+            rolls = self._classes[key] = self.store.marked_rolls(subject, date, slot)
+            while len(self._classes) > self.max_classes:
+                self._classes.popitem(last=False)
+        else:
+            self._classes.move_to_end(key)
+        return rolls
+
+    def is_marked(self, subject, slot, date, roll_no) -> bool:
+        with self._lock:
+            return roll_no in self._rolls(subject, slot, date)
+
+    def mark(self, subject, slot, date, roll_no):
+        with self._lock:
+            self._rolls(subject, slot, date).add(roll_no)
+
+    def preload(self, slots, date=None):
+        """Load the given slots' classes for date (default today). Returns students marked."""
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            return sum(len(self._rolls(s["subject"], s["time"], date)) for s in slots)
+
+    def checker(self, slot, date=None):
+        """roll -> bool for one slot's class, as passed to ScanPolicy(already_marked=...)."""
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        return lambda roll_no: self.is_marked(slot["subject"], slot["time"], date, roll_no)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._classes)
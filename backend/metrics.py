@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+In-process metrics, served in Prometheus text format at /metrics.
+
+Three metric types, all thread-safe and cheap enough to leave on:
+    - Counter:   monotonically increasing count (inc)
+    - Gauge:     current value (set/inc/dec), or a callback read at scrape time
+    - Histogram: observations bucketed by upper bound (observe / time())
+
+Each metric may have labels; a label set's series is created on first use.
+Recording is one dict lookup, a bisect and a few additions under a lock, no
+allocation after the first sample, so hot paths (per-frame decode) can call it.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers per-frame stages (sub-ms decode) up to slow camera opens
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = dict(self._series)
+        for key, value in sorted(series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), function=None):
+        super().__init__(name, help_text, labelnames)
+        self._function = function
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._series[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """
+        Read the value at scrape time instead: function() returns a number
+        (no labels) or a {label value tuple: number} dict.
+        """
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                values = self._function()
+            except Exception:
+                values = {}
+            with self._lock:
+                self._series = values if isinstance(values, dict) else {(): values}
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [per-bucket counts..., +Inf count], sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Named collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-imported module (e.g. Flask reloader): keep the live series
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), function=None):
+        return self._register(Gauge(name, help_text, labelnames, function))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Global registry and the metrics shared across modules
+registry = Registry()
+
+CAMERA_ACQUIRE_SECONDS = registry.histogram(
+    "attendance_camera_acquire_seconds", "Time to subscribe to a camera (opening it if needed)", ["camera"])
+CAMERA_RELEASE_SECONDS = registry.histogram(
+    "attendance_camera_release_seconds", "Time to release a camera subscription", ["camera"])
+CAMERA_OPEN_RETRIES = registry.counter(
+    "attendance_camera_open_retries_total", "Camera open retries after a failed attempt", ["camera"])
+CAMERA_OPEN_FAILURES = registry.counter(
+    "attendance_camera_open_failures_total", "Camera opens that failed after all retries", ["camera"])
+SCAN_STAGE_SECONDS = registry.histogram(
+    "attendance_scan_stage_seconds",
+    "Per-call latency of scan pipeline stages (decode, detect, encode, match, track, ...)", ["stage"])
+SCAN_RESULTS = registry.counter(
+    "attendance_scan_results_total", "Finished scans by final status", ["station", "status"])
+ATTENDANCE_WRITE_SECONDS = registry.histogram(
+    "attendance_write_seconds", "Time to commit one batch of attendance rows")
+ATTENDANCE_ROWS_WRITTEN = registry.counter(
+    "attendance_rows_written_total", "Attendance rows committed to the database")
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "attendance_http_request_seconds", "HTTP handler time (until the response is returned)",
+    ["method", "endpoint", "status"])
+ADAPTIVE_LEVEL = registry.gauge(
+    "attendance_adaptive_level", "Adaptive quality level per camera (0 = full quality)", ["camera"])
+ADAPTIVE_FRAME_SECONDS = registry.gauge(
+    "attendance_adaptive_frame_seconds", "Smoothed per-frame processing time seen by the adaptive controller",
+    ["camera"])
+ADAPTIVE_CHANGES = registry.counter(
+    "attendance_adaptive_changes_total", "Adaptive quality level changes (down = cheaper)", ["camera", "direction"])
+QUEUE_DEPTH = registry.gauge(
+    "attendance_queue_depth", "Items waiting in internal queues", ["queue"])
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+preview.py
+Headless mode and the browser preview stream.
+
+With HEADLESS=1 (the default when no DISPLAY is set) the scanners never touch
+OpenCV's GUI (no namedWindow/imshow/waitKey). Instead they publish a small
+overlay (status text, face boxes) to the camera's PreviewHub, and the hub
+serves annotated frames as an MJPEG stream at /api/preview.mjpg.
+
+Frames are only JPEG-encoded while at least one viewer is connected, by one
+encoder thread per camera, at most PREVIEW_FPS times a second, so the scan
+loop pays nothing for the preview.
+
+Only the camera host process can read the cameras. A viewer connected to
+another worker process registers in the shared state store, and the host
+relays that camera's JPEG frames through the store while anyone watches
+(remote_mjpeg_stream / start_preview_relay).
+"""
+
+import base64
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+import cv2
+
+HEADLESS = os.environ.get("HEADLESS", "0" if os.environ.get("DISPLAY") else "1") == "1"
+PREVIEW_FPS = float(os.environ.get("PREVIEW_FPS", 8))
+PREVIEW_JPEG_QUALITY = 70
+PREVIEW_MAX_WIDTH = 640
+OVERLAY_TTL = 1.5  # seconds an overlay stays on screen without being refreshed
+RELAY_TTL = 3.0    # seconds a remote viewer registration / relayed frame stays valid
+RELAY_POLL = 0.5   # seconds between the host's checks for remote viewers
+RELAY_GIVE_UP = 10.0  # seconds a remote viewer waits for a frame before the stream ends
+
+if not HEADLESS:
+    os.environ['QT_QPA_PLATFORM'] = 'xcb'  # Force X11
+    os.environ.pop('WAYLAND_DISPLAY', None)  # Disable Wayland
+
+
+class PreviewHub:
+    """Annotated JPEG frames for one camera, produced only while someone watches"""
+
+    def __init__(self, camera):
+        self.camera = camera
+        self._cond = threading.Condition()
+        self._viewers = 0
+        self._jpeg = None
+        self._seq = 0
+        self._overlay = None          # (expires_at, lines, boxes)
+        self._encoder = None
+        self._relay = None
+
+    # ---- called from the scan loops (cheap) ----
+
+    def annotate(self, lines=(), boxes=()):
+        """
+        Set what to draw on the next preview frames.
+        boxes: iterable of ((top, right, bottom, left), (b, g, r), label)
+        """
+        self._overlay = (time.time() + OVERLAY_TTL, list(lines), list(boxes))
+
+    @property
+    def watched(self):
+        return self._viewers > 0
+
+    # ---- encoder ----
+
+    def _draw(self, frame):
+        frame = frame.copy()
+        overlay = self._overlay
+        if overlay and overlay[0] > time.time():
+            _, lines, boxes = overlay
+            for (top, right, bottom, left), color, label in boxes:
+                cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+                if label:
+                    cv2.putText(frame, label, (left, max(top - 10, 15)),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+            for i, line in enumerate(lines):
+                cv2.putText(frame, line, (10, 30 + 25 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        h, w = frame.shape[:2]
+        if w > PREVIEW_MAX_WIDTH:
+            scale = PREVIEW_MAX_WIDTH / w
+            frame = cv2.resize(frame, (PREVIEW_MAX_WIDTH, int(h * scale)))
+        return frame
+
+    def _encode_loop(self):
+        sub = self.camera.subscribe()
+        if sub is None:
+            print("❌ Preview: camera not available")
+            with self._cond:
+                self._encoder = None
+                self._cond.notify_all()
+            return
+        interval = 1.0 / PREVIEW_FPS
+        try:
+            while True:
+                with self._cond:
+                    if self._viewers == 0:
+                        self._encoder = None
+                        return
+                started = time.time()
+                ret, frame = sub.read(timeout=1.0)
+                if not ret:
+                    continue
+                ok, buf = cv2.imencode(".jpg", self._draw(frame),
+                                       [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_JPEG_QUALITY])
+                if ok:
+                    with self._cond:
+                        self._jpeg = buf.tobytes()
+                        self._seq += 1
+                        self._cond.notify_all()
+                delay = interval - (time.time() - started)
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            sub.close()
+
+    # ---- viewers ----
+
+    def frames(self, timeout=5):
+        """
+        Generator of new JPEG frames for one viewer (None after timeout
+        seconds without one); ends if the camera is unavailable.
+        """
+        with self._cond:
+            self._viewers += 1
+            if self._encoder is None:
+                self._encoder = threading.Thread(target=self._encode_loop, name="preview-encoder",
+                                                 daemon=True)
+                self._encoder.start()
+        seen = 0
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq != seen or self._encoder is None, timeout=timeout)
+                    if self._encoder is None:
+                        return
+                    if self._seq == seen:
+                        jpeg = None
+                    else:
+                        seen, jpeg = self._seq, self._jpeg
+                yield jpeg
+        finally:
+            with self._cond:
+                self._viewers -= 1
+
+    def mjpeg_stream(self):
+        """Generator of multipart/x-mixed-replace chunks for one viewer."""
+        for jpeg in self.frames():
+            if jpeg is not None:
+                yield _mjpeg_part(jpeg)
+
+    # ---- relay to other worker processes (camera host side) ----
+
+    def start_relay(self, store):
+        """Publish frames to the store while remote viewers are registered (no-op if already relaying)."""
+        with self._cond:
+            if self._relay is not None:
+                return
+            self._relay = threading.Thread(target=self._relay_loop, args=(store,),
+                                           name="preview-relay", daemon=True)
+            self._relay.start()
+
+    def _relay_loop(self, store):
+        name = self.camera.name
+        frames = self.frames(timeout=1.0)
+        next_check = 0.0
+        try:
+            for jpeg in frames:
+                if time.time() >= next_check:
+                    if not store.items(f"preview_viewer:{name}"):
+                        return
+                    next_check = time.time() + 1.0
+                if jpeg is not None:
+                    store.set("preview_frame", name, {"seq": self._seq,
+                                                      "jpeg": base64.b64encode(jpeg).decode("ascii")},
+                              ttl=RELAY_TTL)
+        finally:
+            frames.close()
+            with self._cond:
+                self._relay = None
+
+
+def _mjpeg_part(jpeg):
+    return (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+            + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+def preview_for(camera) -> PreviewHub:
+    """The PreviewHub for a CameraManager (one per camera)."""
+    with _hubs_lock:
+        hub = _hubs.get(id(camera))
+        if hub is None:
+            hub = _hubs[id(camera)] = PreviewHub(camera)
+        return hub
+
+
+def remote_mjpeg_stream(store, camera_name):
+    """MJPEG chunks for a camera attached to another process, relayed by its host through the store."""
+    viewers, viewer = f"preview_viewer:{camera_name}", uuid.uuid4().hex
+    seen, last_frame, next_ping = None, time.time(), 0.0
+    try:
+        while time.time() - last_frame < RELAY_GIVE_UP:
+            if time.time() >= next_ping:
+                store.set(viewers, viewer, True, ttl=RELAY_TTL)
+                next_ping = time.time() + RELAY_TTL / 3
+            frame = store.get("preview_frame", camera_name)
+            if frame is not None and frame["seq"] != seen:
+                seen, last_frame = frame["seq"], time.time()
+                yield _mjpeg_part(base64.b64decode(frame["jpeg"]))
+            time.sleep(0.5 / PREVIEW_FPS)
+    finally:
+        store.delete(viewers, viewer)
+
+
+_relay_thread = None
+_relay_lock = threading.Lock()
+
+
+def start_preview_relay(store, host, cameras):
+    """
+    Background thread relaying previews of these cameras to viewers on other
+    worker processes, while this process is the camera host (HostLock).
+    Started once per process; later calls return the running thread.
+    """
+    global _relay_thread
+    if multiprocessing.parent_process() is not None:
+        return None  # a spawned pool worker re-importing the app
+
+    def run():
+        while True:
+            try:
+                for camera in cameras:
+                    if store.items(f"preview_viewer:{camera.name}") and host.acquire():
+                        preview_for(camera).start_relay(store)
+            except Exception as e:
+                print(f"⚠️ Preview relay: {e}")
+            time.sleep(RELAY_POLL)
+
+    with _relay_lock:
+        if _relay_thread is None:
+            _relay_thread = threading.Thread(target=run, name="preview-relay-watch", daemon=True)
+            _relay_thread.start()
+        return _relay_thread
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+scan_jobs.py
+Asynchronous scan jobs.
+
+The camera is a single shared resource, so scans are queued and executed one
+at a time by a background worker instead of blocking an HTTP request for the
+whole scan. Clients submit a job, get its id back immediately and then poll
+the job or follow its server-sent event stream.
+
+With a shared store (state_store.py) the queue also works across worker
+processes: every job change is published as a snapshot any process can read,
+and a process that is not the camera host puts new jobs in the store's
+inbox, from where the host's worker claims them.
+
+Nothing runs until start(): the worker thread is what takes the camera host
+lock, so only a process that serves requests may start it (not a reloader's
+watcher parent or a spawned pool worker re-importing the app).
+"""
+
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+MAX_PENDING_SCANS = 5     # admission control: queued (not yet running) jobs
+JOB_HISTORY = 200         # finished jobs kept for polling
+JOB_TTL = 3600            # seconds job snapshots stay in the shared store
+STORE_POLL = 0.5          # seconds between store checks (inbox, remote job changes)
+HOST_RETRY = 2.0          # seconds between attempts to become the camera host
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED_STATES = (DONE, FAILED)
+
+
+class QueueFullError(Exception):
+    """Raised when the scan queue cannot admit another job"""
+
+
+class ScanJob:
+    def __init__(self, params, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.params = params
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0          # bumped on every state change (drives SSE)
+
+    def to_dict(self, position=None):
+        d = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+        }
+        if self.error:
+            d["error"] = self.error
+        if position is not None:
+            d["position"] = position
+        return d
+
+
+class ScanJobQueue:
+    """Bounded FIFO of scan jobs run one at a time by a worker thread"""
+
+    def __init__(self, runner, max_pending=MAX_PENDING_SCANS, history=JOB_HISTORY, name="scan",
+                 store=None, host=None):
+        self._runner = runner
+        self._max_pending = max_pending
+        self._history = history
+        self._name = name
+        self._store = store           # StateStore shared with other processes, or None
+        self._host = host             # HostLock: only its holder runs jobs (None: always run)
+        self._inbox = f"inbox:{name}"
+        self._pending = deque()
+        self._jobs = OrderedDict()    # id -> job, oldest first
+        self._cond = threading.Condition()
+        self._worker = None
+        self._started = False
+
+    def _is_host(self):
+        return self._host is None or self._host.acquire()
+
+    def _publish(self, job):
+        """Share a job's current snapshot with other processes."""
+        if self._store is not None:
+            self._store.set("job", job.id, {"queue": self._name, "version": job.version,
+                                            **job.to_dict(self.position(job))}, ttl=JOB_TTL)
+
+    def start(self):
+        """Start the worker thread, which also claims jobs other processes queue (once per process)."""
+        if multiprocessing.parent_process() is not None:
+            return self  # a spawned pool worker re-importing the app
+        with self._cond:
+            self._started = True
+            self._ensure_worker()
+        return self
+
+    def _ensure_worker(self):
+        if self._started and (self._worker is None or not self._worker.is_alive()):
+            self._worker = threading.Thread(target=self._run, name=f"{self._name}-jobs", daemon=True)
+            self._worker.start()
+
+    def submit(self, **params) -> ScanJob:
+        with self._cond:
+            depth = self._depth()
+            if depth >= self._max_pending:
+                raise QueueFullError(f"{depth} scans already waiting")
+            job = ScanJob(params)
+            self._ensure_worker()
+            if not self._is_host():
+                # Another process owns the cameras: hand the job over through the store
+                self._store.set(self._inbox, job.id, {"params": params, "created_at": job.created_at},
+                                ttl=JOB_TTL)
+                self._store.set("job", job.id, {"queue": self._name, "version": job.version,
+                                                **job.to_dict(depth + 1)}, ttl=JOB_TTL)
+                return job
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._trim()
+            self._publish(job)
+            self._cond.notify_all()
+            return job
+
+    def _claim_inbox(self):
+        """Move jobs submitted by other processes into the local queue (host only)."""
+        if self._store is None:
+            return
+        for job_id, entry in self._store.items(self._inbox).items():
+            if self._store.pop(self._inbox, job_id) is None:
+                continue
+            job = ScanJob(entry["params"], job_id=job_id)
+            job.created_at = entry.get("created_at", job.created_at)
+            job.version += 1
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._publish(job)
+        self._trim()
+
+    def _trim(self):
+        # Drop the oldest finished jobs beyond the history limit
+        excess = len(self._jobs) - self._history
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].status in FINISHED_STATES:
+                del self._jobs[job_id]
+                excess -= 1
+
+    def position(self, job):
+        """1-based place in the queue for queued jobs, 0 when running, None when finished."""
+        if job.status == RUNNING:
+            return 0
+        if job.status != QUEUED:
+            return None
+        for i, pending in enumerate(self._pending):
+            if pending is job:
+                return i + 1
+        return None
+
+    def _remote(self, job_id):
+        """(version, snapshot) of a job this process doesn't run, from the store."""
+        if self._store is None:
+            return None, None
+        snapshot = self._store.get("job", job_id)
+        if snapshot is None or snapshot.pop("queue", None) != self._name:
+            return None, None
+        return snapshot.pop("version", None), snapshot
+
+    def get(self, job_id):
+        """Snapshot dict of a job, or None if unknown."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict(self.position(job))
+        return self._remote(job_id)[1]
+
+    def wait_for_change(self, job_id, seen_version, timeout):
+        """
+        Block until job_id changes past seen_version (or timeout).
+        Returns (version, snapshot dict) or (seen_version, None) if unknown.
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while job_id in self._jobs:
+                job = self._jobs[job_id]
+                if job.version != seen_version:
+                    return job.version, job.to_dict(self.position(job))
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return job.version, job.to_dict(self.position(job))
+                self._cond.wait(remaining)
+
+        # Run by another process: poll its published snapshot
+        while True:
+            version, snapshot = self._remote(job_id)
+            if snapshot is None:
+                return seen_version, None
+            remaining = deadline - time.time()
+            if version != seen_version or remaining <= 0:
+                return version, snapshot
+            time.sleep(min(STORE_POLL, remaining))
+
+    def _depth(self):
+        inbox = len(self._store.items(self._inbox)) if self._store is not None else 0
+        return len(self._pending) + inbox
+
+    @property
+    def depth(self):
+        with self._cond:
+            return self._depth()
+
+    def _touch_all_queued(self):
+        # Queue positions changed for everyone still waiting
+        for job in self._pending:
+            job.version += 1
+            self._publish(job)
+
+    def _run(self):
+        while True:
+            if not self._is_host():
+                time.sleep(HOST_RETRY)
+                continue
+            with self._cond:
+                self._claim_inbox()
+                while not self._pending:
+                    # Without a store only local submits can add work
+                    self._cond.wait(STORE_POLL if self._store is not None else None)
+                    self._claim_inbox()
+                job = self._pending.popleft()
+                job.status = RUNNING
+                job.started_at = time.time()
+                job.version += 1
+                self._publish(job)
+                self._touch_all_queued()
+                self._cond.notify_all()
+
+            try:
+                result = self._runner(**job.params)
+                status, error = DONE, None
+            except Exception as e:
+                print(f"❌ Scan job {job.id} failed: {e}")
+                result = {"ok": False, "status": "ERROR", "message": str(e)}
+                status, error = FAILED, str(e)
+
+            with self._cond:
+                job.result = result
+                job.error = error
+                job.status = status
+                job.finished_at = time.time()
+                job.version += 1
+                self._publish(job)
+                self._cond.notify_all()
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+scan_pipeline.py
+Producer/consumer scan pipeline.
+
+    capture thread (CameraManager) --latest frame--> barcode decoder thread
+        --bounded drop-oldest queue--> face dispatcher --> shared face pool
+        --> verdict queue --> caller
+
+Every hand-off only ever holds the freshest items: the capture subscription
+always yields the newest frame and the face queue drops its oldest job when
+full, so a slow stage never makes the others work on stale frames.
+
+With FACE_TRACKING on (default) a tracker thread also follows faces across
+frames (face_tracker.py) and encodes each new face once in the background.
+A barcode that needs a face then reuses the tracked face's cached encoding
+instead of detecting and encoding that frame from scratch, but only if the
+tracker saw that face in the barcode's own frame and has followed it
+without a gap since the encoding was made (see face_tracker.py).
+
+With an adaptive controller (adaptive.py, one per camera) every frame's
+decode and track times are reported to it, and its current level decides
+the face detection downscale and how many frames the tracker skips.
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from face_worker import encode_largest_face, encode_face_box, get_face_pool, DETECT_SCALE
+from face_tracker import FaceTracker
+from metrics import SCAN_STAGE_SECONDS
+
+FACE_QUEUE_SIZE = 2      # pending face jobs before the oldest is dropped
+MAX_FACE_INFLIGHT = 2    # face jobs per pipeline running in the pool at once
+FACE_TRACKING = os.environ.get("FACE_TRACKING", "1") == "1"
+CACHED_FACE = "cached"   # check_barcode: final verdict, annotated only from an already cached encoding
+
+
+class DropOldestQueue:
+    """Bounded queue that discards the oldest item instead of blocking the producer"""
+
+    def __init__(self, maxsize):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """Queue item; returns the oldest item it pushed out, or None."""
+        with self._cond:
+            evicted = None
+            if len(self._items) == self._items.maxlen:
+                evicted = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+            return evicted
+
+    def get(self, timeout=None):
+        """Oldest pending item, or None on timeout / after close()."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while not self._items and not self._closed:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class StageTimer:
+    """Accumulates wall time per pipeline stage (milliseconds), thread-safe"""
+
+    # Keep every individual stage time too (for benchmark.py percentiles)
+    record_samples = False
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.marks = {}
+        self.samples = {}
+        self.frames = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, ms):
+        SCAN_STAGE_SECONDS.observe(ms / 1000.0, stage=name)
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0.0) + ms
+            if self.record_samples:
+                self.samples.setdefault(name, []).append(ms)
+
+    def mark(self, name):
+        """Record when an event first happened (ms since the timer started)."""
+        with self._lock:
+            if name not in self.marks:
+                self.marks[name] = (time.perf_counter() - self.started) * 1000.0
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - t0) * 1000.0)
+
+    def as_dict(self):
+        with self._lock:
+            result = {f"{stage}_ms": round(ms, 2) for stage, ms in self.totals.items()}
+            result.update(self.counts)
+            result.update({f"{name}_at_ms": round(ms, 2) for name, ms in self.marks.items()})
+            if self.record_samples:
+                result["samples"] = {stage: list(ms) for stage, ms in self.samples.items()}
+        result["frames"] = self.frames
+        return result
+
+
+class ScanPipeline:
+    """
+    Runs barcode decoding and face verification concurrently on a frame
+    subscription. The caller supplies the policy as two hooks:
+
+        check_barcode(raw) -> (result, need_face)
+            result None and need_face False: ignore this barcode
+            need_face False: result is the final verdict
+            need_face True:  encode the face in this frame, then call complete()
+            need_face CACHED_FACE: call complete() right away, with the tracked
+                             face's cached encoding if there is one (else None)
+        complete(raw, result, embedding, timer) -> final verdict dict
+    """
+
+    def __init__(self, subscription, decode_frame, check_barcode, complete,
+                 detect_scale=DETECT_SCALE, tracking=FACE_TRACKING, adaptive=None):
+        self.subscription = subscription
+        self.decode_frame = decode_frame
+        self.check_barcode = check_barcode
+        self.complete = complete
+        self.detect_scale = detect_scale
+        self.adaptive = adaptive    # AdaptiveController of the camera, or None
+        self.timer = StageTimer()
+        self.face_queue = DropOldestQueue(FACE_QUEUE_SIZE)
+        self.tracker = FaceTracker(detect_scale=detect_scale) if tracking else None
+        self.track_queue = DropOldestQueue(1)
+        self.verdicts = queue.Queue()
+        self.last_frame = None
+        self.last_rolls = []
+        self._inflight = threading.BoundedSemaphore(MAX_FACE_INFLIGHT)
+        self._pending_rolls = set()
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        loops = [(self._decode_loop, "barcode-decoder"), (self._face_dispatch_loop, "face-dispatcher")]
+        if self.tracker is not None:
+            loops.append((self._track_loop, "face-tracker"))
+        for target, name in loops:
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.face_queue.close()
+        self.track_queue.close()
+        for t in self._threads:
+            t.join(timeout=2)
+
+    def next_verdict(self, timeout):
+        """Block for the next verdict dict, or None on timeout."""
+        try:
+            return self.verdicts.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _settings(self):
+        """(detect_scale, track_every) for the next frame."""
+        if self.adaptive is None:
+            return self.detect_scale, 1
+        settings = self.adaptive.settings
+        return settings["detect_scale"], settings["track_every"]
+
+    def _decode_loop(self):
+        while not self._stop.is_set():
+            with self.timer.stage("capture"):
+                ret, frame = self.subscription.read(timeout=0.5)
+            if not ret:
+                continue
+            self.timer.frames += 1
+            seq = self.timer.frames
+            t0 = time.perf_counter()
+            rolls = self.decode_frame(frame)
+            decode_ms = (time.perf_counter() - t0) * 1000.0
+            self.timer.add("decode", decode_ms)
+            if self.adaptive is not None:
+                self.adaptive.observe("decode", decode_ms)
+                self.adaptive.tick()
+            self.last_frame, self.last_rolls = frame, rolls
+            if rolls:
+                self.timer.mark("first_barcode")
+            if self.tracker is not None and seq % self._settings()[1] == 0:
+                self.track_queue.put((seq, frame))
+            self._queue_barcodes(rolls, seq, frame)
+
+    def _queue_barcodes(self, rolls, seq, frame):
+        """Verdict for each new barcode in frame seq, or a face job for it."""
+        for raw in rolls:
+            with self._pending_lock:
+                if raw in self._pending_rolls:
+                    continue
+            try:
+                result, need_face = self.check_barcode(raw)
+            except Exception as e:
+                self.verdicts.put({"ok": False, "status": "ERROR", "message": str(e)})
+                continue
+            if need_face == CACHED_FACE:
+                embedding = self._cached_encoding(seq)
+                if embedding is not None:
+                    self.timer.count("encodings_reused")
+                self.verdicts.put(self._verdict(raw, result, embedding))
+            elif need_face:
+                embedding = self._cached_encoding(seq)
+                if embedding is not None:
+                    self.timer.count("encodings_reused")
+                    self.verdicts.put(self._verdict(raw, result, embedding))
+                    continue
+                with self._pending_lock:
+                    self._pending_rolls.add(raw)
+                evicted = self.face_queue.put((raw, result, seq, frame))
+                if evicted is not None:
+                    # Its barcode may be scanned again (a walk-through would never verify it otherwise)
+                    self.timer.count("face_jobs_dropped")
+                    with self._pending_lock:
+                        self._pending_rolls.discard(evicted[0])
+            elif result is not None:
+                self.verdicts.put(result)
+
+    # ---- face tracking ----
+
+    def _cached_encoding(self, seq):
+        """Cached encoding of the primary face if the tracker saw it in frame seq, else None."""
+        track = self.tracker.primary() if self.tracker is not None else None
+        return track.fresh_encoding(seq) if track is not None else None
+
+    def _track_loop(self):
+        pool = get_face_pool()
+        while not self._stop.is_set():
+            item = self.track_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            seq, frame = item
+            self.tracker.detect_scale = self._settings()[0]
+            t0 = time.perf_counter()
+            self.tracker.update(frame, seq)
+            track_ms = (time.perf_counter() - t0) * 1000.0
+            self.timer.add("track", track_ms)
+            if self.adaptive is not None:
+                self.adaptive.observe("track", track_ms)
+            track = self.tracker.primary()
+            if track is None or track.encoding_pending or track.fresh_encoding() is not None:
+                continue
+            # Encode a new (or stale) face ahead of its barcode, if the pool has room
+            if not self._inflight.acquire(blocking=False):
+                continue
+            track.encoding_pending = True
+            try:
+                future = pool.submit(encode_face_box, frame, track.box)
+            except Exception:
+                track.encoding_pending = False
+                self._inflight.release()
+                continue
+            future.add_done_callback(lambda f, track=track, seq=seq: self._track_encoded(track, seq, f))
+
+    def _track_encoded(self, track, seq, future):
+        self._inflight.release()
+        try:
+            embedding, timings = future.result()
+        except Exception:
+            embedding, timings = None, {}
+        for stage, ms in timings.items():
+            self.timer.add(stage, ms)
+        if embedding is not None:
+            track.set_encoding(embedding, seq)
+        else:
+            track.encoding_pending = False
+
+    # ---- per-barcode face jobs ----
+
+    def _face_dispatch_loop(self):
+        pool = get_face_pool()
+        while not self._stop.is_set():
+            job = self.face_queue.get(timeout=0.5)
+            if job is None:
+                continue
+            raw, result, seq, frame = job
+            embedding = self._cached_encoding(seq)
+            if embedding is not None:
+                # The tracker finished encoding this face while the job was queued
+                self.timer.count("encodings_reused")
+                self._deliver(raw, self._verdict(raw, result, embedding))
+                continue
+            self._inflight.acquire()
+            if self._stop.is_set():
+                self._inflight.release()
+                break
+            self._submit_face_job(pool, raw, result, seq, frame)
+
+    def _submit_face_job(self, pool, raw, result, seq, frame):
+        """Encode the face of barcode frame seq in the pool (caller holds an inflight slot)."""
+        track = self.tracker.primary() if self.tracker is not None else None
+        box = track.box if track is not None else None
+        if track is not None and track.seen_seq != seq:
+            track = None    # its box is from another frame, maybe another person: detect afresh
+        try:
+            if track is not None:
+                # Face already located by the tracker in this frame: encode its box, no detection
+                future = pool.submit(encode_face_box, frame, box)
+            else:
+                future = pool.submit(encode_largest_face, frame, self._settings()[0])
+        except Exception as e:
+            self._face_failed(raw, e)
+            return
+        future.add_done_callback(
+            lambda f, raw=raw, result=result, track=track, seq=seq: self._face_done(raw, result, f, track, seq))
+
+    def _face_failed(self, raw, error):
+        self._inflight.release()
+        with self._pending_lock:
+            self._pending_rolls.discard(raw)
+        self.verdicts.put({"ok": False, "status": "ERROR", "roll_no": raw, "message": str(error)})
+
+    def _face_done(self, raw, result, future, track=None, seq=None):
+        try:
+            embedding, timings = future.result()
+        except Exception as e:
+            self._face_failed(raw, e)
+            return
+        self._inflight.release()
+        for stage, ms in timings.items():
+            self.timer.add(stage, ms)
+        if track is not None and embedding is not None:
+            track.set_encoding(embedding, seq)
+        self._deliver(raw, self._verdict(raw, result, embedding))
+
+    def _verdict(self, raw, result, embedding):
+        try:
+            return self.complete(raw, result, embedding, self.timer)
+        except Exception as e:
+            return {"ok": False, "status": "ERROR", "roll_no": raw, "message": str(e)}
+
+    def _deliver(self, raw, verdict):
+        with self._pending_lock:
+            self._pending_rolls.discard(raw)
+        self.verdicts.put(verdict)
+
+
+def selftest():
+    """
+    A face job pushed out of a full face queue must not block its barcode from
+    being scanned again, a CACHED_FACE verdict never waits for one, and a face
+    job only encodes (and caches) the tracked box if the tracker saw it in the
+    barcode's own frame.
+    """
+    pipeline = ScanPipeline(subscription=None, decode_frame=None, tracking=False,
+                            check_barcode=lambda raw: ({"roll_no": raw}, True),
+                            complete=lambda raw, result, embedding, timer: result)
+    rolls = [f"10000000{i}" for i in range(FACE_QUEUE_SIZE + 1)]
+    checks = []
+
+    # No face dispatcher running: every barcode waits in the face queue
+    pipeline._queue_barcodes(rolls, 1, None)
+    queued = [job[0] for job in pipeline.face_queue._items]
+    checks.append((f"{len(rolls)} barcodes, the oldest job dropped", queued == rolls[1:]
+                   and pipeline.face_queue.dropped == 1))
+    checks.append(("its roll is no longer pending", rolls[0] not in pipeline._pending_rolls
+                   and set(rolls[1:]) <= pipeline._pending_rolls))
+    pipeline._queue_barcodes(rolls[1:], 2, None)
+    checks.append(("still-pending rolls are not queued twice", len(pipeline.face_queue) == FACE_QUEUE_SIZE
+                   and pipeline.face_queue.dropped == 1))
+    pipeline._queue_barcodes([rolls[0]], 3, None)
+    queued = [job[0] for job in pipeline.face_queue._items]
+    checks.append(("the dropped roll is scanned again", queued[-1] == rolls[0]
+                   and rolls[0] in pipeline._pending_rolls and rolls[1] not in pipeline._pending_rolls))
+
+    # A verdict that only wants a cached face never waits in the face queue
+    quick = ScanPipeline(subscription=None, decode_frame=None, tracking=False,
+                         check_barcode=lambda raw: ({"status": "INVALID_FORMAT", "roll_no": raw}, CACHED_FACE),
+                         complete=lambda raw, result, embedding, timer: result)
+    quick._queue_barcodes(["12-34"], 1, None)
+    checks.append(("a CACHED_FACE verdict is delivered at once", len(quick.face_queue) == 0
+                   and quick.next_verdict(0)["status"] == "INVALID_FORMAT"))
+
+    # The tracker has moved on to frame 5 when the job for frame 4's barcode is dispatched
+    from concurrent.futures import Future
+    from face_tracker import _ScriptedTracker
+
+    class _Pool:
+        def submit(self, fn, *args):
+            self.fn, future = fn, Future()
+            future.set_result(("embedding-from-frame-4", {}))
+            return future
+
+    pool, box = _Pool(), (100, 300, 300, 100)
+    pipeline.tracker = _ScriptedTracker([[box], [box]])
+    pipeline.tracker.update(None, seq=4)
+    pipeline._inflight.acquire()
+    pipeline._submit_face_job(pool, rolls[1], {}, 4, None)
+    checks.append(("a box from the barcode's frame is encoded directly", pool.fn is encode_face_box))
+    track = pipeline.tracker.primary()
+    pipeline.tracker.update(None, seq=5)
+    track.encoding = None  # forget the first job's encoding
+    pipeline._inflight.acquire()
+    pipeline._submit_face_job(pool, rolls[2], {}, 4, None)
+    checks.append(("a box from a later frame is not: the face is detected afresh",
+                   pool.fn is encode_largest_face))
+    checks.append(("and its encoding isn't cached on the track", track.fresh_encoding(seq=5) is None))
+
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return all(ok for _, ok in checks)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "selftest":
+        sys.exit(0 if selftest() else 1)
+    print("Usage: python scan_pipeline.py selftest")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+slot_scheduler.py
+Scheduled slot activation with roster pre-warming.
+
+Every slot in slots.json has a "time" (HH:MM, daily). The scheduler makes
+each slot the active slot of its stations SLOT_LEAD_MINUTES before that time
+(all stations, or only those listed in the slot's optional "stations") and
+pre-warms the active slots:
+
+    - the slot's roster (allowed roll numbers, from its groups) is looked up
+      in the config index
+    - those students' embeddings are copied into the face index's hot cache
+      (face_index.warm), loading the index first if it is cold or stale
+    - the class's already-marked set is loaded (marked_index.py)
+
+Only the camera host process activates slots, and each station is activated
+once per class: an admin's set_slot afterwards sticks until the next slot
+is due, also across restarts. Only today's slots are due: a slot the
+scheduler activated on an earlier day is cleared until today's first one is.
+Every process warms the rosters of all stations' active slots, however they
+were activated, and re-warms when the active slots or the face store change.
+
+Config (env vars):
+    SLOT_SCHEDULER     "1" (default) activate slots on schedule, "0" manual only
+                       (slots activated with set_slot are still pre-warmed)
+    SLOT_LEAD_MINUTES  minutes before a slot's time to activate it, default 5
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+SLOT_SCHEDULER = os.environ.get("SLOT_SCHEDULER", "1") == "1"
+SLOT_LEAD_MINUTES = float(os.environ.get("SLOT_LEAD_MINUTES", 5))
+CHECK_INTERVAL = 15.0   # seconds between schedule checks
+
+
+class SlotScheduler:
+    """Activates slots on time and keeps the active slots' rosters warm"""
+
+    def __init__(self, stations, config, face_index, marked_index=None, store=None, host=None,
+                 enabled=SLOT_SCHEDULER, lead_minutes=SLOT_LEAD_MINUTES, interval=CHECK_INTERVAL):
+        self.stations = stations
+        self.config = config
+        self.face_index = face_index
+        self.marked_index = marked_index
+        self.store = store          # shared "activated" markers; in-memory without one
+        self.host = host            # HostLock: only its holder activates slots
+        self.enabled = enabled
+        self.lead = timedelta(minutes=lead_minutes)
+        self.interval = interval
+        self.warm = None            # what was pre-warmed last (see prewarm)
+        self.last_activation = None
+        self._activated = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- schedule ----
+
+    def _activate_at(self, slot, day):
+        hour, minute = (int(v) for v in slot["time"].split(":"))
+        return datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute) - self.lead
+
+    def _slots_for(self, station):
+        return [s for s in self.config.slots().get("slots", [])
+                if not s.get("stations") or station.name in s["stations"]]
+
+    def due_slot(self, station, now=None):
+        """Slot that should be active on station now: the last one activated today, or None."""
+        now = now or datetime.now()
+        due = [(self._activate_at(s, now.date()), s) for s in self._slots_for(station)]
+        due = [(at, s) for at, s in due if at <= now]
+        return max(due, key=lambda d: d[0])[1] if due else None
+
+    def schedule(self, now=None):
+        """Today's slots in time order with their activation time and state."""
+        now = now or datetime.now()
+        current = {station.name: (self.due_slot(station, now) or {}).get("id")
+                   for station in self.stations.all()}
+        entries = []
+        for slot in sorted(self.config.slots().get("slots", []), key=lambda s: s["time"]):
+            names = [st.name for st in self.stations.all()
+                     if not slot.get("stations") or st.name in slot["stations"]]
+            at = self._activate_at(slot, now.date())
+            state = ("current" if any(current[n] == slot["id"] for n in names)
+                     else "done" if at <= now else "upcoming")
+            entries.append({"slot_id": slot["id"], "subject": slot.get("subject"), "time": slot["time"],
+                            "activate_at": at.isoformat(timespec="minutes"), "stations": names,
+                            "state": state})
+        return entries
+
+    # ---- activation + warming ----
+
+    def _claimed(self, station):
+        """Last key (date + slot) claimed for station, or None."""
+        if self.store is not None:
+            return self.store.get("slot_schedule", station.name)
+        with self._lock:
+            return self._activated.get(station.name)
+
+    def _claim(self, station, key):
+        """True the first time key (date + slot) is claimed for station."""
+        if self.store is not None:
+            if self.store.get("slot_schedule", station.name) == key:
+                return False
+            self.store.set("slot_schedule", station.name, key)
+            return True
+        with self._lock:
+            if self._activated.get(station.name) == key:
+                return False
+            self._activated[station.name] = key
+            return True
+
+    def tick(self, now=None):
+        """Activate due slots (camera host only), then keep the active slots warm."""
+        now = now or datetime.now()
+        date = now.strftime("%Y-%m-%d")
+        if self.enabled and (self.host is None or self.host.acquire()):
+            for station in self.stations.all():
+                slot = self.due_slot(station, now)
+                if slot is None:
+                    self._retire(station, date)
+                elif self._claim(station, f"{date} {slot['id']}"):
+                    station.active_slot = slot
+                    self.last_activation = {"station": station.name, "slot_id": slot["id"],
+                                            "at": now.isoformat(timespec="seconds")}
+                    print(f"⏰ {station.name}: activated {slot.get('subject')} {slot['time']} ({slot['id']})")
+        self.ensure_warm(date)
+
+    def _retire(self, station, date):
+        """Before today's first slot: clear the slot the scheduler activated on an earlier day."""
+        previous = self._claimed(station)
+        if not previous or previous.startswith(date) or not self._claim(station, f"{date} -"):
+            return
+        slot_id = previous.split(" ", 1)[1]
+        current = station.active_slot
+        if current is not None and current["id"] == slot_id:  # not replaced by an admin's set_slot
+            station.active_slot = None
+            print(f"⏰ {station.name}: {current.get('subject')} {current['time']} ({slot_id}) "
+                  f"is from an earlier day, no slot active until today's first")
+
+    def ensure_warm(self, date=None):
+        """Pre-warm the stations' active slots unless that is already done and still valid."""
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        slots = {s["id"]: s for s in (st.active_slot for st in self.stations.all()) if s}
+        if not slots:
+            return self.warm
+        self.face_index.refresh()  # picks up a changed face store, which drops the hot cache
+        if (self.warm and self.warm["slot_ids"] == sorted(slots) and self.warm["date"] == date
+                and self.face_index.is_warm):
+            return self.warm
+        return self.prewarm(list(slots.values()), date)
+
+    def prewarm(self, slots, date=None):
+        """Look up the slots' rosters and cache their embeddings and marked sets. Returns the warm state."""
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        t0 = time.perf_counter()
+        roster = set()
+        for slot in slots:
+            roster |= self.config.slot_roster(slot["id"])
+        cached, not_enrolled = self.face_index.warm(roster)
+        marked = self.marked_index.preload(slots, date) if self.marked_index is not None else None
+        warm = {"slot_ids": sorted(s["id"] for s in slots), "date": date, "roster": len(roster),
+                "embeddings_cached": cached, "not_enrolled": not_enrolled, "already_marked": marked,
+                "ms": round((time.perf_counter() - t0) * 1000.0, 1),
+                "at": datetime.now().isoformat(timespec="seconds")}
+        self.warm = warm
+        names = ", ".join(f"{s.get('subject')} {s['time']}" for s in slots)
+        print(f"🔥 Pre-warmed {names}: {cached}/{len(roster)} embeddings cached in {warm['ms']:.0f} ms")
+        return warm
+
+    # ---- background thread ----
+
+    def start(self):
+        """Start checking the schedule in the background (once per process)."""
+        if multiprocessing.parent_process() is not None:
+            return self  # a spawned pool worker re-importing the app
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run, name="slot-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"⚠️ Slot scheduler: {e}")
+            self._stop.wait(self.interval)
+
+    def to_dict(self):
+        return {
+            "enabled": self.enabled,
+            "lead_minutes": self.lead.total_seconds() / 60,
+            "schedule": self.schedule(),
+            "last_activation": self.last_activation,
+            "warm": dict(self.warm, valid=self.face_index.is_warm) if self.warm else None,
+        }
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+state_store.py
+Small shared key/value store for state that must survive restarts and be
+seen by every worker process: admin sessions, each station's active slot and
+scan job snapshots / submissions (see scan_jobs.py).
+
+Values are JSON, grouped by namespace, with an optional expiry:
+    store.set("admin_session", token, {...}, ttl=8 * 3600)
+    store.get("admin_session", token)        # None once expired
+
+Implementations:
+    - SQLiteStateStore: one WAL-mode SQLite file shared by all processes on
+      the host (default, STATE_DB=backend/state.db)
+    - MemoryStateStore: plain dict, single process only (STATE_DB=:memory:)
+
+Camera devices can only be opened by one process, so exactly one process is
+the "camera host" (an flock on <STATE_DB>.host.lock, see HostLock); it runs
+every station's scan jobs while the others only queue them in the store.
+
+Concurrency self-check (several processes hammering one store):
+    python state_store.py selftest
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process considers itself host
+    fcntl = None
+
+BASE_DIR = Path(__file__).resolve().parent
+STATE_DB = os.environ.get("STATE_DB", str(BASE_DIR / "state.db"))
+PURGE_INTERVAL = 60.0   # seconds between sweeps of expired entries
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    namespace  TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS idx_state_expiry ON state (expires_at) WHERE expires_at IS NOT NULL;
+"""
+
+
+class StateStore:
+    """Interface: namespaced JSON values with optional expiry"""
+
+    def get(self, namespace, key, default=None):
+        raise NotImplementedError
+
+    def set(self, namespace, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+    def items(self, namespace) -> dict:
+        """All live {key: value} pairs of a namespace."""
+        raise NotImplementedError
+
+    def pop(self, namespace, key):
+        """Remove and return a value atomically (None if absent); only one caller gets it."""
+        raise NotImplementedError
+
+
+class MemoryStateStore(StateStore):
+    """In-process store: fine for a single process, lost on restart"""
+
+    def __init__(self):
+        self._data = {}   # (namespace, key) -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def _live(self, entry):
+        return entry is not None and (entry[1] is None or entry[1] > time.time())
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            return entry[0] if self._live(entry) else default
+
+    def set(self, namespace, key, value, ttl=None):
+        with self._lock:
+            self._data[(namespace, key)] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def items(self, namespace):
+        with self._lock:
+            return {k: e[0] for (ns, k), e in self._data.items() if ns == namespace and self._live(e)}
+
+    def pop(self, namespace, key):
+        with self._lock:
+            entry = self._data.pop((namespace, key), None)
+            return entry[0] if self._live(entry) else None
+
+
+class SQLiteStateStore(StateStore):
+    """Store in one SQLite file, safe across threads and processes"""
+
+    def __init__(self, path=STATE_DB):
+        self.path = str(path)
+        self._local = threading.local()
+        self._next_purge = 0.0
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        """Per-thread connection (sqlite3 connections must not be shared across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? "
+            "AND (expires_at IS NULL OR expires_at > ?)", (namespace, key, time.time())).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, namespace, key, value, ttl=None):
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (namespace, key, json.dumps(value), now + ttl if ttl else None))
+        if now >= self._next_purge:
+            self._next_purge = now + PURGE_INTERVAL
+            self._conn().execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def delete(self, namespace, key):
+        self._conn().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace):
+        rows = self._conn().execute(
+            "SELECT key, value FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?) "
+            "ORDER BY rowid", (namespace, time.time()))
+        return {key: json.loads(value) for key, value in rows}
+
+    def pop(self, namespace, key):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)", (namespace, key, time.time())).fetchone()
+            conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return json.loads(row[0]) if row else None
+
+
+class HostLock:
+    """
+    Non-blocking, process-wide flock: the holder is the camera host. Held until
+    the process exits, so another worker takes over after a crash or restart.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._fd = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self._fd is not None:
+                return True
+            if fcntl is None:
+                self._fd = -1
+                return True
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+            self._fd = fd
+            print(f"🎥 Process {os.getpid()} is the camera host")
+            return True
+
+
+def make_state_store(spec=STATE_DB) -> StateStore:
+    if spec == ":memory:":
+        return MemoryStateStore()
+    return SQLiteStateStore(spec)
+
+
+# Global instances
+state_store = make_state_store()
+host_lock = HostLock(STATE_DB + ".host.lock" if STATE_DB != ":memory:" else BASE_DIR / "state.host.lock")
+
+
+# ---- concurrency self-check ----
+
+def _selftest_worker(path, worker, rounds, results):
+    store = SQLiteStateStore(path)
+    seen_missing = 0
+    for i in range(rounds):
+        token = f"w{worker}-{i}"
+        store.set("admin_session", token, {"worker": worker, "i": i}, ttl=60)
+        store.set("active_slot", "default", f"slot-{worker}-{i}")
+        if store.get("admin_session", token) != {"worker": worker, "i": i}:
+            seen_missing += 1
+        store.set("inbox:test", token, {"worker": worker})
+    # Every worker races to claim every inbox item; each must be claimed exactly once
+    claimed = [k for k in list(store.items("inbox:test")) if store.pop("inbox:test", k) is not None]
+    results.put((worker, seen_missing, claimed))
+
+
+def selftest(processes=4, rounds=200):
+    import multiprocessing
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.db")
+        SQLiteStateStore(path)
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_selftest_worker, args=(path, w, rounds, results))
+                 for w in range(processes)]
+        started = time.time()
+        for p in procs:
+            p.start()
+        outcomes = [results.get(timeout=120) for _ in procs]
+        for p in procs:
+            p.join()
+        store = SQLiteStateStore(path)
+        missing = sum(o[1] for o in outcomes)
+        claimed = [k for o in outcomes for k in o[2]]
+        sessions = store.items("admin_session")
+        leftover = store.items("inbox:test")
+        expected = processes * rounds
+        ok = (missing == 0 and len(sessions) == expected
+              and len(claimed) + len(leftover) == expected and len(claimed) == len(set(claimed))
+              and store.get("active_slot", "default", "").startswith("slot-"))
+        print(f"{'✅' if ok else '❌'} {processes} processes x {rounds} rounds in {time.time() - started:.2f}s: "
+              f"{len(sessions)}/{expected} sessions readable, {missing} read-after-write misses, "
+              f"{len(claimed)} inbox items claimed once + {len(leftover)} left, no double claims: "
+              f"{len(claimed) == len(set(claimed))}")
+        return ok
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "selftest":
+        sys.exit(0 if selftest() else 1)
+    print("Usage: python state_store.py selftest")
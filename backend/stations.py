@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+stations.py
+Named scanning stations.
+
+A station is one physical scanner (camera + kiosk) with its own active slot
+and its own scan queue, so several entrances can scan in parallel from one
+backend. Stations are listed in stations.json:
+
+    {
+      "stations": [
+        {"name": "lab-a", "source": "0"},
+        {"name": "lab-b", "source": "/dev/video2", "slot_id": "slot-0800"}
+      ]
+    }
+
+Without stations.json there is a single "default" station on CAMERA_SOURCE.
+With a state store the active slot lives there (shared by all worker
+processes, kept across restarts); "slot_id" is only the initial default.
+Walk-through sessions are looked up in a SessionDirectory (walkthrough.py),
+so every worker process sees which stations are running one.
+Face detection/encoding is not per station: every station's pipeline submits
+to the shared pool in face_worker.py.
+"""
+
+import json
+from pathlib import Path
+
+from camera_manager import CameraManager, camera_manager
+from scan_jobs import ScanJobQueue
+
+BASE_DIR = Path(__file__).resolve().parent
+STATIONS_FILE = BASE_DIR / "stations.json"
+DEFAULT_STATION = "default"
+
+
+class Station:
+    """One scanner: a camera, an active slot, a scan job queue and maybe a walk-through session"""
+
+    def __init__(self, name, camera: CameraManager, default_slot_id=None, store=None, find_slot=None,
+                 sessions=None):
+        self.name = name
+        self.camera = camera
+        self.default_slot_id = default_slot_id
+        self.store = store
+        self.find_slot = find_slot
+        self.sessions = sessions          # SessionDirectory, or None
+        self._slot_id = default_slot_id   # used without a store
+        self.jobs = None
+
+    @property
+    def active_slot(self):
+        """The slot dict this station scans for, resolved fresh from the slots config."""
+        if self.store is not None:
+            slot_id = self.store.get("active_slot", self.name, self.default_slot_id)
+        else:
+            slot_id = self._slot_id
+        if not slot_id or self.find_slot is None:
+            return None
+        return self.find_slot(slot_id)
+
+    @active_slot.setter
+    def active_slot(self, slot):
+        slot_id = slot["id"] if slot else None
+        if self.store is not None:
+            self.store.set("active_slot", self.name, slot_id)
+        else:
+            self._slot_id = slot_id
+
+    @property
+    def session(self):
+        """Record of the walk-through session running on this station (any process), or None."""
+        return self.sessions.running(self.name) if self.sessions is not None else None
+
+    @property
+    def session_running(self):
+        return self.session is not None
+
+    def attach_runner(self, runner, host=None):
+        """Create this station's job queue (started with jobs.start()); runner(station=..., **params) runs one job."""
+        self.jobs = ScanJobQueue(lambda **params: runner(station=self, **params), name=self.name,
+                                 store=self.store, host=host)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "source": self.camera.name,
+            "active_slot": self.active_slot,
+            "queue_depth": self.jobs.depth if self.jobs else 0,
+            "session_id": (self.session or {}).get("session_id"),
+        }
+
+
+class StationRegistry:
+    """All configured stations, looked up by name"""
+
+    def __init__(self, stations):
+        self._stations = {s.name: s for s in stations}
+
+    @classmethod
+    def load(cls, path=STATIONS_FILE, find_slot=None, store=None, sessions=None):
+        """Build stations from stations.json, or a single default station."""
+        stations = []
+        if Path(path).exists():
+            config = json.loads(Path(path).read_text())
+            for entry in config.get("stations", []):
+                name = entry["name"]
+                camera = CameraManager.for_source(entry.get("source", "0"), name=name,
+                                                  width=entry.get("width"), height=entry.get("height"),
+                                                  fps=entry.get("fps"))
+                stations.append(Station(name, camera, entry.get("slot_id"), store, find_slot, sessions))
+        if not stations:
+            stations.append(Station(DEFAULT_STATION, camera_manager, store=store, find_slot=find_slot,
+                                    sessions=sessions))
+        print(f"🏫 Stations: {', '.join(s.name for s in stations)}")
+        return cls(stations)
+
+    def get(self, name=None):
+        """Station by name; None/empty selects the first configured station."""
+        if not name:
+            return next(iter(self._stations.values()))
+        return self._stations.get(name)
+
+    def all(self):
+        return list(self._stations.values())
+
+    def find_job(self, job_id):
+        """(station, job snapshot) for a scan job id on any station."""
+        for station in self._stations.values():
+            if station.jobs is None:
+                continue
+            job = station.jobs.get(job_id)
+            if job is not None:
+                return station, job
+        return None, None
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+walkthrough.py
+Continuous walk-through scanning sessions.
+
+scan_once() stops after the first verdict, so every student costs an HTTP
+round trip and a fresh pipeline. A session instead keeps one station's scan
+pipeline running for a whole class and verifies every student who shows a
+barcode and a face, one after another:
+
+    - a roll marked VALID is ignored for the rest of the session; any other
+      barcode (including unreadable ones) is re-checked at most every
+      SESSION_COOLDOWN seconds
+    - roster checks run before any face work (screen hook), and a roll
+      already marked in this class earlier (e.g. at a kiosk) is reported
+      once as ALREADY_MARKED and then ignored like the session's own marks
+    - every verdict is appended to a live feed clients follow over SSE
+    - attendance rows go to the record callback, i.e. the write-behind
+      attendance store, which commits them in batches
+
+A session runs in the camera host process. With a shared store
+(state_store.py) it publishes its record and feed there, and SessionDirectory
+lets any worker process look a session up, follow its feed or stop it.
+"""
+
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+from barcode_scanner import ScanPolicy, ROLL_REGEX
+from marked_index import ALREADY_MARKED
+from barcode_engine import BarcodeEngine
+from preview import preview_for
+from scan_pipeline import ScanPipeline
+
+SESSION_COOLDOWN = 3.0        # seconds before the same non-VALID barcode is re-checked
+SESSION_MAX_SECONDS = 2 * 60 * 60
+EVENT_HISTORY = 500           # feed events kept for late subscribers
+SESSION_TTL = 24 * 60 * 60    # seconds session records stay in the shared store
+HEARTBEAT_SECONDS = 5.0       # a running session republishes its record at least this often
+STALE_AFTER = 3 * HEARTBEAT_SECONDS  # a running record not refreshed for this long is dead
+STORE_POLL = 0.5              # seconds between store checks (remote feeds, stop requests)
+STOP_WAIT = 5.0               # seconds stop() waits for a remote session to wind down
+
+STARTING = "starting"
+RUNNING = "running"
+STOPPED = "stopped"
+ACTIVE_STATES = (STARTING, RUNNING)
+
+
+class SessionPolicy(ScanPolicy):
+    """ScanPolicy with session-wide duplicate suppression"""
+
+    def __init__(self, expected_students=None, screen=None, cooldown=SESSION_COOLDOWN,
+                 already_marked=None):
+        super().__init__(expected_students, cooldown=cooldown, screen=screen,
+                         already_marked=already_marked)
+        self.marked = set()
+
+    def check_barcode(self, raw):
+        if raw in self.marked:
+            return None, False
+        # A damaged code stays in view as long as its owner does: don't re-verify it every frame
+        if not ROLL_REGEX.match(raw) and self.recently_seen(raw):
+            return None, False
+        result, need_face = super().check_barcode(raw)
+        if result is not None and result.get("status") == ALREADY_MARKED:
+            self.marked.add(raw)
+        return result, need_face
+
+    def complete(self, raw, result, live_embedding, timer):
+        verdict = super().complete(raw, result, live_embedding, timer)
+        if verdict.get("status") == "VALID":
+            self.marked.add(raw)
+        return verdict
+
+
+class WalkthroughSession:
+    """One station scanning continuously for one slot"""
+
+    def __init__(self, station, slot, record, screen=None, max_seconds=SESSION_MAX_SECONDS,
+                 already_marked=None, store=None):
+        self.id = uuid.uuid4().hex
+        self.station = station
+        self.slot = slot
+        self.date = datetime.now().strftime("%Y-%m-%d")
+        self.record = record              # record(session, verdict) for verdicts with a roll_no
+        self.max_seconds = max_seconds
+        self.policy = SessionPolicy(slot.get("students"), screen, already_marked=already_marked)
+        self.status = STARTING
+        self.started_at = time.time()
+        self.stopped_at = None
+        self.counts = {}
+        self.pipeline = None
+        self.engine = BarcodeEngine()
+        self.store = store                # StateStore shared with other processes, or None
+        self._events_ns = f"walkthrough_events:{self.id}"
+        self._published_at = 0.0
+        self._events = deque(maxlen=EVENT_HISTORY)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self.status in ACTIVE_STATES
+
+    def start(self) -> bool:
+        """Open the station camera and start verifying. False if the camera is unavailable."""
+        sub = self.station.camera.subscribe()
+        if sub is None:
+            self._set_status(STOPPED)
+            return False
+        self.pipeline = ScanPipeline(sub, self.engine.decode, self.policy.check_barcode,
+                                     self.policy.complete, adaptive=self.station.camera.adaptive).start()
+        self._thread = threading.Thread(target=self._run, args=(sub,),
+                                        name=f"session-{self.station.name}", daemon=True)
+        self._set_status(RUNNING)
+        self._thread.start()
+        print(f"🚶 Session {self.id[:8]} started on {self.station.name} for "
+              f"{self.slot.get('subject')} {self.slot.get('time')}")
+        return True
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def _run(self, sub):
+        preview = preview_for(self.station.camera)
+        deadline = self.started_at + self.max_seconds
+        last_line = "Show barcode + face"
+        try:
+            while not self._stop.is_set() and time.time() < deadline:
+                verdict = self.pipeline.next_verdict(timeout=0.25)
+                if verdict is not None:
+                    self._add(verdict)
+                    last_line = f"{verdict.get('roll_no', '')} {verdict.get('status')}"
+                if self.store is not None:
+                    if self.store.get("walkthrough_stop", self.id):
+                        break  # stopped from another worker process
+                    if time.time() - self._published_at >= HEARTBEAT_SECONDS:
+                        self._publish()
+                if preview.watched:
+                    preview.annotate([f"{self.slot.get('subject')} | marked: {len(self.policy.marked)}",
+                                      last_line])
+        finally:
+            self.pipeline.stop()
+            sub.close()
+            self.stopped_at = time.time()
+            self._set_status(STOPPED)
+            print(f"🏁 Session {self.id[:8]} stopped: {len(self.policy.marked)} marked, {self.counts}")
+
+    def _add(self, verdict):
+        verdict["station"] = self.station.name
+        verdict["timestamp"] = datetime.now().isoformat()
+        if "roll_no" in verdict:
+            try:
+                self.record(self, verdict)
+            except Exception as e:
+                print(f"❌ Session {self.id[:8]} could not record {verdict.get('roll_no')}: {e}")
+        with self._cond:
+            self._seq += 1
+            event = {"seq": self._seq, **verdict}
+            self._events.append(event)
+            status = verdict.get("status")
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self._cond.notify_all()
+        if self.store is not None:
+            self.store.set(self._events_ns, str(event["seq"]), event, ttl=SESSION_TTL)
+            self.store.delete(self._events_ns, str(event["seq"] - EVENT_HISTORY))
+            self._publish()
+
+    def _set_status(self, status):
+        with self._cond:
+            self.status = status
+            self._cond.notify_all()
+        self._publish()
+
+    def _publish(self):
+        """Share the session's record (with a heartbeat) with other processes."""
+        if self.store is not None:
+            self._published_at = time.time()
+            self.store.set("walkthrough", self.id, dict(self.to_dict(), heartbeat=self._published_at),
+                           ttl=SESSION_TTL)
+
+    def events_after(self, seq, timeout):
+        """Feed events newer than seq, waiting up to timeout for one; [] on timeout or when stopped."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq or not self.running, timeout=timeout)
+            return [e for e in self._events if e["seq"] > seq]
+
+    def to_dict(self):
+        with self._cond:
+            return {
+                "session_id": self.id,
+                "station": self.station.name,
+                "slot": self.slot,
+                "date": self.date,
+                "status": self.status,
+                "started_at": self.started_at,
+                "stopped_at": self.stopped_at,
+                "counts": dict(self.counts),
+                "marked": sorted(self.policy.marked),
+                "last_seq": self._seq,
+                "timings": self.pipeline.timer.as_dict() if self.pipeline else {},
+                "adaptive": self.station.camera.adaptive.to_dict(),
+                "barcode": self.engine.to_dict(),
+            }
+
+
+class SessionDirectory:
+    """
+    Walk-through sessions by id and by station: the ones running in this
+    process, and with a store every worker's, from their published records
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self._sessions = {}     # session id -> WalkthroughSession started in this process
+        self._by_station = {}   # station name -> latest session id (without a store)
+        self._lock = threading.Lock()
+
+    def add(self, session):
+        with self._lock:
+            self._sessions[session.id] = session
+            self._by_station[session.station.name] = session.id
+        if self.store is not None:
+            self.store.set("station_session", session.station.name, session.id, ttl=SESSION_TTL)
+
+    def get(self, session_id):
+        """A session's record (WalkthroughSession.to_dict()), or None if unknown."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None:
+            return session.to_dict()
+        if self.store is None:
+            return None
+        record = self.store.get("walkthrough", session_id)
+        if record is not None and time.time() - record.pop("heartbeat", 0) > STALE_AFTER \
+                and record["status"] in ACTIVE_STATES:
+            record["status"] = STOPPED  # its camera host went away without stopping it
+        return record
+
+    def latest(self, station_name):
+        """Record of the station's most recent session (running or not), or None."""
+        if self.store is not None:
+            session_id = self.store.get("station_session", station_name)
+        else:
+            with self._lock:
+                session_id = self._by_station.get(station_name)
+        return self.get(session_id) if session_id else None
+
+    def running(self, station_name):
+        """Record of the session running on a station, or None."""
+        record = self.latest(station_name)
+        return record if record is not None and record["status"] in ACTIVE_STATES else None
+
+    def stop(self, session_id, wait=STOP_WAIT):
+        """Stop a session wherever it runs. Returns its record, None if unknown."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None:
+            session.stop()
+            return session.to_dict()
+        record = self.get(session_id)
+        if record is None or record["status"] not in ACTIVE_STATES:
+            return record
+        # Runs in the camera host: ask it to stop and wait for the record to say so
+        self.store.set("walkthrough_stop", session_id, True, ttl=SESSION_TTL)
+        deadline = time.time() + wait
+        while record["status"] in ACTIVE_STATES and time.time() < deadline:
+            time.sleep(STORE_POLL)
+            record = self.get(session_id) or record
+        return record
+
+    def events_after(self, session_id, seq, timeout):
+        """
+        (feed events newer than seq, session still running), waiting up to
+        timeout for an event; None if the session is unknown.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None:
+            return session.events_after(seq, timeout), session.running
+        deadline = time.time() + timeout
+        while True:
+            record = self.get(session_id)
+            if record is None:
+                return None
+            # Read after the record: a stopped record means every event is already stored
+            events = sorted((e for e in self.store.items(f"walkthrough_events:{session_id}").values()
+                             if e["seq"] > seq), key=lambda e: e["seq"])
+            running = record["status"] in ACTIVE_STATES
+            remaining = deadline - time.time()
+            if events or not running or remaining <= 0:
+                return events, running
+            time.sleep(min(STORE_POLL, remaining))
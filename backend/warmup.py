@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+warmup.py
+Background model warm-up and readiness.
+
+The heavy libraries (face_recognition/dlib, pyzbar) are imported lazily, so
+the API starts serving in well under a second. Right after startup this
+module loads them on a background thread instead of on the first scan:
+
+    - barcode: import pyzbar (libzbar) and decode a blank frame
+    - face:    one warm_up() job per face pool worker (import + a dummy
+               detection and encoding, see face_worker.py)
+
+GET /api/health/ready reports 503 until every step has finished, so kiosks
+and load balancers only send scans to a process whose models are hot.
+
+Config (env vars):
+    WARMUP  "1" (default) warm up at startup; "0" skips it (models load on
+            the first scan and the process reports ready immediately)
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+
+from face_worker import warm_up, get_face_pool, FACE_POOL, FACE_WORKERS
+
+WARMUP = os.environ.get("WARMUP", "1") != "0"
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class Warmup:
+    """Runs the warm-up steps once and tracks how long each took"""
+
+    def __init__(self, enabled=WARMUP):
+        self.enabled = enabled
+        self.status = PENDING if enabled else READY
+        self.steps = {}            # step -> ms
+        self.startup = {}          # startup phases recorded by the app -> ms
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.status == READY
+
+    def record(self, phase, ms):
+        """Record a startup phase timing (e.g. the app's own import time)."""
+        with self._lock:
+            self.startup[phase] = round(ms, 1)
+
+    def start(self):
+        """Start warming up in the background (no-op if disabled or already started)."""
+        if multiprocessing.parent_process() is not None:
+            return self  # a spawned pool worker re-importing the app: its parent warms it up
+        with self._lock:
+            if not self.enabled or self._thread is not None:
+                return self
+            self.status = WARMING
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def _step(self, name, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        with self._lock:
+            self.steps[name] = round((time.perf_counter() - t0) * 1000.0, 1)
+        return result
+
+    def _run(self):
+        try:
+            from barcode_scanner import decode_rolls
+            self._step("barcode", lambda: decode_rolls(np.zeros((120, 160, 3), dtype=np.uint8)))
+
+            pool = get_face_pool()
+            # Threads share one copy of the models; each process needs its own
+            jobs = 1 if FACE_POOL == "thread" else FACE_WORKERS
+            workers = self._step("face", lambda: [f.result() for f in
+                                                  [pool.submit(warm_up) for _ in range(jobs)]])
+            slowest = max(workers, key=lambda w: sum(w[1].values()))[1]
+            with self._lock:
+                for name, ms in slowest.items():
+                    self.steps[f"face_{name}"] = round(ms, 1)
+                self.status = READY
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+                self.status = FAILED
+            print(f"❌ Warm-up failed: {e}")
+            return
+        finally:
+            self.finished_at = time.time()
+        print(f"🔥 Models warm in {self.finished_at - self.started_at:.2f}s "
+              f"({', '.join(f'{k} {v:.0f} ms' for k, v in self.steps.items())})")
+
+    def to_dict(self):
+        with self._lock:
+            d = {
+                "ready": self.status == READY,
+                "status": self.status,
+                "steps_ms": dict(self.steps),
+                "startup_ms": dict(self.startup),
+            }
+            if self.started_at and self.finished_at:
+                d["warmup_ms"] = round((self.finished_at - self.started_at) * 1000.0, 1)
+            if self.error:
+                d["error"] = self.error
+            return d
+
+
+# Global instance
+warmup = Warmup()
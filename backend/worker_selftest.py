@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+worker_selftest.py
+Multi-process self-check of the whole app.
+
+Starts several worker processes that each import app.py on one shared state
+store, like gunicorn -w N, and sends every request to a different worker
+than the one holding the state it needs:
+
+    - admin login on one worker, the token accepted by the others
+    - set_slot on one worker, the active slot seen by the others
+    - a scan queued on a non-host worker, run by the camera host, followed
+      (status + SSE) from a third worker
+    - a walk-through session started from a non-host worker; its status,
+      feed, stop and the 409 for single scans served by the others
+    - the live preview on a non-host worker, relayed by the camera host
+
+Workers are separate interpreters (python worker_selftest.py serve), not
+multiprocessing children, so they start their background threads like
+WSGI workers do. No webcam or enrolled faces needed: the camera is a
+directory of synthetic QR code frames (benchmark.py synth) and scans end in
+NO_GROUP.
+
+    python worker_selftest.py [--workers 3]
+"""
+
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+
+READY_TIMEOUT = 60      # seconds a worker may take to import the app
+REQUEST_TIMEOUT = 90    # seconds one request may take (scan jobs wait for the camera)
+ROLL = "100000001"      # in no group, not enrolled: scans end in NO_GROUP without face work
+
+
+def serve():
+    """
+    Worker process: import the app and answer JSON requests, one per line on
+    stdin, with one JSON line on stdout (the app's own output goes to stderr).
+    """
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    import app  # starts its background threads, as under a WSGI server
+    client = app.app.test_client()
+    time.sleep(1.0)  # let the job workers settle who is the camera host
+    replies.write(json.dumps({"pid": os.getpid(), "host": app.host_lock.held}) + "\n")
+    replies.flush()
+    for line in sys.stdin:
+        method, path, body, token, mode = json.loads(line)
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = client.open(path, method=method, json=body, headers=headers, buffered=False)
+        try:
+            data = next(iter(response.response), b"") if mode == "first_chunk" else response.get_data()
+        finally:
+            response.close()
+        payload = response.get_json(silent=True) if mode == "json" else data.decode("utf-8", "replace")
+        replies.write(json.dumps([response.status_code, payload]) + "\n")
+        replies.flush()
+
+
+class Workers:
+    """The worker processes, addressed by index; worker 0 is started first and becomes the camera host"""
+
+    def __init__(self, count, env):
+        self.procs, self.replies = [], []
+        for i in range(count):
+            proc = subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "serve"],
+                                    env={**os.environ, **env}, cwd=BASE_DIR, text=True,
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            replies = queue.Queue()
+            threading.Thread(target=lambda p=proc, q=replies: [q.put(l) for l in p.stdout],
+                             daemon=True).start()
+            ready = json.loads(replies.get(timeout=READY_TIMEOUT))
+            print(f"   worker {i}: pid {ready['pid']}{' (camera host)' if ready['host'] else ''}")
+            self.procs.append(proc)
+            self.replies.append(replies)
+
+    def call(self, worker, method, path, body=None, token=None, mode="json"):
+        proc = self.procs[worker]
+        proc.stdin.write(json.dumps([method, path, body, token, mode]) + "\n")
+        proc.stdin.flush()
+        return tuple(json.loads(self.replies[worker].get(timeout=REQUEST_TIMEOUT)))
+
+    def close(self):
+        for proc in self.procs:
+            proc.stdin.close()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def _wait_for(check, timeout=20.0, interval=0.5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        value = check()
+        if value:
+            return value
+        time.sleep(interval)
+    return None
+
+
+def selftest(workers=3):
+    from benchmark import synth_frames
+    from config_registry import config
+
+    slots = config.slots().get("slots", [])
+    if not slots:
+        print("❌ No slots configured (slots.json)")
+        return False
+    slot_id = slots[0]["id"]
+    count = max(3, workers)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        frames = os.path.join(tmp, "frames")
+        synth_frames(frames, [ROLL], lead_in=5, barcode_frames=60)
+        env = {
+            "STATE_DB": os.path.join(tmp, "state.db"),
+            "ATTENDANCE_DB": os.path.join(tmp, "attendance.db"),
+            "FACE_STORE": os.path.join(tmp, "face_store"),
+            "FACE_DB": os.path.join(tmp, "face_data.json"),
+            "CAMERA_SOURCE": frames,
+            "FACE_POOL": "thread",
+            "WARMUP": "0",
+            "SLOT_SCHEDULER": "0",
+            "HEADLESS": "1",
+        }
+        print(f"🧪 Starting {count} workers on {env['STATE_DB']}")
+        started = time.time()
+        pool = Workers(count, env)
+        checks = []
+
+        def check(name, ok, detail=""):
+            checks.append(bool(ok))
+            print(f"{'✅' if checks[-1] else '❌'} {name}{f': {detail}' if detail and not checks[-1] else ''}")
+
+        try:
+            host, a, b = 0, 1, 2
+
+            # Admin sessions and the active slot
+            status, body = pool.call(a, "POST", "/api/admin/login", {"password": os.environ.get(
+                "ADMIN_PASSWORD", "adminpass")})
+            token = (body or {}).get("token")
+            check("login on worker 1", status == 200 and token, body)
+            status, body = pool.call(b, "POST", "/api/admin/set_slot", {"slot_id": slot_id}, token)
+            check("worker 2 accepts worker 1's token", status == 200, body)
+            status, body = pool.call(host, "GET", "/api/admin/active_slot", token=token)
+            check("worker 0 sees the slot set on worker 2",
+                  status == 200 and (body.get("active_slot") or {}).get("id") == slot_id, body)
+
+            # A scan queued on a non-host worker runs on the camera host
+            status, body = pool.call(a, "POST", "/api/scan", {})
+            job_id = (body or {}).get("job_id")
+            check("scan queued on worker 1", status == 202 and job_id, body)
+            status, text = pool.call(b, "GET", f"/api/scan/{job_id}/events", mode="text")
+            check("worker 2 follows the scan's events to the end",
+                  status == 200 and "event: done" in text, text[-300:])
+            status, body = pool.call(host, "GET", f"/api/scan/{job_id}")
+            result = (body or {}).get("result") or {}
+            check("worker 0 reports the scan result",
+                  status == 200 and body.get("status") == "done" and result.get("roll_no") == ROLL, body)
+
+            # A walk-through session started from a non-host worker
+            status, body = pool.call(a, "POST", "/api/admin/session/start", {"slot_id": slot_id}, token)
+            session_id = ((body or {}).get("session") or {}).get("session_id")
+            check("session started from worker 1", status == 201 and session_id, body)
+            status, body = pool.call(b, "GET", f"/api/admin/session/{session_id}", token=token)
+            check("worker 2 sees it running",
+                  status == 200 and body["session"]["status"] == "running", body)
+            status, body = pool.call(b, "POST", "/api/scan", {})
+            check("single scans get 409 on worker 2", status == 409, body)
+            status, body = pool.call(a, "GET", "/api/stations")
+            check("worker 1 lists the session on its station",
+                  status == 200 and body["stations"][0]["session_id"] == session_id, body)
+            counted = _wait_for(lambda: pool.call(b, "GET", f"/api/admin/session/{session_id}",
+                                                  token=token)[1]["session"]["counts"])
+            check("the session records a verdict", bool(counted), counted)
+            status, body = pool.call(b, "POST", "/api/admin/session/stop", {"session_id": session_id}, token)
+            check("worker 2 stops it", status == 200 and body["session"]["status"] == "stopped", body)
+            status, text = pool.call(a, "GET", f"/api/session/{session_id}/events?token={token}", mode="text")
+            check("worker 1 replays its feed", status == 200 and f'"roll_no": "{ROLL}"' in text
+                  and "event: stopped" in text, text[-300:])
+            status, _ = pool.call(a, "GET", f"/api/session/{session_id}/events")
+            check("the feed needs the admin token", status == 401)
+
+            # Preview from a non-host worker
+            status, chunk = pool.call(b, "GET", "/api/preview.mjpg", mode="first_chunk")
+            check("worker 2 relays the live preview", status == 200 and chunk.startswith("--frame"),
+                  f"{status} {chunk[:40]!r}")
+        finally:
+            pool.close()
+
+    ok = all(checks)
+    print(f"{'✅' if ok else '❌'} {sum(checks)}/{len(checks)} checks passed with {count} workers "
+          f"in {time.time() - started:.1f}s")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Multi-process self-check of the app (no webcam needed)")
+    parser.add_argument("mode", nargs="?", choices=["serve"], help=argparse.SUPPRESS)
+    parser.add_argument("--workers", type=int, default=3, help="worker processes (at least 3)")
+    args = parser.parse_args()
+    if args.mode == "serve":
+        serve()
+        return
+    sys.exit(0 if selftest(args.workers) else 1)
+
+
+if __name__ == "__main__":
+    main()
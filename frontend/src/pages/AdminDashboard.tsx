@@ -1,7 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
-import { api, Slot, AttendanceRecord } from '../services/api';
+import { api, Slot, AttendanceRecord, SessionEvent, SubjectSummary, WalkthroughSession } from '../services/api';
 import SlotPicker from '../components/SlotPicker';
 import AttendanceTable from '../components/AttendanceTable';
 
@@ -17,7 +17,15 @@ const AdminDashboard = () => {
   const [attendanceSubject, setAttendanceSubject] = useState('');
   const [attendanceDate, setAttendanceDate] = useState('');
   const [attendanceRecords, setAttendanceRecords] = useState<AttendanceRecord[]>([]);
+  const [nextCursor, setNextCursor] = useState<number | null>(null);
   const [loadingAttendance, setLoadingAttendance] = useState(false);
+  const [summary, setSummary] = useState<SubjectSummary | null>(null);
+
+  const [session, setSession] = useState<WalkthroughSession | null>(null);
+  const [sessionFeed, setSessionFeed] = useState<SessionEvent[]>([]);
+  const stopWatching = useRef<(() => void) | null>(null);
+
+  useEffect(() => () => stopWatching.current?.(), []);
 
   useEffect(() => {
     if (!token) {
@@ -66,12 +74,13 @@ const AdminDashboard = () => {
     }
   };
 
-  const handleViewAttendance = async () => {
+  const loadAttendancePage = async (after: number | null) => {
     if (!attendanceSubject || !token) return;
     setLoadingAttendance(true);
     try {
-      const records = await api.getAttendance(attendanceSubject, attendanceDate || undefined, token);
-      setAttendanceRecords(records);
+      const page = await api.getAttendancePage(attendanceSubject, { date: attendanceDate || undefined }, token, after);
+      setAttendanceRecords(prev => (after ? [...prev, ...page.rows] : page.rows));
+      setNextCursor(page.next_cursor);
     } catch (err) {
       setMessage('Failed to load attendance');
     } finally {
@@ -79,6 +88,66 @@ const AdminDashboard = () => {
     }
   };
 
+  const handleViewAttendance = () => loadAttendancePage(null);
+
+  const handleViewSummary = async () => {
+    if (!attendanceSubject || !token) return;
+    try {
+      setSummary(await api.getSubjectSummary(attendanceSubject, token));
+    } catch (err) {
+      setMessage('Failed to load attendance summary');
+    }
+  };
+
+  const handleExportAttendance = async () => {
+    if (!attendanceSubject || !token) return;
+    try {
+      const blob = await api.exportAttendance(attendanceSubject, { date: attendanceDate || undefined }, token);
+      const url = URL.createObjectURL(blob);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `${attendanceSubject}${attendanceDate ? `-${attendanceDate}` : ''}.csv`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (err) {
+      setMessage('Failed to export attendance');
+    }
+  };
+
+  const handleStartSession = async () => {
+    if (!token) return;
+    setMessage('');
+    try {
+      const response = await api.startSession(token, selectedSlot || undefined);
+      if (!response.ok || !response.session) {
+        setMessage(response.message || 'Failed to start session');
+        return;
+      }
+      setSession(response.session);
+      setSessionFeed([]);
+      stopWatching.current?.();
+      stopWatching.current = api.watchSession(
+        token,
+        response.session.session_id,
+        event => setSessionFeed(prev => [event, ...prev].slice(0, 100)),
+        finished => setSession(finished)
+      );
+    } catch (err) {
+      setMessage('Error starting session');
+    }
+  };
+
+  const handleStopSession = async () => {
+    if (!token || !session) return;
+    try {
+      const response = await api.stopSession(token, session.session_id);
+      if (response.session) setSession(response.session);
+      else setMessage(response.message || 'Failed to stop session');
+    } catch (err) {
+      setMessage('Error stopping session');
+    }
+  };
+
   const handleLogout = () => {
     logout();
     navigate('/admin/login');
@@ -134,6 +203,47 @@ const AdminDashboard = () => {
           </div>
         )}
 
+        <div className="bg-white rounded-lg shadow-md p-6 mb-6">
+          <div className="flex justify-between items-center mb-4">
+            <h2 className="text-xl font-semibold">Walk-through Session</h2>
+            {session?.status === 'running' ? (
+              <button
+                onClick={handleStopSession}
+                className="bg-red-600 hover:bg-red-700 text-white px-4 py-2 rounded-lg"
+              >
+                Stop Session
+              </button>
+            ) : (
+              <button
+                onClick={handleStartSession}
+                disabled={!selectedSlot && !activeSlot}
+                className="bg-indigo-600 hover:bg-indigo-700 disabled:bg-indigo-400 text-white px-4 py-2 rounded-lg"
+              >
+                Start Session
+              </button>
+            )}
+          </div>
+          <p className="text-sm text-gray-600 mb-2">
+            Students pass the kiosk one after another; each barcode + face is verified without a new scan.
+          </p>
+          {session && (
+            <>
+              <p className="text-gray-700 mb-2">
+                {session.slot.subject} · {session.slot.time} · {session.status} · marked:{' '}
+                {Math.max(session.marked.length, sessionFeed.filter(e => e.status === 'VALID').length)}
+              </p>
+              <ul className="max-h-64 overflow-y-auto divide-y divide-gray-100 text-sm">
+                {sessionFeed.map(event => (
+                  <li key={event.seq} className="py-1 flex justify-between">
+                    <span>{event.roll_no}</span>
+                    <span className={event.ok ? 'text-green-700' : 'text-red-700'}>{event.status}</span>
+                  </li>
+                ))}
+              </ul>
+            </>
+          )}
+        </div>
+
         <div className="bg-white rounded-lg shadow-md p-6">
           <h2 className="text-xl font-semibold mb-4">View Attendance</h2>
           <div className="grid grid-cols-1 md:grid-cols-3 gap-4 mb-4">
@@ -169,9 +279,64 @@ const AdminDashboard = () => {
               </button>
             </div>
           </div>
+          <button
+            onClick={handleViewSummary}
+            disabled={!attendanceSubject}
+            className="mb-4 text-sm bg-gray-200 hover:bg-gray-300 disabled:bg-gray-100 text-gray-800 px-3 py-1 rounded-lg"
+          >
+            Attendance %
+          </button>
+
+          {summary && summary.subject === attendanceSubject && (
+            <div className="overflow-x-auto mb-4">
+              <table className="w-full border-collapse">
+                <thead>
+                  <tr className="bg-gray-100">
+                    <th className="px-4 py-2 text-left border">Roll No</th>
+                    <th className="px-4 py-2 text-left border">Present</th>
+                    <th className="px-4 py-2 text-left border">Absent</th>
+                    <th className="px-4 py-2 text-left border">%</th>
+                    <th className="px-4 py-2 text-left border">Rejected scans</th>
+                  </tr>
+                </thead>
+                <tbody>
+                  {summary.students.map(s => (
+                    <tr key={s.roll_no} className="hover:bg-gray-50">
+                      <td className="px-4 py-2 border font-mono">{s.roll_no}</td>
+                      <td className="px-4 py-2 border">{s.present}/{s.sessions}</td>
+                      <td className="px-4 py-2 border">{s.absent}</td>
+                      <td className="px-4 py-2 border">{s.percentage === null ? '-' : `${s.percentage}%`}</td>
+                      <td className="px-4 py-2 border text-sm">
+                        {Object.entries(s.rejected).map(([status, n]) => `${status}: ${n}`).join(', ') || '-'}
+                      </td>
+                    </tr>
+                  ))}
+                </tbody>
+              </table>
+            </div>
+          )}
 
           {attendanceRecords.length > 0 && (
-            <AttendanceTable records={attendanceRecords} />
+            <>
+              <div className="flex justify-end mb-2">
+                <button
+                  onClick={handleExportAttendance}
+                  className="text-sm bg-gray-200 hover:bg-gray-300 text-gray-800 px-3 py-1 rounded-lg"
+                >
+                  Export CSV
+                </button>
+              </div>
+              <AttendanceTable records={attendanceRecords} />
+              {nextCursor && (
+                <button
+                  onClick={() => loadAttendancePage(nextCursor)}
+                  disabled={loadingAttendance}
+                  className="mt-4 w-full bg-gray-100 hover:bg-gray-200 disabled:bg-gray-50 text-gray-800 px-4 py-2 rounded-lg"
+                >
+                  {loadingAttendance ? 'Loading...' : `Load more (${attendanceRecords.length} shown)`}
+                </button>
+              )}
+            </>
           )}
         </div>
       </div>
@@ -1,6 +1,6 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { api, ScanResponse } from '../services/api';
+import { api, ScanJob, ScanResponse } from '../services/api';
 
 const StudentScan = () => {
   const navigate = useNavigate();
@@ -8,6 +8,18 @@ const StudentScan = () => {
   const [loading, setLoading] = useState(false);
   const [result, setResult] = useState<string>('');
   const [showEnrollModal, setShowEnrollModal] = useState(false);
+  // Kiosks open /student/scan?station=<name> to scan on their own camera
+  const station = new URLSearchParams(window.location.search).get('station') || undefined;
+  const [ready, setReady] = useState(false);
+
+  // Scans wait until the backend's models are warm (right after a restart)
+  useEffect(() => {
+    if (ready) return;
+    const check = () => api.getReady().then(r => setReady(r.ready)).catch(() => setReady(false));
+    check();
+    const timer = setInterval(check, 2000);
+    return () => clearInterval(timer);
+  }, [ready]);
 
   const handleEnroll = async () => {
     if (!rollNo.trim()) {
@@ -17,7 +29,7 @@ const StudentScan = () => {
     setLoading(true);
     setResult('Opening camera on backend... Please show barcode and face.');
     try {
-      const response = await api.enroll(rollNo);
+      const response = await api.enroll(rollNo, station);
       if (response.ok) {
         setResult(`✅ ${response.message}`);
       } else {
@@ -33,11 +45,20 @@ const StudentScan = () => {
 
   const handleScan = async () => {
     setLoading(true);
-    setResult('Opening camera on backend... Please show your face.');
+    setResult('Submitting scan request...');
+    const onUpdate = (job: ScanJob) => {
+      if (job.status === 'queued') {
+        setResult(`⏳ Waiting for the scanner... (position ${job.position ?? '?'} in queue)`);
+      } else if (job.status === 'running') {
+        setResult('Camera is ready... Please show your barcode and face.');
+      }
+    };
     try {
-      const response: ScanResponse = await api.scan();
+      const response: ScanResponse = await api.scan(undefined, onUpdate, station);
       if (response.ok && response.status === 'VALID') {
         setResult(`✅ Attendance marked for ${response.roll_no}`);
+      } else if (response.ok && response.status === 'ALREADY_MARKED') {
+        setResult(`✅ Attendance already marked for ${response.roll_no}`);
       } else {
         setResult(`❌ Scan failed: ${response.status || response.message || 'Unknown error'}`);
       }
@@ -73,13 +94,23 @@ const StudentScan = () => {
 
           <button
             onClick={handleScan}
-            disabled={loading}
+            disabled={loading || !ready}
             className="w-full bg-green-600 hover:bg-green-700 disabled:bg-green-400 text-white font-semibold py-4 px-6 rounded-lg text-lg transition"
           >
-            {loading ? '⏳ Processing...' : '✅ Scan for Attendance'}
+            {loading ? '⏳ Processing...' : ready ? '✅ Scan for Attendance' : '⏳ Scanner warming up...'}
           </button>
         </div>
 
+        {loading && (
+          <div className="mt-6 rounded-lg overflow-hidden border border-gray-200 bg-black">
+            <img
+              src={api.previewUrl(station)}
+              alt="Live camera preview"
+              className="w-full"
+            />
+          </div>
+        )}
+
         {result && (
           <div className={`mt-6 p-4 rounded-lg ${result.startsWith('✅') ? 'bg-green-50 border border-green-200 text-green-800' : result.startsWith('❌') ? 'bg-red-50 border border-red-200 text-red-800' : 'bg-blue-50 border border-blue-200 text-blue-800'}`}>
             {result}
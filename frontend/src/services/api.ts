@@ -13,6 +13,7 @@ export interface AttendanceRecord {
   roll_no: string;
   status: string;
   timestamp: string;
+  station?: string;
 }
 
 export interface LoginResponse {
@@ -37,6 +38,70 @@ export interface ActiveSlotResponse {
 export interface AttendanceResponse {
   subject: string;
   rows: AttendanceRecord[];
+  next_cursor: number | null;
+}
+
+export interface AttendanceFilters {
+  date?: string;
+  date_from?: string;
+  date_to?: string;
+  slot?: string;
+  roll_no?: string;
+  status?: string;
+  station?: string;
+}
+
+export interface StudentSummary {
+  roll_no: string;
+  sessions: number;
+  present: number;
+  absent: number;
+  percentage: number | null;
+  rejected: Record<string, number>;
+}
+
+export interface SubjectSummary {
+  subject: string;
+  sessions: Record<string, number>;
+  students: StudentSummary[];
+}
+
+export interface ScheduleEntry {
+  slot_id: string;
+  subject: string;
+  time: string;
+  activate_at: string;
+  stations: string[];
+  state: 'done' | 'current' | 'upcoming';
+}
+
+export interface WarmState {
+  slot_ids: string[];
+  date: string;
+  roster: number;
+  embeddings_cached: number;
+  not_enrolled: number;
+  already_marked: number | null;
+  ms: number;
+  at: string;
+  valid: boolean;
+}
+
+export interface SlotSchedule {
+  enabled: boolean;
+  lead_minutes: number;
+  schedule: ScheduleEntry[];
+  last_activation: { station: string; slot_id: string; at: string } | null;
+  warm: WarmState | null;
+}
+
+export interface Readiness {
+  ready: boolean;
+  status: 'pending' | 'warming' | 'ready' | 'failed';
+  steps_ms: Record<string, number>;
+  startup_ms: Record<string, number>;
+  warmup_ms?: number;
+  error?: string;
 }
 
 export interface EnrollResponse {
@@ -51,6 +116,58 @@ export interface ScanResponse {
   roll_no?: string;
   distance?: number;
   message?: string;
+  identified_roll?: string;
+  timings?: Record<string, number>;
+  station?: string;
+}
+
+export interface Station {
+  name: string;
+  source: string;
+  active_slot: Slot | null;
+  queue_depth: number;
+  session_id: string | null;
+}
+
+export type SessionStatus = 'starting' | 'running' | 'stopped';
+
+export interface WalkthroughSession {
+  session_id: string;
+  station: string;
+  slot: Slot;
+  date: string;
+  status: SessionStatus;
+  started_at: number;
+  stopped_at: number | null;
+  counts: Record<string, number>;
+  marked: string[];
+  last_seq: number;
+}
+
+export interface SessionEvent extends ScanResponse {
+  seq: number;
+  timestamp: string;
+}
+
+export interface SessionResponse {
+  ok: boolean;
+  session?: WalkthroughSession;
+  message?: string;
+}
+
+export type ScanJobStatus = 'queued' | 'running' | 'done' | 'failed';
+
+export interface ScanJob {
+  ok: boolean;
+  job_id: string;
+  station?: string;
+  status: ScanJobStatus;
+  position?: number | null;
+  created_at: number;
+  started_at: number | null;
+  finished_at: number | null;
+  result: ScanResponse | null;
+  message?: string;
 }
 
 class ApiClient {
@@ -69,20 +186,38 @@ class ApiClient {
     return res.json();
   }
 
+  // 503 while the backend is still loading its face/barcode models
+  async getReady(): Promise<Readiness> {
+    const res = await fetch(`${this.base}/api/health/ready`);
+    return res.json();
+  }
+
   async getSlots(): Promise<Slot[]> {
     const res = await fetch(`${this.base}/api/slots`);
     const data: SlotsResponse = await res.json();
     return data.slots;
   }
 
-  async setActiveSlot(slot_id: string, token: string): Promise<SetSlotResponse> {
+  // MJPEG stream of the station's camera with scan overlays (use as an <img> src)
+  previewUrl(station?: string): string {
+    const query = station ? `?station=${encodeURIComponent(station)}` : '';
+    return `${this.base}/api/preview.mjpg${query}`;
+  }
+
+  async getStations(): Promise<Station[]> {
+    const res = await fetch(`${this.base}/api/stations`);
+    const data: { stations: Station[] } = await res.json();
+    return data.stations;
+  }
+
+  async setActiveSlot(slot_id: string, token: string, station?: string): Promise<SetSlotResponse> {
     const res = await fetch(`${this.base}/api/admin/set_slot`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
         'Authorization': `Bearer ${token}`
       },
-      body: JSON.stringify({ slot_id })
+      body: JSON.stringify(station ? { slot_id, station } : { slot_id })
     });
     return res.json();
   }
@@ -94,29 +229,76 @@ class ApiClient {
     return res.json();
   }
 
+  private attendanceQuery(subject: string, filters: AttendanceFilters, extra: Record<string, string> = {}): string {
+    const params = new URLSearchParams({ subject, ...extra });
+    Object.entries(filters).forEach(([key, value]) => {
+      if (value) params.set(key, value);
+    });
+    return params.toString();
+  }
+
+  // First page of attendance rows (use getAttendancePage to page through everything)
   async getAttendance(subject: string, date: string | undefined, token: string): Promise<AttendanceRecord[]> {
-    let url = `${this.base}/api/admin/attendance?subject=${encodeURIComponent(subject)}`;
-    if (date) {
-      url += `&date=${encodeURIComponent(date)}`;
-    }
-    const res = await fetch(url, {
+    const page = await this.getAttendancePage(subject, { date }, token);
+    return page.rows;
+  }
+
+  async getAttendancePage(
+    subject: string,
+    filters: AttendanceFilters,
+    token: string,
+    after?: number | null,
+    limit = 200
+  ): Promise<AttendanceResponse> {
+    const extra: Record<string, string> = { limit: String(limit) };
+    if (after) extra.after = String(after);
+    const res = await fetch(`${this.base}/api/admin/attendance?${this.attendanceQuery(subject, filters, extra)}`, {
+      headers: { 'Authorization': `Bearer ${token}` }
+    });
+    return res.json();
+  }
+
+  // Streaming export; resolves to a Blob the caller can offer as a download
+  async exportAttendance(
+    subject: string,
+    filters: AttendanceFilters,
+    token: string,
+    format: 'csv' | 'ndjson' = 'csv'
+  ): Promise<Blob> {
+    const res = await fetch(`${this.base}/api/admin/attendance/export?${this.attendanceQuery(subject, filters, { format })}`, {
       headers: { 'Authorization': `Bearer ${token}` }
     });
-    const data: AttendanceResponse = await res.json();
-    return data.rows;
+    return res.blob();
   }
 
-  async enroll(roll_no: string): Promise<EnrollResponse> {
+  // Per-student attendance percentages, answered from the server's summary tables
+  async getSubjectSummary(subject: string, token: string): Promise<SubjectSummary> {
+    const res = await fetch(`${this.base}/api/admin/summary?subject=${encodeURIComponent(subject)}`, {
+      headers: { 'Authorization': `Bearer ${token}` }
+    });
+    return res.json();
+  }
+
+  async getSchedule(token: string): Promise<SlotSchedule> {
+    const res = await fetch(`${this.base}/api/admin/schedule`, {
+      headers: { 'Authorization': `Bearer ${token}` }
+    });
+    return res.json();
+  }
+
+  async enroll(roll_no: string, station?: string): Promise<EnrollResponse> {
     const res = await fetch(`${this.base}/api/enroll`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ roll_no })
+      body: JSON.stringify(station ? { roll_no, station } : { roll_no })
     });
     return res.json();
   }
 
-  async scan(expected_slot_id?: string): Promise<ScanResponse> {
-    const body = expected_slot_id ? { expected_slot_id } : {};
+  async submitScan(expected_slot_id?: string, station?: string): Promise<ScanJob> {
+    const body: Record<string, string> = {};
+    if (expected_slot_id) body.expected_slot_id = expected_slot_id;
+    if (station) body.station = station;
     const res = await fetch(`${this.base}/api/scan`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
@@ -124,6 +306,125 @@ class ApiClient {
     });
     return res.json();
   }
+
+  async getScanJob(job_id: string): Promise<ScanJob> {
+    const res = await fetch(`${this.base}/api/scan/${encodeURIComponent(job_id)}`);
+    return res.json();
+  }
+
+  // Follow a scan job until it finishes: server-sent events, falling back to polling
+  watchScanJob(job_id: string, onUpdate: (job: ScanJob) => void): Promise<ScanJob> {
+    return new Promise((resolve, reject) => {
+      const finished = (job: ScanJob) => job.status === 'done' || job.status === 'failed';
+
+      const poll = async () => {
+        try {
+          const job = await this.getScanJob(job_id);
+          onUpdate(job);
+          if (!job.ok || finished(job)) {
+            resolve(job);
+          } else {
+            setTimeout(poll, 1000);
+          }
+        } catch (err) {
+          reject(err);
+        }
+      };
+
+      if (typeof EventSource === 'undefined') {
+        poll();
+        return;
+      }
+
+      const source = new EventSource(`${this.base}/api/scan/${encodeURIComponent(job_id)}/events`);
+      const handle = (event: MessageEvent) => {
+        const job: ScanJob = { ok: true, ...JSON.parse(event.data) };
+        onUpdate(job);
+        if (finished(job)) {
+          source.close();
+          resolve(job);
+        }
+      };
+      ['queued', 'running', 'done', 'failed'].forEach(name => source.addEventListener(name, handle as EventListener));
+      source.onerror = () => {
+        source.close();
+        poll();
+      };
+    });
+  }
+
+  // Verify frames captured on the client (e.g. a phone camera burst); no server camera involved
+  async verify(frames: Blob[], roll_no?: string, slot_id?: string): Promise<ScanResponse> {
+    const form = new FormData();
+    frames.forEach((frame, i) => form.append('frames', frame, `frame${i}.jpg`));
+    if (roll_no) form.append('roll_no', roll_no);
+    if (slot_id) form.append('slot_id', slot_id);
+    const res = await fetch(`${this.base}/api/verify`, { method: 'POST', body: form });
+    return res.json();
+  }
+
+  // Walk-through session: the station scans continuously until stopped
+  async startSession(token: string, slot_id?: string, station?: string): Promise<SessionResponse> {
+    const body: Record<string, string> = {};
+    if (slot_id) body.slot_id = slot_id;
+    if (station) body.station = station;
+    const res = await fetch(`${this.base}/api/admin/session/start`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${token}` },
+      body: JSON.stringify(body)
+    });
+    return res.json();
+  }
+
+  async stopSession(token: string, session_id: string): Promise<SessionResponse> {
+    const res = await fetch(`${this.base}/api/admin/session/stop`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${token}` },
+      body: JSON.stringify({ session_id })
+    });
+    return res.json();
+  }
+
+  async getSession(token: string, session_id: string): Promise<SessionResponse> {
+    const res = await fetch(`${this.base}/api/admin/session/${encodeURIComponent(session_id)}`, {
+      headers: { 'Authorization': `Bearer ${token}` }
+    });
+    return res.json();
+  }
+
+  // Live feed of a session's verdicts; returns a function that stops listening.
+  // EventSource can't send an Authorization header, so the admin token goes in the query string.
+  watchSession(
+    token: string,
+    session_id: string,
+    onEvent: (event: SessionEvent) => void,
+    onStopped: (session: WalkthroughSession) => void = () => {}
+  ): () => void {
+    const source = new EventSource(
+      `${this.base}/api/session/${encodeURIComponent(session_id)}/events?token=${encodeURIComponent(token)}`
+    );
+    source.addEventListener('verdict', ((event: MessageEvent) => onEvent(JSON.parse(event.data))) as EventListener);
+    source.addEventListener('stopped', ((event: MessageEvent) => {
+      source.close();
+      onStopped(JSON.parse(event.data));
+    }) as EventListener);
+    return () => source.close();
+  }
+
+  // Submit a scan and wait for its verdict
+  async scan(
+    expected_slot_id?: string,
+    onUpdate: (job: ScanJob) => void = () => {},
+    station?: string
+  ): Promise<ScanResponse> {
+    const job = await this.submitScan(expected_slot_id, station);
+    if (!job.ok) {
+      return { ok: false, status: job.status, message: job.message };
+    }
+    onUpdate(job);
+    const finalJob = await this.watchScanJob(job.job_id, onUpdate);
+    return finalJob.result || { ok: false, status: 'ERROR', message: finalJob.message };
+  }
 }
 
 export const api = new ApiClient(API_BASE);